@@ -730,6 +730,64 @@ class TestFunction:
 
             assert f._check_for_aliased_inputs, d
 
+    def test_fast_call(self):
+        x, y = tt.dvectors("x", "y")
+        s = theano.shared(np.zeros(3))
+        f = function(
+            [x, In(y, value=np.ones(3))],
+            [x + y, x * y],
+            updates=[(s, s + x)],
+        )
+        fast = f.fast_call()
+        assert fast.n_inputs == 2
+        a = np.arange(3.0)
+        b = np.full(3, 2.0)
+        for r, e in zip(fast(a, b), f(a, b)):
+            np.testing.assert_allclose(r, e)
+        np.testing.assert_allclose(s.get_value(), 2 * a)
+        # The default value is still used by the function
+        np.testing.assert_allclose(f(a)[0], a + 1)
+
+        with pytest.raises(TypeError):
+            fast(a)
+
+        g = function([x], x.sum())
+        assert g.fast_call()(a) == 3
+        h = function([x], [x + 1], name="h")
+        out = h.fast_call()(a)
+        assert isinstance(out, list)
+        np.testing.assert_allclose(out[0], a + 1)
+
+    def test_fast_call_error(self):
+        x = tt.dvector("x")
+        f = function([x], tt.dot(x, x))
+        with pytest.raises(Exception, match="Apply node that caused the error"):
+            f.fast_call()(np.ones((2, 2)))
+
+    def test_fast_call_speed(self):
+        x = tt.dscalar("x")
+        f = function([x], 2 * x + 1)
+        value = np.asarray(3.0)
+        n_calls = 10000
+
+        def time_call(fn):
+            fn(value)
+            t0 = time.time()
+            for _ in range(n_calls):
+                fn(value)
+            return (time.time() - t0) / n_calls
+
+        t_default = time_call(f)
+        f.trust_input = True
+        t_trust = time_call(f)
+        f.trust_input = False
+        t_fast = time_call(f.fast_call())
+        print(
+            f"Function.__call__: {1e6 * t_default:f} us/call, "
+            f"trust_input=True: {1e6 * t_trust:f} us/call, "
+            f"fast_call: {1e6 * t_fast:f} us/call"
+        )
+
 
 class TestPicklefunction:
     def test_deepcopy(self):
@@ -0,0 +1,156 @@
+import numpy as np
+import pytest
+
+import theano
+import theano.tensor as tt
+from theano.compile.function import types
+from theano.compile.incremental import (
+    ReplacementTracker,
+    SubgraphCache,
+    input_masks,
+)
+from theano.configdefaults import config
+from theano.graph.basic import io_toposort
+from theano.graph.fg import FunctionGraph
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    # Don't share entries with the other tests
+    cache = SubgraphCache()
+    monkeypatch.setattr(types, "get_subgraph_cache", lambda: cache)
+    return cache
+
+
+@pytest.fixture
+def mode():
+    mode = config.mode
+    if mode in ["DEBUG_MODE", "DebugMode"]:
+        mode = "FAST_RUN"
+    return mode
+
+
+def model(x, w, n=5):
+    h = x
+    for i in range(n):
+        h = tt.tanh(tt.dot(w, h) + i) * 2 + tt.exp(-h)
+    return h
+
+
+def values():
+    rng = np.random.RandomState(42)
+    return [
+        rng.uniform(size=3).astype(config.floatX),
+        (rng.uniform(size=(3, 3)) / 3).astype(config.floatX),
+        (rng.uniform(size=3) + 1).astype(config.floatX),
+    ]
+
+
+def test_replacement_tracker():
+    x = tt.vector("x")
+    y = tt.exp(x)
+    z = tt.log(y)
+    fgraph = FunctionGraph([x], [z], clone=False)
+    tracker = ReplacementTracker()
+    fgraph.attach_feature(tracker)
+
+    y2 = tt.exp(x * 1)
+    fgraph.replace(y, y2)
+    assert tracker.resolve(y, fgraph.variables) is y2
+    # A reverted replacement is forgotten
+    fgraph.replace(y2, y)
+    assert tracker.resolve(y, fgraph.variables) is y
+    assert y2 not in tracker.replaced
+
+    fgraph.replace(z, x)
+    assert tracker.resolve(z, fgraph.variables) is x
+    assert tracker.resolve(y, fgraph.variables) is None
+
+
+def test_edit_reoptimizes_region(cache, mode):
+    x = tt.vector("x")
+    w = tt.matrix("w")
+    y = tt.vector("y")
+    h = model(x, w)
+
+    with config.change_flags(incremental_optimization=True):
+        theano.function([x, w, y], ((h - y) ** 2).sum(), mode=mode)
+        assert (cache.hits, cache.misses) == (0, 1)
+
+        out = ((h - y) ** 2).mean() + tt.log(y).sum()
+        f = theano.function([x, w, y], out, mode=mode)
+        assert (cache.hits, cache.misses) == (1, 1)
+        # Only part of the graph was given to the optimizer
+        assert 0 < cache.last_region_size < len(io_toposort([x, w, y], [out]))
+
+    with config.change_flags(incremental_optimization=False):
+        f_ref = theano.function([x, w, y], out, mode=mode)
+    np.testing.assert_allclose(f(*values()), f_ref(*values()), rtol=1e-5)
+
+
+def test_cloned_graph_with_new_inputs(cache, mode):
+    x = tt.vector("x")
+    w = tt.matrix("w")
+    y = tt.vector("y")
+
+    with config.change_flags(incremental_optimization=True):
+        f1 = theano.function([x, w, y], model(x, w) * y, mode=mode)
+
+        # A graph built independently, with other inputs, is still reused
+        x2 = tt.vector("x2")
+        w2 = tt.matrix("w2")
+        y2 = tt.vector("y2")
+        f2 = theano.function([x2, w2, y2], model(x2, w2) * y2, mode=mode)
+        assert cache.hits == 1
+        assert cache.last_region_size == 0
+        np.testing.assert_allclose(f1(*values()), f2(*values()))
+
+        # Inputs at other positions don't match
+        f3 = theano.function([w2, x2, y2], model(x2, w2) * y2, mode=mode)
+        assert cache.hits == 1
+        x_val, w_val, y_val = values()
+        np.testing.assert_allclose(f3(w_val, x_val, y_val), f1(x_val, w_val, y_val))
+
+
+def test_shared_variables_and_updates(cache, mode):
+    x = tt.vector("x")
+    w = theano.shared(values()[1], name="w")
+    s = theano.shared(np.zeros(3, dtype=config.floatX), name="s")
+
+    with config.change_flags(incremental_optimization=True):
+        f1 = theano.function([x], model(x, w), mode=mode)
+
+        # The update changes the flags of the inputs, so nothing is reused
+        # for them, but the graph is still correct.
+        f2 = theano.function(
+            [x], model(x, w) + 1, updates=[(s, s + model(x, w))], mode=mode
+        )
+        x_val = values()[0]
+        expected = f1(x_val)
+        np.testing.assert_allclose(f2(x_val), expected + 1, rtol=1e-5)
+        np.testing.assert_allclose(s.get_value(), expected, rtol=1e-5)
+
+        f3 = theano.function(
+            [x], model(x, w) - 1, updates=[(s, s + model(x, w))], mode=mode
+        )
+        assert cache.hits >= 1
+        np.testing.assert_allclose(f3(x_val), expected - 1, rtol=1e-5)
+        np.testing.assert_allclose(s.get_value(), 2 * expected, rtol=1e-5)
+
+        # The cached graphs use the shared variables of the new graph
+        w.set_value(2 * w.get_value())
+        np.testing.assert_allclose(f1(x_val), f3(x_val) + 1, rtol=1e-5)
+
+
+def test_max_entries(mode):
+    cache = SubgraphCache(max_entries=2)
+    x = tt.vector("x")
+    for i in range(4):
+        fgraph = FunctionGraph([x], [tt.exp(x) + i])
+        context = cache.context_key(fgraph, theano.compile.get_mode(mode)._optimizer)
+        hashes = cache.hashes(fgraph, [theano.In(x)])
+        masks = input_masks(fgraph.inputs, fgraph.outputs)
+        out = fgraph.outputs[0]
+        cache.add(context, hashes, masks, fgraph, {out: out})
+    assert len(cache._entries) == 2
+    assert len(cache._index) == 2
@@ -1,13 +1,17 @@
 # Test of memory profiling
 
 
+import json
 from io import StringIO
 
 import numpy as np
+import pytest
 
 import theano
 import theano.tensor as tt
+from theano.compile.profiling import flatten_optimizer_profile, optimizer_profile_diff
 from theano.ifelse import ifelse
+from theano.link.vm import VMLinker
 
 
 class TestProfiling:
@@ -105,3 +109,147 @@ class TestProfiling:
         finally:
             theano.config.profile = config1
             theano.config.profile_memory = config2
+
+    def test_optimizer_profile_json(self):
+        x = tt.vector("x")
+        out = tt.exp(x * 1).sum() + tt.log(tt.exp(x)).sum()
+
+        profiles = []
+        for o in [out, out + tt.exp(x * 1).sum()]:
+            p = theano.ProfileStats(False, gpu_checks=False)
+            with theano.config.change_flags(profile_optimizer=True):
+                theano.function([x], o, profile=p, mode="FAST_RUN")
+            buf = StringIO()
+            p.dump_optimizer_profile(buf)
+            profiles.append(json.loads(buf.getvalue()))
+
+        root = profiles[0]["optimizer"]
+        assert root["class"] == "SeqOptimizer"
+        assert root["nodes_before"] > root["nodes_after"] > 0
+        canonicalize = [o for o in root["optimizers"] if o["name"] == "canonicalize"]
+        assert canonicalize[0]["class"] == "EquilibriumOptimizer"
+        assert canonicalize[0]["applied"] > 0
+
+        stats = flatten_optimizer_profile(profiles[0])
+        assert stats[root["name"]]["time"] == root["time"]
+        local_opts = {
+            path.split("/")[-1]: s
+            for path, s in stats.items()
+            if path.startswith(f"{root['name']}/canonicalize/")
+        }
+        assert local_opts["local_mul_canonizer"]["applied"] > 0
+
+        rows = optimizer_profile_diff(*profiles)
+        assert {path for path, _, _ in rows} == set(stats)
+        changes = [abs(new["time"] - old["time"]) for _, old, new in rows]
+        assert changes == sorted(changes, reverse=True)
+
+    @pytest.mark.parametrize(
+        "linker",
+        [
+            VMLinker(use_cloop=False, allow_gc=True, lazy=False),
+            VMLinker(use_cloop=False, allow_gc=False, lazy=False),
+            VMLinker(use_cloop=False, allow_gc=True, lazy=True),
+        ],
+    )
+    def test_timeline(self, linker):
+        x = tt.vector("x")
+        out = tt.exp(x).sum() + tt.log(x).sum()
+        p = theano.ProfileStats(False, gpu_checks=False)
+        with theano.config.change_flags(profiling__timeline=True):
+            f = theano.function([x], out, profile=p, mode=theano.Mode(linker=linker))
+        x_val = np.ones(10, dtype=theano.config.floatX)
+        for _ in range(3):
+            f(x_val)
+
+        nodes = f.maker.fgraph.toposort()
+        assert len(p.timeline) == 3 * len(nodes)
+        assert {node for _, node, _, _ in p.timeline} == set(nodes)
+        assert all(t0 <= t1 for _, _, t0, t1 in p.timeline)
+
+        d = json.loads(json.dumps(p.to_dict()))
+        assert d["fct_callcount"] == 3
+        assert len(d["nodes"]) == len(nodes)
+        assert all(n["callcount"] == 3 for n in d["nodes"].values())
+        assert sum(op["nodes"] for op in d["ops"].values()) == len(nodes)
+        for op_name, op in d["ops"].items():
+            times = [n["time"] for n in d["nodes"].values() if n["op"] == op_name]
+            assert np.isclose(op["time"], sum(times))
+
+        buf = StringIO()
+        p.dump_chrome_trace(buf)
+        events = json.loads(buf.getvalue())["traceEvents"]
+        assert events[0]["ph"] == "M"
+        complete = [e for e in events if e["ph"] == "X"]
+        assert len(complete) == len(p.timeline)
+        assert {e["name"] for e in complete} == set(d["ops"])
+        assert all(e["dur"] >= 0 for e in complete)
+
+    def test_timeline_off(self):
+        x = tt.vector("x")
+        p = theano.ProfileStats(False, gpu_checks=False)
+        f = theano.function(
+            [x],
+            tt.exp(x).sum(),
+            profile=p,
+            mode=theano.Mode(linker=VMLinker(use_cloop=False, lazy=False)),
+        )
+        f(np.ones(10, dtype=theano.config.floatX))
+        assert p.timeline == []
+        assert sum(n["callcount"] for n in p.to_dict()["nodes"].values()) > 0
+
+    def test_timeline_cvm(self):
+        x = tt.vector("x")
+        p = theano.ProfileStats(False, gpu_checks=False)
+        with theano.config.change_flags(profile=True, profiling__timeline=True):
+            with pytest.warns(UserWarning, match="timeline"):
+                f = theano.function(
+                    [x], tt.exp(x).sum(), profile=p, mode=theano.Mode(linker="cvm")
+                )
+        f(np.ones(10, dtype=theano.config.floatX))
+        assert len(p.timeline) == len(f.maker.fgraph.apply_nodes)
+
+    @pytest.mark.parametrize(
+        "linker", ["cvm", VMLinker(use_cloop=False, lazy=False), "vm"]
+    )
+    def test_attach_profile(self, linker):
+        x = tt.vector("x")
+        f = theano.function([x], tt.exp(x).sum() * 2, mode=theano.Mode(linker=linker))
+        x_val = np.ones(10, dtype=theano.config.floatX)
+        f(x_val)
+        assert f.profile is None
+
+        p = theano.ProfileStats(False, gpu_checks=False)
+        assert f.attach_profile(p, sample_every=4) is p
+        for _ in range(8):
+            f(x_val)
+        assert p.fct_callcount == 8
+        nodes = f.maker.fgraph.apply_nodes
+        assert len(p.apply_callcount) == len(nodes)
+        # 2 of the calls were timed
+        assert all(c == 8 for c in p.apply_callcount.values())
+        assert sum(p.apply_time.values()) > 0
+        assert p.to_dict()["sample_every"] == 4
+        buf = StringIO()
+        p.summary(file=buf)
+        assert "estimated from 1 in 4 calls" in buf.getvalue()
+
+        assert f.detach_profile() is p
+        f(x_val)
+        assert p.fct_callcount == 8
+        assert f.fn.time_thunks == 0
+        assert all(c == 8 for c in p.apply_callcount.values())
+
+    def test_sample_every_flag(self):
+        x = tt.vector("x")
+        with theano.config.change_flags(profiling__sample_every=3):
+            p = theano.ProfileStats(False, gpu_checks=False)
+        f = theano.function(
+            [x],
+            tt.exp(x).sum(),
+            profile=p,
+            mode=theano.Mode(linker=VMLinker(use_cloop=False, lazy=False)),
+        )
+        for _ in range(4):
+            f(np.ones(10, dtype=theano.config.floatX))
+        assert all(c == 6 for c in p.apply_callcount.values())
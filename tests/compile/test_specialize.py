@@ -0,0 +1,114 @@
+import numpy as np
+import pytest
+
+import theano
+import theano.tensor as tt
+from theano.compile.ops import Shape_i
+from theano.compile.specialize import ShapeSpecializer, shape_signature
+from theano.configdefaults import config
+
+
+@pytest.fixture
+def mode():
+    mode = config.mode
+    if mode in ["DEBUG_MODE", "DebugMode"]:
+        mode = "FAST_RUN"
+    return mode
+
+
+def make_functions(mode, **kwargs):
+    x = tt.matrix("x")
+    y = tt.matrix("y")
+    s = theano.shared(np.zeros((), dtype=config.floatX), name="s")
+    outputs = [(tt.exp(x) + y).sum(axis=0) * x.shape[0], x.shape[1]]
+    updates = {s: s + x.sum()}
+    with config.change_flags(function__specialize_shapes=True, **kwargs):
+        f = theano.function([x, y], outputs, updates=updates, mode=mode)
+    f_ref = theano.function([x, y], outputs, mode=mode)
+    return f, f_ref, s
+
+
+def test_shape_signature(mode):
+    f, _, _ = make_functions(mode)
+    f.input_storage[0].storage[0] = np.zeros((2, 3))
+    f.input_storage[1].storage[0] = None
+    assert shape_signature(f.input_storage) == ((2, 3), None, ())
+
+
+def test_specialize(mode):
+    f, f_ref, s = make_functions(mode, function__specialize_shapes__after=2)
+    assert isinstance(f.shape_specializer, ShapeSpecializer)
+    assert f_ref.shape_specializer is None
+
+    rng = np.random.RandomState(2)
+    total = 0
+    shapes = [(3, 4), (3, 4), (3, 4), (5, 1), (3, 4), (5, 1), (5, 1)]
+    for shape in shapes:
+        x_val = rng.rand(*shape).astype(config.floatX)
+        y_val = rng.rand(*shape).astype(config.floatX)
+        for out, ref in zip(f(x_val, y_val), f_ref(x_val, y_val)):
+            np.testing.assert_allclose(out, ref, rtol=1e-5)
+        total += x_val.sum()
+    np.testing.assert_allclose(s.get_value(), total, rtol=1e-5)
+
+    specializer = f.shape_specializer
+    assert list(specializer._versions) == [((3, 4), (3, 4), ()), ((5, 1), (5, 1), ())]
+    assert specializer.hits == 3
+
+    # The shapes are constant in the specialized graph, and the dimensions of
+    # length 1 are broadcastable
+    fgraph = specializer._versions[((5, 1), (5, 1), ())][0].fgraph
+    assert not any(isinstance(node.op, Shape_i) for node in fgraph.apply_nodes)
+    assert any(
+        getattr(node.op, "scalar_op", None) is not None
+        and node.outputs[0].broadcastable == (False, True)
+        for node in fgraph.apply_nodes
+    )
+    assert any(isinstance(node.op, Shape_i) for node in f.maker.fgraph.apply_nodes)
+
+
+def test_max_entries(mode):
+    f, f_ref, _ = make_functions(
+        mode,
+        function__specialize_shapes__after=1,
+        function__specialize_shapes__max_entries=2,
+    )
+    for n in [1, 2, 3, 2, 4]:
+        x_val = np.ones((n, 2), dtype=config.floatX)
+        for out, ref in zip(f(x_val, x_val), f_ref(x_val, x_val)):
+            np.testing.assert_allclose(out, ref)
+    assert list(f.shape_specializer._versions) == [
+        ((2, 2), (2, 2), ()),
+        ((4, 2), (4, 2), ()),
+    ]
+
+
+def test_error_in_specialized_version(mode):
+    x = tt.vector("x")
+    with config.change_flags(
+        function__specialize_shapes=True, function__specialize_shapes__after=1
+    ):
+        f = theano.function([x], tt.log(x) + x[[0, 5]].sum(), mode=mode)
+    with pytest.raises(IndexError):
+        f(np.ones(3, dtype=config.floatX))
+    # The failed call doesn't prevent the next ones
+    assert f(np.ones(6, dtype=config.floatX)).shape == (6,)
+
+
+def test_free():
+    x = tt.vector("x")
+    with config.change_flags(
+        function__specialize_shapes=True, function__specialize_shapes__after=1
+    ):
+        f = theano.function([x], tt.exp(x) * 2, mode=theano.Mode(linker="vm_nogc"))
+    f(np.ones(3, dtype=config.floatX))
+    (fn,) = f.shape_specializer.fns()
+    assert any(
+        cell[0] is not None
+        for var, cell in fn.storage_map.items()
+        if var.owner is not None
+    )
+    f.free()
+    assert all(
+        cell[0] is None for var, cell in fn.storage_map.items() if var.owner is not None
+    )
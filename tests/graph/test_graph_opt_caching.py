@@ -1,45 +1,133 @@
 import os
 
 import numpy as np
+import pytest
 
 import theano
 import theano.tensor as tt
+from theano.compile.function import types
+from theano.compile.io import In
+from theano.compile.optcache import OptimizedGraphCache
+from theano.graph.fg import FunctionGraph
+from theano.graph.hashing import graph_hash
 
 
 floatX = "float32"
 
 
-def test_graph_opt_caching():
-    opt_db_file = os.path.join(theano.config.compiledir, "optimized_graphs.pkl")
-    if os.path.exists(opt_db_file):
-        os.remove(opt_db_file)
+@pytest.fixture
+def cache(tmpdir, monkeypatch):
+    # Don't touch the cache of the compiledir
+    cache = OptimizedGraphCache(str(tmpdir))
+    monkeypatch.setattr(types, "get_optimized_graph_cache", lambda: cache)
+    return cache
 
+
+def test_graph_opt_caching(cache):
     mode = theano.config.mode
     if mode in ["DEBUG_MODE", "DebugMode"]:
         mode = "FAST_RUN"
-    default = theano.config.cache_optimizations
-    try:
-        theano.config.cache_optimizations = True
+
+    with theano.config.change_flags(cache_optimizations=True):
+        hits = cache.hits
+
         a = tt.fmatrix("a")
         b = tt.fmatrix("b")
         c = theano.shared(np.ones((10, 10), dtype=floatX))
         d = theano.shared(np.ones((10, 10), dtype=floatX))
         e = tt.sum(tt.sum(tt.sum(a ** 2 + b) + c) + d)
         f1 = theano.function([a, b], e, mode=mode)
+        assert cache.hits == hits
 
         m = tt.fmatrix("x1")
         n = tt.fmatrix("x2")
-        p = theano.shared(np.ones((10, 10), dtype=floatX))
-        q = theano.shared(np.ones((10, 10), dtype=floatX))
+        p = theano.shared(2 * np.ones((10, 10), dtype=floatX))
+        q = theano.shared(3 * np.ones((10, 10), dtype=floatX))
         j = tt.sum(tt.sum(tt.sum(m ** 2 + n) + p) + q)
         f2 = theano.function([m, n], j, mode=mode)
+        assert cache.hits == hits + 1
 
         in1 = np.ones((10, 10), dtype=floatX)
         in2 = np.ones((10, 10), dtype=floatX)
-        assert f1(in1, in2) == f2(in1, in2)
-    finally:
-        theano.config.cache_optimizations = default
+        # The cached graph must use the shared variables of `f2`.
+        np.testing.assert_allclose(f1(in1, in2), 2010100)
+        np.testing.assert_allclose(f2(in1, in2), 2020300)
+        assert len(f1.maker.fgraph.apply_nodes) == len(f2.maker.fgraph.apply_nodes)
+
+        # A structurally different graph is not a hit
+        j2 = tt.sum(tt.sum(tt.sum(m ** 3 + n) + p) + q)
+        theano.function([m, n], j2, mode=mode)
+        assert cache.hits == hits + 1
+
+
+def test_graph_opt_caching_updates(cache):
+    mode = theano.config.mode
+    if mode in ["DEBUG_MODE", "DebugMode"]:
+        mode = "FAST_RUN"
+
+    with theano.config.change_flags(cache_optimizations=True):
+        fns = []
+        for _ in range(2):
+            x = tt.dvector("x")
+            s = theano.shared(np.zeros(3))
+            fns.append((theano.function([x], s, updates=[(s, s + x)], mode=mode), s))
+        for f, s in fns:
+            f(np.ones(3))
+            f(np.ones(3))
+            np.testing.assert_allclose(s.get_value(), 2 * np.ones(3))
+
+
+def test_graph_opt_caching_mutable(cache):
+    mode = theano.config.mode
+    if mode in ["DEBUG_MODE", "DebugMode"]:
+        mode = "FAST_RUN"
+
+    puts = []
+    put = cache.put
+    cache.put = lambda key, fgraph: puts.append(key) or put(key, fgraph)
+
+    with theano.config.change_flags(cache_optimizations=True):
+        x = tt.dvector("x")
+        f1 = theano.function([In(x, mutable=True)], tt.exp(x) * 2, mode=mode)
+        y = tt.dvector("y")
+        f2 = theano.function([y], tt.exp(y) * 2, mode=mode)
+
+        # A graph allowed to destroy its input isn't reused for one that isn't
+        assert cache.hits == 0
+        value = np.ones(3)
+        np.testing.assert_allclose(f2(value), np.exp(1) * 2)
+        np.testing.assert_allclose(value, np.ones(3))
+
+        # A cached graph that destroys a protected input is rejected
+        put(puts[1], f1.maker.fgraph)
+        z = tt.dvector("z")
+        f3 = theano.function([z], tt.exp(z) * 2, mode=mode)
+        assert cache.hits == 1
+        np.testing.assert_allclose(f3(value), np.exp(1) * 2)
+        np.testing.assert_allclose(value, np.ones(3))
+
+
+def test_graph_hash():
+    x, y = tt.dvectors("x", "y")
+    x2, y2 = tt.dvectors("x2", "y2")
+    assert graph_hash([x, y], [x + 2 * y]) == graph_hash([x2, y2], [x2 + 2 * y2])
+    assert graph_hash([x, y], [x + 2 * y]) != graph_hash([x2, y2], [y2 + 2 * x2])
+    assert graph_hash([x, y], [x + 2 * y]) != graph_hash([x2, y2], [x2 + 3 * y2])
+    assert graph_hash([x, y], [x + 2 * y]) != graph_hash([x2, y2], [x2 - 2 * y2])
+    assert graph_hash([x], [x]) != graph_hash([tt.fvector()], [tt.fvector()])
 
 
-if __name__ == "__main__":
-    test_graph_opt_caching()
+def test_optimized_graph_cache_eviction(tmpdir):
+    cache = OptimizedGraphCache(str(tmpdir), max_entries=2)
+    keys = []
+    for i in range(4):
+        x = tt.dvector()
+        fgraph = FunctionGraph([x], [x + i])
+        keys.append(cache.key(fgraph, theano.compile.mode.OPT_FAST_RUN))
+        cache.put(keys[-1], fgraph)
+        assert cache.get(keys[-1]) is not None
+        # Make the access times distinct
+        os.utime(cache._path(keys[-1]), (i, i))
+    assert len(cache.entries()) == 2
+    assert cache.get(keys[0]) is None
+    assert cache.get(keys[3]) is not None
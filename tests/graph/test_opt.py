@@ -1,5 +1,11 @@
+import json
+from io import StringIO
+
+import pytest
+
 import theano.tensor as tt
 from tests.graph.utils import (
+    MyOp,
     MyType,
     MyVariable,
     op1,
@@ -11,9 +17,11 @@ from tests.graph.utils import (
     op_y,
     op_z,
 )
+from theano.compile import optdb
 from theano.configdefaults import config
 from theano.graph.basic import Apply, Constant
 from theano.graph.fg import FunctionGraph
+from theano.graph.hashing import graph_hash
 from theano.graph.op import Op
 from theano.graph.opt import (
     EquilibriumOptimizer,
@@ -22,11 +30,15 @@ from theano.graph.opt import (
     OpSub,
     PatternSub,
     TopoOptimizer,
+    local_optimizer,
     logging,
+    neighborhood,
     pre_constant_merge,
     pre_greedy_local_optimizer,
     theano,
+    toposort_nodes,
 )
+from theano.misc.optimizer_time_test import make_graph
 from theano.tensor.opt import constant_folding
 from theano.tensor.subtensor import AdvancedSubtensor
 from theano.tensor.type_other import MakeSlice, SliceConstant, slicetype
@@ -485,6 +497,28 @@ class TestMergeOptimizer:
         no_input_ops = [n for n in fg.apply_nodes if isinstance(n.op, NoInputOp)]
         assert len(no_input_ops) == 2, fg.apply_nodes
 
+    def test_index_follows_graph_changes(self):
+        x, y, z = inputs()
+        e1 = op1(op2(x, y), z)
+        e2 = op1(op2(x, y), z)
+        e3 = op1(op2(y, x), z)
+        g = FunctionGraph([x, y, z], [e1, e2, e3])
+        MergeOptimizer().optimize(g)
+        merge_feature = g.merge_feature
+        assert len(g.apply_nodes) == 4
+        assert set(merge_feature.node_keys) == g.apply_nodes
+        assert sum(map(len, merge_feature.nodes_by_key.values())) == 4
+
+        # The replaced node is removed from the index, and its client is
+        # indexed under its new inputs, where it gets merged.
+        g.replace(g.outputs[2].owner.inputs[0], g.outputs[0].owner.inputs[0])
+        MergeOptimizer().optimize(g)
+        assert str(g) == "FunctionGraph(*1 -> Op1(Op2(x, y), z), *1, *1)"
+        assert set(merge_feature.node_keys) == g.apply_nodes
+        for node, key in merge_feature.node_keys.items():
+            assert key == (node.op, tuple(node.inputs))
+            assert merge_feature.nodes_by_key[key] == [node]
+
 
 class TestEquilibrium:
     def test_1(self):
@@ -548,6 +582,141 @@ class TestEquilibrium:
         # print 'after', g
         assert str(g) == "FunctionGraph(Op1(x, y))"
 
+    def test_dispatch_index(self):
+        @local_optimizer([op1, op2])
+        def local_op1_op2(fgraph, node):
+            return False
+
+        @local_optimizer(None)
+        def local_all(fgraph, node):
+            return False
+
+        @local_optimizer([MyOp, op1])
+        def local_myop(fgraph, node):
+            return False
+
+        sub = PatternSub((op1, "x"), (op2, "x"))
+        opt = EquilibriumOptimizer(
+            [sub, local_op1_op2, local_all, local_myop, MergeOptimizer()],
+            max_use_ratio=10,
+        )
+        # Optimizers that track both the type and the instance are only tried
+        # once.
+        assert opt.local_optimizers_for(op1) == (
+            local_all,
+            local_myop,
+            sub,
+            local_op1_op2,
+        )
+        assert opt.local_optimizers_for(op2) == (local_all, local_myop, local_op1_op2)
+        assert opt.local_optimizers_for(op3) == (local_all, local_myop)
+
+    @pytest.mark.parametrize("depth", [2, None])
+    def test_unchanged_nodes_skipped(self, depth):
+        tried = []
+
+        @local_optimizer([op5])
+        def local_op5(fgraph, node):
+            tried.append(node)
+            return False
+
+        x, y, z = inputs()
+        e = op1(op5(op5(op5(op5(x)))))
+        g = FunctionGraph([x, y, z], [e])
+        opt = EquilibriumOptimizer(
+            [PatternSub((op1, "x"), (op2, "x")), local_op5], max_use_ratio=10
+        )
+        opt.unchanged_node_depth = depth
+        prof = opt.optimize(g)
+        assert str(g) == "FunctionGraph(Op2(Op5(Op5(Op5(Op5(x))))))"
+
+        # Two passes are made. In the second one, only the nodes close to the
+        # new `Op2` node are visited.
+        assert len(prof[1]) == 2
+        nb_attempts, (nb_untracked, nb_unchanged) = prof[12:14]
+        if depth is None:
+            assert prof[5] == [5, 5]
+            assert len(tried) == 8
+            assert nb_unchanged == 0
+        else:
+            assert prof[5] == [5, 3]
+            assert len(tried) == 6
+            assert nb_unchanged == 2
+        assert nb_attempts[local_op5] == len(tried)
+        assert nb_untracked > 0
+
+        stream = StringIO()
+        opt.print_profile(stream, prof)
+        assert "local optimizer attempts made" in stream.getvalue()
+
+    def test_profile_to_dict(self):
+        x, y, z = inputs()
+        e = op1(op1(op3(x, y)))
+        g = FunctionGraph([x, y, z], [e])
+        opt = EquilibriumOptimizer(
+            [
+                PatternSub((op1, (op1, "x")), (op2, "x")),
+                PatternSub((op3, "x", "y"), (op4, "x", "y")),
+            ],
+            max_use_ratio=10,
+        )
+        prof = opt.optimize(g)
+        assert str(g) == "FunctionGraph(Op2(Op4(x, y)))"
+
+        d = opt.profile_to_dict(prof)
+        # The profile only contains types that can be serialized to JSON
+        assert json.loads(json.dumps(d)) == d
+        assert d["class"] == "EquilibriumOptimizer"
+        assert [it["nodes_after"] for it in d["iterations"]] == [2, 2]
+        stats = {o["name"]: o for o in d["optimizers"]}
+        assert len(stats) == 2
+        for o in stats.values():
+            assert o["kind"] == "local"
+            assert o["applied"] == 1
+            assert o["attempts"] >= 1
+            assert o["nodes_created"] == 1
+        assert sorted(o["nodes_removed"] for o in stats.values()) == [1, 2]
+        assert d["applied"] == 2
+
+
+def test_equilibrium_worklist_on_generated_graph():
+    # Only revisiting the nodes around those that changed gives the same
+    # graph as visiting the whole graph at every pass.
+    inputs, outputs = make_graph(300, width=10)
+    hashes = []
+    for depth in (2, None):
+        fgraph = FunctionGraph(inputs, outputs)
+        opt = optdb["canonicalize"].query("+fast_run")
+        opt.unchanged_node_depth = depth
+        opt.optimize(fgraph)
+        hashes.append(graph_hash(fgraph.inputs, fgraph.outputs))
+    assert hashes[0] == hashes[1]
+
+
+def test_neighborhood_and_toposort_nodes():
+    x, y, z = inputs()
+    a = op1(x)
+    b = op2(a, y)
+    c = op3(b)
+    d = op4(c, a)
+    g = FunctionGraph([x, y, z], [d], clone=False)
+
+    assert list(neighborhood(g, [c.owner], 0)) == [c.owner]
+    assert set(neighborhood(g, [c.owner], 1)) == {b.owner, c.owner, d.owner}
+    assert set(neighborhood(g, [c.owner], 2)) == {
+        a.owner,
+        b.owner,
+        c.owner,
+        d.owner,
+    }
+
+    order = toposort_nodes([d.owner, c.owner, a.owner])
+    assert set(order) == {a.owner, c.owner, d.owner}
+    assert order.index(a.owner) < order.index(d.owner)
+    assert order.index(c.owner) < order.index(d.owner)
+    # The order only depends on the edges between the given nodes
+    assert toposort_nodes([c.owner, a.owner]) == [c.owner, a.owner]
+
 
 def test_pre_constant_merge():
 
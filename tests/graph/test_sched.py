@@ -1,12 +1,19 @@
 from theano import tensor
 from theano.graph.basic import io_toposort
+from theano.graph.destroyhandler import DestroyHandler
+from theano.graph.fg import FunctionGraph
 from theano.graph.sched import (
     _toposort,
+    estimate_peak_memory,
     make_dependence_cmp,
+    min_memory_schedule,
     posort,
     reverse_dict,
     sort_apply_nodes,
+    variable_memory_size,
 )
+from theano.tensor.inplace import neg_inplace
+from theano.tensor.opt import ShapeFeature
 from theano.utils import cmp
 
 
@@ -99,3 +106,85 @@ def test_posort():
         9,
         19,
     ]
+
+
+def test_variable_memory_size():
+    x = tensor.dmatrix("x")
+    y = tensor.specify_shape(x, (3, 5))
+    z = tensor.exp(y).dimshuffle("x", 0, 1)
+    fgraph = FunctionGraph([x], [z], clone=False)
+    assert variable_memory_size(x, unknown_dim=10) == 8 * 10 * 10
+    assert variable_memory_size(z, unknown_dim=10) == 8 * 10 * 10
+
+    fgraph.attach_feature(ShapeFeature())
+    assert variable_memory_size(z, fgraph.shape_feature) == 8 * 3 * 5
+    assert variable_memory_size(x, fgraph.shape_feature, unknown_dim=10) == 800
+
+
+def check_schedule(fgraph, order):
+    assert sorted(order, key=id) == sorted(fgraph.apply_nodes, key=id)
+    seen = set()
+    for node in order:
+        assert all(var.owner is None or var.owner in seen for var in node.inputs)
+        seen.add(node)
+
+
+def test_min_memory_schedule():
+    xs = [tensor.vector(f"x{i}") for i in range(4)]
+    out = tensor.add(*[tensor.exp(tensor.exp(x)).sum() for x in xs])
+    fgraph = FunctionGraph(xs, [out], clone=False)
+    # Compute all the large intermediate results before reducing them
+    order = fgraph.toposort()
+    bad_order = [n for n in order if n.op == tensor.exp] + [
+        n for n in order if n.op != tensor.exp
+    ]
+    bad_peak = estimate_peak_memory(fgraph, bad_order)
+
+    exhaustive = min_memory_schedule(fgraph)
+    check_schedule(fgraph, exhaustive)
+    peak = estimate_peak_memory(fgraph, exhaustive)
+    # Two vectors and the sums computed so far
+    assert peak == 2 * 8 * 1024 + 3 * 8
+    assert peak < bad_peak
+
+    for lookahead in [1, 2, 3]:
+        greedy = min_memory_schedule(fgraph, lookahead=lookahead, max_states=1)
+        check_schedule(fgraph, greedy)
+        assert estimate_peak_memory(fgraph, greedy) == peak
+
+
+def test_min_memory_schedule_lookahead():
+    # Each branch allocates a large result before reducing it. The greedy
+    # search without lookahead starts all the branches first, as their first
+    # node allocates less than the second one.
+    xs = [tensor.vector(f"x{i}") for i in range(3)]
+    outs = []
+    for x in xs:
+        small = tensor.specify_shape(x, (10,)) + 1
+        large = tensor.alloc(small, 100, 10)
+        outs.append(large.sum())
+    fgraph = FunctionGraph(xs, [tensor.add(*outs)], clone=False)
+    fgraph.attach_feature(ShapeFeature())
+
+    def peak(**kwargs):
+        order = min_memory_schedule(fgraph, **kwargs)
+        check_schedule(fgraph, order)
+        return estimate_peak_memory(fgraph, order)
+
+    best = peak()
+    assert best < peak(lookahead=3, max_states=1) < peak(lookahead=1, max_states=1)
+
+
+def test_min_memory_schedule_destroy():
+    x = tensor.vector("x")
+    y = tensor.exp(x)
+    # `y` must not be destroyed before `z` is computed
+    z = tensor.exp(y)
+    w = neg_inplace(y)
+    fgraph = FunctionGraph([x], [z + w], clone=False)
+    fgraph.attach_feature(DestroyHandler())
+    order = min_memory_schedule(fgraph, max_states=1)
+    check_schedule(fgraph, order)
+    assert order.index(z.owner) < order.index(w.owner)
+    order = min_memory_schedule(fgraph)
+    assert order.index(z.owner) < order.index(w.owner)
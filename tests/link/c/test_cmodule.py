@@ -9,8 +9,14 @@ import logging
 from unittest.mock import patch
 
 import numpy as np
+import pytest
 
 import theano
+import theano.tensor as tt
+from theano.graph.basic import Apply
+from theano.graph.fg import FunctionGraph
+from theano.graph.op import COp
+from theano.link.c.basic import CLinker, compile_node_modules, get_module_cache
 from theano.link.c.cmodule import GCC_compiler, default_blas_ldflags
 
 
@@ -83,3 +89,94 @@ def test_default_blas_ldflags(sys_mock, try_blas_flag_mock, caplog):
             default_blas_ldflags()
 
     assert "install mkl with" in caplog.text
+
+
+class AddConstant(COp):
+    __props__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def make_node(self, x):
+        x = tt.as_tensor_variable(x)
+        return Apply(self, [x], [x.type()])
+
+    def perform(self, node, inputs, outputs):
+        outputs[0][0] = inputs[0] + self.value
+
+    def c_code_cache_version(self):
+        return (1,)
+
+    def c_code(self, node, name, inames, onames, sub):
+        (x,) = inames
+        (z,) = onames
+        value = repr(self.value)
+        fail = sub["fail"]
+        return f"""
+        Py_XDECREF({z});
+        {z} = (PyArrayObject*)PyArray_NewCopy({x}, NPY_CORDER);
+        if (!{z}) {{
+            {fail}
+        }}
+        {{
+            double* data = (double*)PyArray_DATA({z});
+            for (npy_intp i = 0; i < PyArray_SIZE({z}); ++i) {{
+                data[i] += {value};
+            }}
+        }}
+        """
+
+
+@pytest.mark.skipif(
+    not theano.config.cxx, reason="G++ not available, so we need to skip this test."
+)
+def test_compile_node_modules():
+    # Use new constants so that the modules are not already in the cache.
+    base = np.random.rand()
+    x = tt.dvector("x")
+    outs = [AddConstant(base + i)(x) for i in range(3)]
+    # A duplicated module, and a node without C code
+    outs.append(AddConstant(base)(outs[-1]))
+    outs.append(theano.compile.ops.as_op([tt.dvector], [tt.dvector])(np.sort)(x))
+
+    fgraph = FunctionGraph([x], outs)
+    nodes = fgraph.toposort()
+    storage_map = {v: [None] for v in fgraph.variables}
+    compute_map = {v: [False] for v in fgraph.variables}
+    assert compile_node_modules(nodes, storage_map, compute_map, n_workers=3) == 3
+    assert compile_node_modules(nodes, storage_map, compute_map, n_workers=3) == 0
+
+    # Making the thunks doesn't compile anything anymore.
+    cache = get_module_cache()
+    n_compiled = cache.stats[2]
+    with theano.config.change_flags(cmodule__compile_workers=3):
+        f = theano.function([x], outs, mode=theano.Mode(linker="cvm"))
+    assert cache.stats[2] == n_compiled
+    res = f(np.array([3.0, 1.0]))
+    for i in range(3):
+        np.testing.assert_allclose(res[i], [3.0 + base + i, 1.0 + base + i])
+    np.testing.assert_allclose(res[3], [3.0 + 2 * base + 2, 1.0 + 2 * base + 2])
+    np.testing.assert_allclose(res[4], [1.0, 3.0])
+
+
+def test_compile_node_modules_warm_cache():
+    # With a warm cache, the pre-compilation doesn't add work: the key of
+    # each module is computed once per node, as without it.
+    x = tt.dvector("x")
+    outs = [AddConstant(i)(x) for i in range(3)]
+    theano.function([x], outs, mode=theano.Mode(linker="cvm"))
+
+    n_keys = []
+    for n_workers in (1, 3):
+        cmodule_key_ = CLinker.cmodule_key_
+        calls = []
+
+        def counting_cmodule_key_(self, *args, **kwargs):
+            calls.append(self)
+            return cmodule_key_(self, *args, **kwargs)
+
+        with patch.object(CLinker, "cmodule_key_", counting_cmodule_key_):
+            with theano.config.change_flags(cmodule__compile_workers=n_workers):
+                theano.function([x], outs, mode=theano.Mode(linker="cvm"))
+        n_keys.append(len(calls))
+    assert n_keys[0] == n_keys[1] == 3
@@ -6,14 +6,17 @@ import numpy as np
 import pytest
 
 import theano
+from tests import unittest_tools as utt
 from theano import function, tensor
 from theano.compile import Mode
 from theano.configdefaults import config
 from theano.graph.basic import Apply
 from theano.graph.op import Op
-from theano.ifelse import ifelse
+from theano.graph.sched import min_memory_schedule
+from theano.ifelse import IfElse, ifelse
 from theano.link.c.exceptions import MissingGXX
-from theano.link.vm import Loop, VMLinker
+from theano.link.c.fused import FusedCOp
+from theano.link.vm import Loop, LoopGC, LoopPlanned, VMLinker, plan_memory
 
 
 class TestCallbacks:
@@ -141,6 +144,121 @@ def test_speed():
     time_numpy()
 
 
+@pytest.mark.skipif(
+    not theano.config.cxx, reason="G++ not available, so we need to skip this test."
+)
+def test_fused_c():
+    x = tensor.vector()
+    y = tensor.exp(x) * 2 + 1
+    z = ifelse(y.sum() > 0, y * 3 - x, y - 1)
+    out = tensor.tanh(z).sum() * z + 1
+
+    f_ref = function([x], [y, out], mode=Mode(linker="cvm"))
+    f = function([x], [y, out], mode=Mode(linker="cvm_fused"))
+    fused = [
+        node for node in f.maker.fgraph.apply_nodes if isinstance(node.op, FusedCOp)
+    ]
+    assert len(fused) >= 2
+    assert any(isinstance(node.op, IfElse) for node in f.maker.fgraph.apply_nodes)
+
+    for value in ([1.0, 2.0], [-100.0, 3.0]):
+        value = np.asarray(value, dtype=config.floatX)
+        for r, e in zip(f(value), f_ref(value)):
+            utt.assert_allclose(r, e)
+
+    # Intermediate variables that don't need recycling are fused away
+    x = tensor.dmatrix()
+    a = tensor.exp(x) + 1
+    outs = [a.T, tensor.log(a) * 2, a.sum()]
+    f_ref = function([x], outs, mode=Mode(linker="cvm"))
+    f = function([x], outs, mode=Mode(linker="cvm_fused"))
+    value = np.random.rand(3, 4)
+    for r, e in zip(f(value), f_ref(value)):
+        utt.assert_allclose(r, e)
+
+    # A long chain is split in several nodes
+    x = tensor.vector()
+    z = x
+    for d in range(10):
+        z = z * 1.0001 + 0.5 if d % 2 else tensor.tanh(z)
+    f_ref = function([x], z, mode=Mode(optimizer=None, linker="cvm"))
+    f = theano.function([x], z, mode=Mode(optimizer=None, linker="cvm_fused"))
+    assert len(f.maker.fgraph.apply_nodes) == 1
+    value = np.asarray([2.0, 3.0], dtype=config.floatX)
+    utt.assert_allclose(f(value), f_ref(value))
+
+
+@pytest.mark.skipif(
+    not theano.config.cxx, reason="G++ not available, so we need to skip this test."
+)
+def test_fused_c_lazy():
+    # The nodes only needed by a branch of an `IfElse` must not be fused with
+    # the others, or they would be computed even when the branch isn't taken.
+    calls = []
+
+    def callback(node, thunk, storage_map, compute_map):
+        calls.append(node)
+
+    x = tensor.vector()
+    y = tensor.exp(x) * 2
+    z = ifelse(y.sum() > 1, y, tensor.tanh(y) * 3 + 2)
+    linker = VMLinker(fuse_c=True, lazy=True, callback=callback)
+    f = function([x], z, mode=Mode(optimizer=None, linker=linker))
+
+    fgraph = f.maker.fgraph
+    (ifelse_node,) = [n for n in fgraph.apply_nodes if isinstance(n.op, IfElse)]
+    else_node = ifelse_node.inputs[2].owner
+    assert isinstance(else_node.op, FusedCOp)
+    assert else_node.op.n_nodes == 3
+
+    value = np.asarray([1.0, 2.0], dtype=config.floatX)
+    utt.assert_allclose(f(value), np.exp(value) * 2)
+    assert else_node not in calls
+
+    value = np.asarray([-10.0, -20.0], dtype=config.floatX)
+    utt.assert_allclose(f(value), np.tanh(np.exp(value) * 2) * 3 + 2)
+    assert calls.count(else_node) == 1
+
+
+@pytest.mark.slow
+@pytest.mark.skipif(
+    not theano.config.cxx, reason="G++ not available, so we need to skip this test."
+)
+def test_speed_fused():
+    def build_graph(x, depth):
+        z = x
+        for d in range(depth):
+            z = z * 1.0001 + 0.5 if d % 2 else tensor.tanh(z)
+        return z
+
+    def time_linker(name, linker, depth, n_calls=1000):
+        x = tensor.vector()
+        f = function(
+            [x], build_graph(x, depth), mode=Mode(optimizer=None, linker=linker)
+        )
+        value = np.asarray([2.0, 3.0], dtype=config.floatX)
+        f(value)
+        t0 = time.time()
+        for _ in range(n_calls):
+            f(value)
+        t1 = time.time()
+        print(f"{name} {depth} nodes takes {1e6 * (t1 - t0) / n_calls:f} us/call")
+        return f(value), t1 - t0
+
+    # Cloning and optimizing deep graphs is recursive.
+    old_limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(max(old_limit, 20000))
+    try:
+        for depth in (10, 100, 1000):
+            r, t = time_linker("cvm", "cvm", depth)
+            r_fused, t_fused = time_linker("cvm_fused", "cvm_fused", depth)
+            utt.assert_allclose(r, r_fused)
+            if depth >= 100:
+                assert t_fused < t
+    finally:
+        sys.setrecursionlimit(old_limit)
+
+
 def test_speed_lazy():
     def build_graph(x, depth=5):
         z = x
@@ -181,8 +299,6 @@ def test_speed_lazy():
 
 
 def test_partial_function():
-    from tests import unittest_tools as utt
-
     def check_partial_function(linker_name):
         x = tensor.scalar("input")
         y = x ** 2
@@ -403,8 +519,8 @@ def test_reallocation():
     z = tensor.tanh(3 * x + y) + tensor.cosh(x + 5 * y)
     # The functinality is currently implement for non lazy and non c VM only.
     for linker in [
-        VMLinker(allow_gc=False, lazy=False, use_cloop=False),
-        VMLinker(allow_gc=True, lazy=False, use_cloop=False),
+        VMLinker(allow_gc=False, lazy=False, use_cloop=False, memory_planner=False),
+        VMLinker(allow_gc=True, lazy=False, use_cloop=False, memory_planner=False),
     ]:
         m = theano.compile.get_mode(theano.Mode(linker=linker))
         m = m.excluding("fusion", "inplace")
@@ -430,6 +546,86 @@ def test_reallocation():
         assert len({id(v) for v in storage_map.values()}) < len(storage_map)
 
 
+def test_plan_memory():
+    x = tensor.matrix("x")
+    h = x
+    for i in range(5):
+        h = tensor.tanh(h * 2 + i) + tensor.exp(-h)
+    # The intermediate results that outputs are views of can't be reused
+    y = tensor.exp(h)
+    outputs = [h.sum(), y.T]
+    fgraph = theano.graph.fg.FunctionGraph([x], outputs)
+    order = fgraph.toposort()
+    buffers = plan_memory(order, fgraph)
+
+    planned = [var for buf in buffers for var in buf]
+    assert len(set(planned)) == len(planned)
+    assert y not in planned
+    assert not set(planned) & set(fgraph.outputs)
+    assert len(buffers) <= 4 < len(planned)
+
+    position = {node: i for i, node in enumerate(order)}
+    for buf in buffers:
+        assert len({var.type for var in buf}) == 1
+        # A variable is only computed once the previous one isn't used anymore
+        for var, next_var in zip(buf, buf[1:]):
+            last_use = max(position[c] for c, _ in fgraph.clients[var])
+            assert last_use < position[next_var.owner]
+
+
+@pytest.mark.parametrize("allow_gc", [False, True])
+@pytest.mark.parametrize("c_thunks", [False, None])
+def test_memory_planner(allow_gc, c_thunks):
+    x = tensor.matrix("x")
+    h = x
+    for i in range(5):
+        h = tensor.tanh(h * 2 + i) + tensor.exp(-h)
+    outputs = [h.sum(axis=0), h[0]]
+
+    def make_function(memory_planner):
+        linker = VMLinker(
+            allow_gc=allow_gc,
+            use_cloop=False,
+            lazy=False,
+            c_thunks=c_thunks,
+            memory_planner=memory_planner,
+        )
+        mode = Mode(linker=linker, optimizer="fast_run").excluding("fusion")
+        return function([x], outputs, mode=mode)
+
+    f = make_function(True)
+    f_ref = make_function(False)
+    assert isinstance(f.fn, LoopPlanned)
+
+    rng = np.random.RandomState(utt.fetch_seed())
+    for shape in [(3, 4), (3, 4), (5, 2)]:
+        x_val = rng.rand(*shape).astype(config.floatX)
+        for out, ref in zip(f(x_val), f_ref(x_val)):
+            utt.assert_allclose(out, ref)
+
+    # The buffers are kept between calls
+    held = {
+        id(v[0])
+        for v in f.fn.storage_map.values()
+        if isinstance(v[0], np.ndarray) and v[0].shape == (5, 2)
+    }
+    assert held
+
+
+def test_memory_schedule():
+    xs = [tensor.vector(f"x{i}") for i in range(3)]
+    out = tensor.add(*[tensor.exp(tensor.tanh(x) * 2).sum() for x in xs])
+
+    linker = VMLinker(use_cloop=False, lazy=False, memory_schedule=True)
+    f = function(xs, out, mode=Mode(linker=linker, optimizer="fast_run"))
+    assert isinstance(f.fn, (Loop, LoopGC))
+    assert f.fn.nodes == min_memory_schedule(f.maker.fgraph)
+
+    vals = [np.arange(5).astype(config.floatX) + i for i in range(3)]
+    expected = sum(np.exp(np.tanh(v) * 2).sum() for v in vals)
+    utt.assert_allclose(f(*vals), expected)
+
+
 @pytest.mark.skipif(
     not theano.config.cxx, reason="G++ not available, so we need to skip this test."
 )
@@ -0,0 +1,190 @@
+import numpy as np
+import pytest
+
+import theano
+import theano.tensor as tt
+from tests import unittest_tools as utt
+from theano.configdefaults import config
+from theano.graph.fg import FunctionGraph
+from theano.scan.op import Scan
+from theano.tensor.blas import BatchedDot
+from theano.vectorize import vectorize_fgraph, vectorize_graph
+
+
+def check_vectorize(inputs, outputs, vectorize, values, n=4):
+    """Compare a vectorized function with a loop over the unbatched one.
+
+    `values` gives one value per input; the ones of the inputs in
+    `vectorize` are given for a single batch entry and get stacked `n`
+    times (with some noise) to build the batch.
+
+    """
+    rng = np.random.RandomState(utt.fetch_seed())
+    f = theano.function(inputs, outputs)
+    f_vec = theano.function(inputs, outputs, vectorize=vectorize)
+
+    batches = []
+    args = []
+    for var, value in zip(inputs, values):
+        if var in vectorize:
+            value = np.asarray(value, dtype=var.dtype)
+            batch = np.stack(
+                [
+                    value + rng.uniform(size=value.shape).astype(var.dtype)
+                    for i in range(n)
+                ]
+            )
+            batches.append(batch)
+            args.append(batch)
+        else:
+            batches.append(None)
+            args.append(value)
+
+    results = f_vec(*args)
+    if not isinstance(outputs, list):
+        results = [results]
+    for i in range(n):
+        expected = f(
+            *[
+                value if batch is None else batch[i]
+                for value, batch in zip(values, batches)
+            ]
+        )
+        if not isinstance(outputs, list):
+            expected = [expected]
+        for res, exp in zip(results, expected):
+            assert res.shape[0] == n
+            utt.assert_allclose(res[i], exp)
+    return f_vec
+
+
+def test_vectorize_graph_types():
+    x = tt.vector("x")
+    y = tt.matrix("y")
+    [bx], (out, unbatched) = vectorize_graph([(x ** 2).sum(), y], [x])
+    assert bx.type == tt.matrix().type
+    assert bx.name == "x"
+    assert out.type == tt.vector().type
+    # Outputs that don't depend on the batched inputs are repeated.
+    assert unbatched.ndim == 3
+
+
+def test_vectorize_fgraph():
+    x = tt.vector("x")
+    a = tt.scalar("a")
+    fgraph = FunctionGraph([x, a], [tt.exp(x) * a], clone=False)
+    new_fgraph = vectorize_fgraph(fgraph, [x])
+    assert new_fgraph.inputs[1].type == a.type
+    assert new_fgraph.inputs[0].ndim == 2
+    assert new_fgraph.outputs[0].ndim == 2
+
+    with pytest.raises(ValueError):
+        vectorize_fgraph(fgraph, [tt.vector()])
+
+
+def test_elemwise_dimshuffle_careduce():
+    x = tt.matrix("x")
+    w = tt.vector("w")
+    out = [(tt.exp(x) * w).sum(axis=0), x.T.max(), (x + 1).dimshuffle(1, "x", 0)]
+    values = [np.ones((3, 2)), np.arange(2.0)]
+    check_vectorize([x, w], out, [x], values)
+    check_vectorize([x, w], out, [w], values)
+    check_vectorize([x, w], out, [x, w], values)
+
+
+@pytest.mark.parametrize(
+    "x_shape, y_shape", [((3,), (3,)), ((2, 3), (3,)), ((3,), (3, 2)), ((2, 3), (3, 4))]
+)
+@pytest.mark.parametrize("batched", [[0], [1], [0, 1]])
+def test_dot(x_shape, y_shape, batched):
+    x = tt.tensor(config.floatX, (False,) * len(x_shape), name="x")
+    y = tt.tensor(config.floatX, (False,) * len(y_shape), name="y")
+    values = [
+        np.ones(x_shape, dtype=config.floatX),
+        np.ones(y_shape, dtype=config.floatX),
+    ]
+    check_vectorize([x, y], tt.dot(x, y), [[x, y][i] for i in batched], values)
+
+
+@pytest.mark.parametrize("batched", [[0], [1], [0, 1]])
+def test_batched_dot(batched):
+    x = tt.tensor3("x")
+    y = tt.tensor3("y")
+    values = [np.ones((2, 3, 4)), np.ones((2, 4, 5))]
+    f = check_vectorize(
+        [x, y], tt.batched_dot(x, y), [[x, y][i] for i in batched], values
+    )
+    nodes = f.maker.fgraph.toposort()
+    assert not any(isinstance(node.op, Scan) for node in nodes)
+
+
+def test_subtensor():
+    x = tt.matrix("x")
+    i = tt.lscalar("i")
+    y = tt.vector("y")
+    out = [x[i, 1:], tt.set_subtensor(x[1:, i], y), tt.inc_subtensor(x[i], 1.0)]
+    values = [np.ones((3, 4)), 2, np.ones(2)]
+    f = check_vectorize([x, i, y], out, [x], values)
+    assert not any(isinstance(node.op, Scan) for node in f.maker.fgraph.toposort())
+    check_vectorize([x, i, y], out, [y], values)
+    check_vectorize([x, i, y], out, [x, y], values)
+
+
+def test_shape():
+    x = tt.matrix("x")
+    out = tt.zeros_like(x[0]) + x.shape[1] + x.shape.prod()
+    f = check_vectorize([x], out, [x], [np.ones((3, 4))])
+    assert not any(isinstance(node.op, Scan) for node in f.maker.fgraph.toposort())
+
+
+def test_scan():
+    h0 = tt.vector("h0")
+    w = tt.vector("w")
+    seq = tt.matrix("seq")
+
+    def step(s, h, w):
+        return tt.tanh(h * w + s), (h ** 2).sum()
+
+    (h, norms), _ = theano.scan(
+        step, sequences=[seq], outputs_info=[h0, None], non_sequences=[w]
+    )
+    out = [h[-1], norms]
+    values = [np.zeros(3), np.ones(3), np.ones((5, 3))]
+    for batched in ([w], [h0], [seq], [h0, w, seq]):
+        f = check_vectorize([h0, w, seq], out, batched, values)
+        # The scan itself is vectorized, not looped over.
+        scans = [
+            node for node in f.maker.fgraph.toposort() if isinstance(node.op, Scan)
+        ]
+        assert len(scans) == 1
+
+
+def test_loop_fallback():
+    x = tt.vector("x")
+    out = tt.sort(x)[::-1]
+    f = check_vectorize([x], out, [x], [np.arange(4.0)])
+    assert any(isinstance(node.op, Scan) for node in f.maker.fgraph.toposort())
+
+
+def test_function_vectorize():
+    x = tt.vector("x")
+    a = tt.scalar("a")
+    f = theano.function(
+        [theano.In(a, value=2.0), x], {"y": a * x, "a": a}, vectorize=[x]
+    )
+    out = f(x=np.ones((3, 2), dtype=config.floatX))
+    utt.assert_allclose(out["y"], np.full((3, 2), 2.0))
+    utt.assert_allclose(out["a"], np.full(3, 2.0))
+
+    s = theano.shared(0.0)
+    with pytest.raises(NotImplementedError):
+        theano.function([x], x, updates=[(s, s + 1)], vectorize=[x])
+    with pytest.raises(ValueError):
+        theano.function([x], x, vectorize=[a])
+
+
+def test_vectorize_dot_uses_batched_dot():
+    x = tt.matrix("x")
+    y = tt.matrix("y")
+    [bx, by], out = vectorize_graph(tt.dot(x, y), [x, y])
+    assert isinstance(out.owner.op, BatchedDot)
@@ -145,6 +145,7 @@ def sparse_grad(var):
 
 import theano.tensor.random.var
 from theano.scan import checkpoints, clone, foldl, foldr, map, reduce, scan
+from theano.vectorize import vectorize_graph
 
 
 # Some config variables are registered by submodules. Only after all those imports
@@ -1,3 +1,4 @@
+import copy
 import logging
 import re
 import traceback as tb
@@ -85,6 +86,48 @@ def function_dump(
         pickler.dump(d)
 
 
+def _vectorize_io(inputs, outputs, vectorize):
+    """Replace `inputs` and `outputs` by their batched versions.
+
+    `inputs` and `outputs` can contain `In` and `Out` instances, which are
+    copied with their variable replaced.
+
+    """
+    from theano.compile.io import In, Out
+    from theano.vectorize import vectorize_graph
+
+    def variable(x):
+        return x.variable if isinstance(x, (In, Out)) else x
+
+    def rebuild(x, var):
+        if isinstance(x, (In, Out)):
+            x = copy.copy(x)
+            x.variable = var
+            return x
+        return var
+
+    input_vars = [variable(i) for i in inputs]
+    for var in vectorize:
+        if var not in input_vars:
+            raise ValueError(f"The vectorized variable {var} is not an input.")
+
+    if outputs is None:
+        output_list = []
+    elif isinstance(outputs, (list, tuple)):
+        output_list = list(outputs)
+    else:
+        output_list = [outputs]
+    new_vars, new_outputs = vectorize_graph(
+        [variable(o) for o in output_list], list(vectorize)
+    )
+    replace = dict(zip(vectorize, new_vars))
+    new_inputs = [rebuild(i, replace.get(variable(i), variable(i))) for i in inputs]
+    new_outputs = [rebuild(o, var) for o, var in zip(output_list, new_outputs)]
+    if outputs is None or isinstance(outputs, (list, tuple)):
+        return new_inputs, new_outputs
+    return new_inputs, new_outputs[0]
+
+
 def function(
     inputs,
     outputs=None,
@@ -98,6 +141,7 @@ def function(
     allow_input_downcast=None,
     profile=None,
     on_unused_input=None,
+    vectorize=None,
 ):
     """
     Return a :class:`callable object <theano.compile.function.types.Function>`
@@ -155,6 +199,12 @@ def function(
     on_unused_input
         What to do if a variable in the 'inputs' list is not used in the graph.
         Possible values are 'raise', 'warn', 'ignore' and None.
+    vectorize: list of Variables or None
+        Inputs that are given with an extra leading (batch) axis. The
+        function then computes its outputs for every entry of that axis in a
+        single call, and every output gets the same leading axis. This can't
+        be combined with `updates` or `givens`. See
+        :func:`theano.vectorize.vectorize_graph`.
 
     Returns
     -------
@@ -317,6 +367,13 @@ def function(
     uses_updates = bool(updates)
     uses_givens = bool(givens)
 
+    if vectorize:
+        if uses_tuple or uses_updates or uses_givens:
+            raise NotImplementedError(
+                "vectorize can't be used with tuple inputs, updates or givens"
+            )
+        inputs, outputs = _vectorize_io(inputs, outputs, vectorize)
+
     if uses_tuple:
         # we must use old semantics in this case.
         if profile:
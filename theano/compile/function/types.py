@@ -6,8 +6,6 @@ Driver of graph construction, optimization, and linking.
 import copy
 import copyreg
 import logging
-import os
-import pickle
 import time
 import warnings
 from itertools import chain
@@ -16,9 +14,15 @@ import numpy as np
 
 import theano
 import theano.compile.profiling
-from theano.compile.compilelock import lock_ctx
+from theano.compile.incremental import (
+    ReplacementTracker,
+    get_subgraph_cache,
+    input_masks,
+)
 from theano.compile.io import In, SymbolicInput, SymbolicOutput
 from theano.compile.ops import deep_copy_op, view_op
+from theano.compile.optcache import get_optimized_graph_cache
+from theano.compile.specialize import ShapeSpecializer
 from theano.configdefaults import config
 from theano.graph.basic import (
     Constant,
@@ -26,12 +30,13 @@ from theano.graph.basic import (
     ancestors,
     clone_get_equiv,
     graph_inputs,
-    vars_between,
+    io_toposort,
 )
 from theano.graph.destroyhandler import DestroyHandler
 from theano.graph.fg import FunctionGraph, InconsistencyError
 from theano.graph.op import ops_with_inner_function
-from theano.graph.toolbox import PreserveVariableAttributes, is_same_graph
+from theano.graph.opt import MergeOptimizer
+from theano.graph.toolbox import PreserveVariableAttributes
 from theano.graph.utils import get_variable_trace_string
 from theano.link.basic import Container
 from theano.link.utils import raise_with_op
@@ -374,6 +379,13 @@ class Function:
 
     """
 
+    shape_specializer = None
+    """
+    A `ShapeSpecializer` selecting the fn to run for the shapes of the inputs,
+    or None to always run `fn`.
+
+    """
+
     def __init__(
         self,
         fn,
@@ -967,32 +979,21 @@ class Function:
                         f"Tried to provide value for implicit input: {getattr(self.inv_finder[c], 'variable', self.inv_finder[c])}"
                     )
 
+        fn, output_storage = self.fn, self.output_storage
+        if self.shape_specializer is not None:
+            fn, output_storage = self.shape_specializer.select(self)
+        if profile:
+            # Only 1 in profile.sample_every calls times the thunks
+            sampled = profile.fct_callcount % profile.sample_every == 0
+            fn.time_thunks = profile.flag_time_thunks and sampled
+
         # Do the actual work
         t0_fn = time.time()
         try:
-            outputs = (
-                self.fn()
-                if output_subset is None
-                else self.fn(output_subset=output_subset)
-            )
+            outputs = fn() if output_subset is None else fn(output_subset=output_subset)
         except Exception:
             restore_defaults()
-            if hasattr(self.fn, "position_of_error"):
-                # this is a new vm-provided function or c linker
-                # they need this because the exception manipulation
-                # done by raise_with_op is not implemented in C.
-                thunk = None
-                if hasattr(self.fn, "thunks"):
-                    thunk = self.fn.thunks[self.fn.position_of_error]
-                raise_with_op(
-                    self.maker.fgraph,
-                    node=self.fn.nodes[self.fn.position_of_error],
-                    thunk=thunk,
-                    storage_map=getattr(self.fn, "storage_map", None),
-                )
-            else:
-                # old-style linkers raise their own exceptions
-                raise
+            self._reraise_fn_error(fn)
 
         dt_fn = time.time() - t0_fn
         self.maker.mode.fn_time += dt_fn
@@ -1001,8 +1002,8 @@ class Function:
 
         # Retrieve the values that were computed
         if outputs is None:
-            outputs = [x.data for x in self.output_storage]
-        assert len(outputs) == len(self.output_storage)
+            outputs = [x.data for x in output_storage]
+        assert len(outputs) == len(output_storage)
 
         # Remove internal references to required inputs.
         # These cannot be re-used anyway.
@@ -1012,17 +1013,16 @@ class Function:
 
         # if we are allowing garbage collection, remove the
         # output reference from the internal storage cells
-        if getattr(self.fn, "allow_gc", False):
-            assert len(self.output_storage) == len(self.maker.fgraph.outputs)
-            for o_container, o_variable in zip(
-                self.output_storage, self.maker.fgraph.outputs
-            ):
+        if getattr(fn, "allow_gc", False):
+            fgraph = getattr(fn, "fgraph", self.maker.fgraph)
+            assert len(output_storage) == len(fgraph.outputs)
+            for o_container, o_variable in zip(output_storage, fgraph.outputs):
                 if o_variable.owner is not None:
                     # this node is the variable of computation
                     # WARNING: This circumvents the 'readonly' attribute in x
                     o_container.storage[0] = None
 
-        if getattr(self.fn, "need_update_inputs", True):
+        if getattr(fn, "need_update_inputs", True):
             # Update the inputs that have an update function
             for input, storage in reversed(
                 list(zip(self.maker.expanded_inputs, self.input_storage))
@@ -1046,8 +1046,8 @@ class Function:
         if profile:
             profile.fct_callcount += 1
             profile.fct_call_time += dt_call
-            if hasattr(self.fn, "update_profile"):
-                self.fn.update_profile(profile)
+            if sampled and hasattr(fn, "update_profile"):
+                fn.update_profile(profile, scale=profile.sample_every)
             if profile.ignore_first_call:
                 profile.reset()
                 profile.ignore_first_call = False
@@ -1085,6 +1085,96 @@ class Function:
         doc=("dictionary-like access to the containers associated with " "Variables"),
     )
 
+    def _reraise_fn_error(self, fn=None):
+        """
+        Re-raise the exception raised by `fn` (by default `self.fn`), with node
+        information.
+
+        """
+        if fn is None:
+            fn = self.fn
+        if hasattr(fn, "position_of_error"):
+            # this is a new vm-provided function or c linker
+            # they need this because the exception manipulation
+            # done by raise_with_op is not implemented in C.
+            thunk = None
+            if hasattr(fn, "thunks"):
+                thunk = fn.thunks[fn.position_of_error]
+            raise_with_op(
+                getattr(fn, "fgraph", self.maker.fgraph),
+                node=fn.nodes[fn.position_of_error],
+                thunk=thunk,
+                storage_map=getattr(fn, "storage_map", None),
+            )
+        else:
+            # old-style linkers raise their own exceptions
+            raise
+
+    def fast_call(self):
+        """
+        Return a `FastCall`, a low-overhead callable evaluating this function.
+
+        See `FastCall` for its restrictions.
+
+        """
+        return FastCall(self)
+
+    def attach_profile(self, profile=True, sample_every=None):
+        """
+        Start profiling the calls of this function, without recompiling it.
+
+        Only the thunk timings and the call times are recorded: the
+        optimizer and linker times, and the memory profile, need a function
+        compiled with a profile.
+
+        Parameters
+        ----------
+        profile : bool, str or ProfileStats
+            The profile in which to accumulate the statistics. If True or a
+            string, a new `ProfileStats` is created, with that string as its
+            message.
+        sample_every : int or None
+            If not None, set the `sample_every` attribute of the profile: only
+            1 in `sample_every` calls times the thunks, and their statistics
+            are scaled by `sample_every`.
+
+        Returns
+        -------
+        ProfileStats
+            The profile.
+
+        """
+        if profile is True:
+            profile = theano.compile.profiling.ProfileStats(message=self.name)
+        elif isinstance(profile, str):
+            profile = theano.compile.profiling.ProfileStats(message=profile)
+        if sample_every is not None:
+            if sample_every < 1:
+                raise ValueError("sample_every must be at least 1")
+            profile.sample_every = sample_every
+        self.profile = profile
+        return profile
+
+    def detach_profile(self):
+        """
+        Stop profiling the calls of this function.
+
+        Returns
+        -------
+        ProfileStats or None
+            The profile that was attached, or the one the function was
+            compiled with.
+
+        """
+        profile = self.profile
+        self.profile = None
+        fns = [self.fn]
+        if self.shape_specializer is not None:
+            fns.extend(self.shape_specializer.fns())
+        for fn in fns:
+            fn.time_thunks = False
+        return profile
+
     def free(self):
         """
         When allow_gc = False, clear the Variables in storage_map
@@ -1092,9 +1182,13 @@ class Function:
         # 1.no allow_gc return False
         # 2.has allow_gc, if allow_gc is False, return True
         if not getattr(self.fn, "allow_gc", True):
-            for key in self.fn.storage_map:
-                if not isinstance(key, Constant):
-                    self.fn.storage_map[key][0] = None
+            fns = [self.fn]
+            if self.shape_specializer is not None:
+                fns.extend(self.shape_specializer.fns())
+            for fn in fns:
+                for key in fn.storage_map:
+                    if not isinstance(key, Constant):
+                        fn.storage_map[key][0] = None
 
             for node in self.nodes_with_inner_function:
                 ops_with_inner_function[node.op].free()
@@ -1115,6 +1209,103 @@ class Function:
                     inp.data.sync()
 
 
+class FastCall:
+    """
+    A low-overhead callable evaluating a `Function`.
+
+    It takes exactly one positional argument per explicit input of the
+    function, in order, and only does the work needed to run the VM: the
+    arguments are put in the input storage as is, and the outputs are read
+    from the output storage cells, all of them being collected once at
+    creation time. As with ``trust_input=True``, the arguments are neither
+    filtered nor checked for aliasing, so they must already have the exact
+    type the function expects. Keyword arguments and ``output_subset`` are
+    not supported, the calls are not recorded by the profiler, and the
+    references to the arguments are kept until the next call.
+
+    The outputs are returned as by the `Function`, and the updates are
+    applied in the same way. The function itself stays usable.
+
+    Parameters
+    ----------
+    function : Function
+        The function to evaluate.
+
+    """
+
+    def __init__(self, function):
+        self.function = function
+        self.fn = fn = function.fn
+        explicit = [c for c in function.input_storage if not c.implicit]
+        self.n_inputs = len(explicit)
+        self._input_cells = [c.storage for c in explicit]
+        # The default values to restore after each call, for `function`
+        self._refeed = [
+            (c.storage, value.storage[0] if isinstance(value, Container) else value)
+            for c, (required, refeed, value) in zip(
+                function.input_storage, function.defaults
+            )
+            if refeed and not c.implicit
+        ]
+        self._output_cells = [c.storage for c in function.output_storage]
+        if getattr(fn, "allow_gc", False):
+            self._gc_cells = [
+                c.storage
+                for c, var in zip(
+                    function.output_storage, function.maker.fgraph.outputs
+                )
+                if var.owner is not None
+            ]
+        else:
+            self._gc_cells = []
+        if getattr(fn, "need_update_inputs", True):
+            self._update_containers = [
+                c
+                for inp, c in zip(
+                    function.maker.expanded_inputs, function.input_storage
+                )
+                if inp.update is not None
+            ]
+            self._n_returned = len(self._output_cells) - len(self._update_containers)
+        else:
+            self._update_containers = []
+            self._n_returned = function.n_returned_outputs
+        self._return_none = function.return_none
+        self._unpack_single = function.unpack_single and self._n_returned == 1
+        self._output_keys = function.output_keys
+
+    def __call__(self, *args):
+        if len(args) != self.n_inputs:
+            raise TypeError(
+                f"Expected {self.n_inputs} positional arguments, got {len(args)}"
+            )
+        for cell, arg in zip(self._input_cells, args):
+            cell[0] = arg
+        try:
+            outputs = self.fn()
+        except Exception:
+            self.function._reraise_fn_error()
+        if outputs is None:
+            outputs = [cell[0] for cell in self._output_cells]
+        for cell in self._gc_cells:
+            cell[0] = None
+        if self._update_containers:
+            for c, value in zip(self._update_containers, outputs[self._n_returned :]):
+                c.data = value
+        if self._refeed:
+            for cell, value in self._refeed:
+                cell[0] = value
+
+        if self._return_none:
+            return None
+        elif self._unpack_single:
+            return outputs[0]
+        outputs = outputs[: self._n_returned]
+        if self._output_keys is not None:
+            return dict(zip(self._output_keys, outputs))
+        return outputs
+
+
 # pickling/deepcopy support for Function
 def _pickle_Function(f):
     # copy of the input storage list
@@ -1360,157 +1551,202 @@ class FunctionMaker:
         else:
             raise TypeError(f"Unknown output type: {type(output)} ({output})")
 
-    def optimize_graph_with_cache(self, optimizer, inputs, outputs):
-        # This function is not finished
-        graph_db_file = os.path.join(config.compiledir, "optimized_graphs.pkl")
-
-        # the inputs, outputs, and size of the graph to be optimized
-        inputs_new = [inp.variable for inp in inputs]
-        outputs_new = [out.variable for out in outputs]
-        size_new = len(self.fgraph.apply_nodes)
+    def optimize_graph_with_cache(self, optimizer, query, input_specs):
+        """
+        Optimize `self.fgraph`, reusing a previously optimized version of
+        the same graph from the on-disk cache when there is one.
 
-        # Beginning of cache optimizations.
-        # Could be refactored in different functions.
+        See `theano.compile.optcache`.
 
-        def load_graph_db():
-            if os.path.isfile(graph_db_file):
-                print("graph_db already exists")
-            else:
-                # create graph_db
-                with open(graph_db_file, "wb") as f:
-                    print(f"create new graph_db in {graph_db_file}")
-            # load the graph_db dictionary
+        """
+        cache = get_optimized_graph_cache()
+        fgraph = self.fgraph
+        key = cache.key(fgraph, query, input_specs)
+        entry = None if key is None else cache.get(key)
+
+        if entry is not None:
+            _logger.debug(f"Reusing optimized graph {key}")
+            cached_inputs, cached_outputs = entry
+            memo = dict(zip(cached_inputs, fgraph.inputs))
+            equiv = clone_get_equiv(
+                cached_inputs, cached_outputs, copy_inputs=False, memo=memo
+            )
+            new_outputs = [equiv[out] for out in cached_outputs]
+            old_outputs = list(fgraph.outputs)
+            destroy_handler = None
+            if not hasattr(fgraph, "destroyers") and any(
+                getattr(node.op, "destroy_map", None)
+                for node in io_toposort(fgraph.inputs, new_outputs)
+            ):
+                destroy_handler = DestroyHandler()
+                fgraph.attach_feature(destroy_handler)
+            for i, new_output in enumerate(new_outputs):
+                fgraph.change_input(
+                    "output", i, new_output, reason="optimized_graph_cache"
+                )
             try:
-                with open(graph_db_file, "rb") as f, config.change_flags(
-                    unpickle_function=False
-                ):
-                    # Temporary hack to allow
-                    # tests.scan.test_scan.T_Scan to
-                    # finish. Should be changed in definitive version.
-                    graph_db = pickle.load(f)
-                print("graph_db loaded and it is not empty")
-            except EOFError as e:
-                # the file has nothing in it
-                print(e)
-                print("graph_db loaded and it is empty")
-                graph_db = {}
-
-            return graph_db
-
-        def find_same_graph_in_db(graph_db):
-            # If found_graph_in_db is None, then need to optimize.
-            # Otherwise, return the graph found.
-            found_graph_in_db = None
-            # The sole purpose of this loop is to set 'need_optimize' by
-            # going through graph_db, looking for graph that has the same
-            # computation performed.
-            for graph_old, graph_optimized in graph_db.items():
-                inputs_old = graph_old.inputs
-                outputs_old = graph_old.outputs
-                size_old = len(graph_old.apply_nodes)
-                # Some heuristics to check is the same graphs have
-                # already been optimized before.
-                if len(inputs_new) != len(inputs_old):
-                    # If the inputs are of different size,
-                    # two graphs are for sure different
-                    print("need to optimize, because input size is different")
-                    continue
-                elif len(outputs_new) != len(outputs_old):
-                    # If the inputs are of different size,
-                    # two graphs are for sure different
-                    print("need to optimize, because output size is different")
-                    continue
-                elif not all(
-                    input_new.type == input_old.type
-                    for input_new, input_old in zip(inputs_new, inputs_old)
-                ):
-                    print("need to optimize, because inputs are of different " "types")
-                    continue
-                elif not all(
-                    output_new.type == output_old.type
-                    for output_new, output_old in zip(outputs_new, outputs_old)
-                ):
-                    print("need to optimize, because outputs are of different " "types")
-                    continue
-                elif not size_old == size_new:
-                    print(
-                        "need to optimize, because numbers of nodes in graph"
-                        " are different"
+                # The `Supervisor` checks that the protected inputs aren't
+                # destroyed by the cached graph.
+                fgraph.validate()
+                return None
+            except InconsistencyError as e:
+                _logger.warning(f"Cached optimized graph {key} is invalid: {e}")
+                for i, old_output in enumerate(old_outputs):
+                    fgraph.change_input(
+                        "output", i, old_output, reason="optimized_graph_cache"
                     )
-                    continue
-                else:
-                    flags = []
-                    for i, (output_new, output_old) in enumerate(
-                        zip(outputs_new, outputs_old)
-                    ):
-                        print("loop through outputs node for both graphs")
-                        graph_old.variables = set(
-                            vars_between(graph_old.inputs, graph_old.outputs)
-                        )
+                if destroy_handler is not None:
+                    fgraph.remove_feature(destroy_handler)
 
-                        # using clone allowed to avoid a lot of errors
-                        # deep copy seemed to had.
-                        f2 = graph_old.clone(check_integrity=False)
-                        t1 = output_new
-                        t2 = f2.outputs[i]
+        optimizer_profile = optimizer(fgraph)
+        if key is not None:
+            cache.put(key, fgraph)
+        return optimizer_profile
 
-                        givens = dict(
-                            zip(
-                                graph_inputs([t1]),
-                                graph_inputs([t2]),
-                            )
-                        )
+    def optimize_graph_incrementally(self, optimizer, query, input_specs):
+        """
+        Optimize `self.fgraph`, reusing the optimized version of the
+        subgraphs it shares with previously optimized graphs.
 
-                        temp = dict(
-                            zip(
-                                graph_inputs([t1]),
-                                graph_inputs([t2]),
-                            )
-                        )
+        Only the part of the graph that isn't covered by such subgraphs is
+        given to `optimizer`. Optimizations that would have crossed the
+        boundary between the two parts are lost.
 
-                        # hack to remove inconstent entry in givens
-                        # seems to work that but source of inconsistency
-                        # could be worth investigating.
-                        for key, value in temp.items():
-                            if key.type != value.type:
-                                del givens[key]
+        See `theano.compile.incremental`.
 
-                        flag = is_same_graph(t1, t2, givens=givens)
+        """
+        cache = get_subgraph_cache()
+        fgraph = self.fgraph
+        context = cache.context_key(fgraph, query)
+        hashes = None if context is None else cache.hashes(fgraph, input_specs)
+        if hashes is None:
+            return self._optimize_graph(optimizer, query, input_specs)
+        masks = input_masks(fgraph.inputs, fgraph.outputs)
+
+        frontier = cache.frontier(context, hashes, fgraph)
+        if frontier:
+            try:
+                return self._optimize_graph_region(
+                    optimizer, cache, context, hashes, masks, frontier
+                )
+            except InconsistencyError as e:
+                _logger.warning(f"Reusing optimized subgraphs failed: {e}")
 
-                        flags.append(flag)
+        tracker = ReplacementTracker()
+        fgraph.attach_feature(tracker)
+        try:
+            optimizer_profile = self._optimize_graph(optimizer, query, input_specs)
+        finally:
+            fgraph.remove_feature(tracker)
+        cache.misses += 1
+        forms = {
+            var: tracker.resolve(var, fgraph.variables)
+            for var in hashes
+            if var.owner is not None
+        }
+        cache.add(context, hashes, masks, fgraph, forms)
+        return optimizer_profile
 
-                    is_same = all(flags)
-                    if is_same:
-                        # found the match
-                        print("found a match, no need to optimize")
-                        found_graph_in_db = graph_optimized
-                        break
-            return found_graph_in_db
-
-        with lock_ctx():
-            graph_db = load_graph_db()
-            print(f"loaded graph_db from {graph_db_file}, size={len(graph_db)}")
-            found_graph = find_same_graph_in_db(graph_db)
-            if found_graph:
-                self.fgraph = found_graph
-                optimizer_profile = None
-            else:
-                # this is a brand new graph, optimize it, save it to graph_db
-                print("graph not found in graph_db, optimizing the graph")
-                self.fgraph.variables = set(
-                    vars_between(self.fgraph.inputs, self.fgraph.outputs)
-                )
-                # check_integrity parameters was added to ignore
-                # "excess cached variables" errors. Works that way
-                # but once again the error couldbe worth
-                # investigating.
-                before_opt = self.fgraph.clone(check_integrity=False)
-                optimizer_profile = optimizer(self.fgraph)
-                graph_db.update({before_opt: self.fgraph})
-                with open(graph_db_file, "wb") as f:
-                    pickle.dump(graph_db, f, -1)
-                print("new graph saved into graph_db")
+    def _optimize_graph(self, optimizer, query, input_specs):
+        if config.cache_optimizations:
+            return self.optimize_graph_with_cache(optimizer, query, input_specs)
+        return optimizer(self.fgraph)
+
+    def _optimize_graph_region(
+        self, optimizer, cache, context, hashes, masks, frontier
+    ):
+        """
+        Optimize the part of `self.fgraph` above `frontier`, and replace the
+        variables of `frontier` by their cached optimized version.
 
+        """
+        fgraph = self.fgraph
+
+        # Cut the graph at the frontier, which becomes inputs of the region
+        # to optimize.  They must not be destroyed, as the cached subgraphs
+        # that will compute them may be used elsewhere.
+        placeholders = [var.type() for var in frontier]
+        equiv = clone_get_equiv(
+            fgraph.inputs + frontier,
+            fgraph.outputs,
+            copy_inputs=False,
+            memo=dict(zip(frontier, placeholders)),
+        )
+        region = FunctionGraph(
+            fgraph.inputs + placeholders,
+            [equiv[out] for out in fgraph.outputs],
+            clone=False,
+            update_mapping=fgraph.update_mapping,
+        )
+        protected = [
+            var
+            for feature in fgraph._features
+            if isinstance(feature, Supervisor)
+            for var in feature.protected
+        ]
+        region.attach_feature(Supervisor(protected + placeholders))
+        for feature in std_fgraph.features:
+            region.attach_feature(feature())
+        tracker = ReplacementTracker()
+        region.attach_feature(tracker)
+        region_size = len(region.apply_nodes)
+        optimizer_profile = optimizer(region)
+
+        # Clone the cached subgraphs on the inputs of `fgraph`, and plug them
+        # and the optimized region into it.
+        splice = {}
+        entries = {}
+        for var, placeholder in zip(frontier, placeholders):
+            entry, cached_var = cache.lookup(context, hashes[var])
+            entries.setdefault(entry, []).append((placeholder, cached_var))
+        for entry, items in entries.items():
+            cached_equiv = clone_get_equiv(
+                entry.inputs,
+                [cached_var for _, cached_var in items],
+                copy_inputs=False,
+                memo=dict(zip(entry.inputs, fgraph.inputs)),
+            )
+            for placeholder, cached_var in items:
+                splice[placeholder] = cached_equiv[cached_var]
+        region_equiv = clone_get_equiv(
+            region.inputs, region.outputs, copy_inputs=False, memo=splice
+        )
+        new_outputs = [region_equiv[out] for out in region.outputs]
+
+        old_outputs = list(fgraph.outputs)
+        destroy_handler = None
+        if not hasattr(fgraph, "destroyers") and any(
+            getattr(node.op, "destroy_map", None)
+            for node in io_toposort(fgraph.inputs, new_outputs)
+        ):
+            destroy_handler = DestroyHandler()
+            fgraph.attach_feature(destroy_handler)
+        for i, new_output in enumerate(new_outputs):
+            fgraph.change_input("output", i, new_output, reason="incremental")
+        try:
+            # Merge the computations that the cached subgraphs and the region
+            # have in common.
+            MergeOptimizer().optimize(fgraph)
+            fgraph.validate()
+        except InconsistencyError:
+            for i, old_output in enumerate(old_outputs):
+                fgraph.change_input("output", i, old_output, reason="incremental")
+            if destroy_handler is not None:
+                fgraph.remove_feature(destroy_handler)
+            raise
+
+        cache.hits += 1
+        cache.last_region_size = region_size
+        # Record the result, so that the region can be reused in turn.
+        forms = {}
+        for var, region_var in equiv.items():
+            if var not in hashes or var.owner is None:
+                continue
+            region_var = tracker.resolve(region_var, region.variables)
+            form = region_equiv.get(region_var)
+            if form is not None:
+                forms[var] = form
+        cache.add(context, hashes, masks, fgraph, forms)
         return optimizer_profile
 
     def __init__(
@@ -1607,12 +1843,14 @@ class FunctionMaker:
                     traceback__limit=config.traceback__compile_limit,
                 ):
                     # now optimize the graph
-                    if config.cache_optimizations:
-                        optimizer_profile = self.optimize_graph_with_cache(
-                            optimizer, inputs, outputs
+                    if config.incremental_optimization:
+                        optimizer_profile = self.optimize_graph_incrementally(
+                            optimizer, mode._optimizer, inputs
                         )
                     else:
-                        optimizer_profile = optimizer(fgraph)
+                        optimizer_profile = self._optimize_graph(
+                            optimizer, mode._optimizer, inputs
+                        )
 
                     end_optimizer = time.time()
                     opt_time = end_optimizer - start_optimizer
@@ -1845,6 +2083,8 @@ class FunctionMaker:
         if self.profile:
             self.profile.linker_time += linker_time
             _fn.time_thunks = self.profile.flag_time_thunks
+            if self.profile.flag_time_thunks and config.profiling__timeline:
+                _fn.timeline = []
             import_time = theano.link.c.cmodule.import_time - start_import_time
             self.profile.import_time += import_time
 
@@ -1863,6 +2103,17 @@ class FunctionMaker:
         )
 
         fn.profile = self.profile
+        # The profiles are per graph, and the makers of DebugMode and the like
+        # check the graphs they build, so only specialize the other functions
+        if (
+            config.function__specialize_shapes
+            and not self.profile
+            and type(self) is FunctionMaker
+        ):
+            fn.shape_specializer = ShapeSpecializer(
+                config.function__specialize_shapes__after,
+                config.function__specialize_shapes__max_entries,
+            )
         return fn
 
 
@@ -0,0 +1,272 @@
+"""
+An in-memory cache of optimized subgraphs, used to re-optimize a graph
+incrementally.
+
+When ``config.incremental_optimization`` is True, every graph optimized by a
+`FunctionMaker` is recorded here: each variable of the unoptimized graph is
+indexed by its structural hash (see `theano.graph.hashing`) and mapped to the
+variable that replaced it in the optimized graph. When a graph that shares
+subgraphs with a previously optimized one is compiled, the largest such
+subgraphs are cut out and replaced by their optimized version, so that the
+optimizer only runs on the part of the graph that changed. The optimizations
+that would have crossed the boundary between the reused subgraphs and the rest
+of the graph (e.g. fusing elemwise operations or making them inplace) are lost.
+
+Contrary to `theano.compile.optcache`, this cache lives in the memory of the
+current process.
+
+"""
+import logging
+from collections import OrderedDict
+
+from theano.compile.ops import Shape, Shape_i
+from theano.compile.optcache import _optimization_config_key
+from theano.configdefaults import config
+from theano.graph.basic import Constant, clone_get_equiv, io_toposort
+from theano.graph.hashing import (
+    UnhashableGraphError,
+    _digest,
+    type_token,
+    variable_hashes,
+)
+from theano.graph.optdb import Query
+from theano.graph.toolbox import Feature
+
+
+_logger = logging.getLogger("theano.compile.incremental")
+
+
+class ReplacementTracker(Feature):
+    """
+    Record which variable replaced which during the optimization of a
+    `FunctionGraph`.
+
+    Replacements that are reverted (e.g. because they didn't validate) are
+    forgotten.
+
+    """
+
+    def on_attach(self, fgraph):
+        self.replaced = {}
+
+    def on_change_input(self, fgraph, node, i, r, new_r, reason=None):
+        if self.replaced.get(new_r) is r:
+            del self.replaced[new_r]
+        else:
+            self.replaced[r] = new_r
+
+    def resolve(self, var, variables):
+        """
+        Return the variable that `var` ended up being replaced by among
+        `variables`, or None if there is none.
+
+        """
+        seen = set()
+        while var not in variables:
+            if var in seen or var not in self.replaced:
+                return None
+            seen.add(var)
+            var = self.replaced[var]
+        return var
+
+
+class _Entry:
+    """
+    An optimized graph, whose inputs were replaced by fresh variables, and
+    the keys under which its variables are indexed.
+
+    """
+
+    def __init__(self, inputs, keys):
+        self.inputs = inputs
+        self.keys = keys
+
+
+def input_masks(inputs, outputs):
+    """
+    Return, for every variable between `inputs` and `outputs`, a bitmask of
+    the inputs it depends on.
+
+    """
+    masks = {inp: 1 << i for i, inp in enumerate(inputs)}
+    for node in io_toposort(inputs, outputs):
+        mask = 0
+        for var in node.inputs:
+            mask |= masks.get(var, 0)
+        for out in node.outputs:
+            masks.setdefault(out, mask)
+    return masks
+
+
+class SubgraphCache:
+    """
+    An in-memory cache mapping unoptimized subgraphs to their optimized
+    version.
+
+    Parameters
+    ----------
+    max_entries : int
+        The maximum number of optimized graphs to keep. Non-positive means no
+        limit.
+
+    """
+
+    def __init__(self, max_entries=0):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        # The number of apply nodes that were optimized by the last
+        # incremental optimization.
+        self.last_region_size = None
+        self._entries = OrderedDict()
+        self._index = {}
+
+    def context_key(self, fgraph, query):
+        """
+        Return the part of the keys that doesn't depend on the graph, or None
+        if the optimization of `fgraph` can't be cached.
+
+        Like in `OptimizedGraphCache.key`, only graphs optimized with a `Query`
+        that don't already contain inplace operations are cached.
+
+        """
+        if not isinstance(query, Query):
+            return None
+        if any(getattr(node.op, "destroy_map", None) for node in fgraph.apply_nodes):
+            return None
+        # The extra optimizations are only identified by their address in
+        # `str(query)`, so keep a reference to them for the address not to be
+        # reused by another one.
+        extra = tuple(opt for opt, _ in getattr(query, "extra_optimizations", []))
+        return (str(query), extra, _optimization_config_key())
+
+    def hashes(self, fgraph, input_specs):
+        """
+        Return the structural hashes of the variables of `fgraph`, or None if
+        the graph can't be hashed.
+
+        The hash of an input also depends on the flags of its `In` instance,
+        which decide which inputs the optimized graph can destroy.
+
+        """
+        updated = set((fgraph.update_mapping or {}).values())
+        memo = {}
+        try:
+            for i, (inp, spec) in enumerate(zip(fgraph.inputs, input_specs)):
+                flags = (
+                    bool(spec.mutable),
+                    bool(getattr(spec, "borrow", False)),
+                    i in updated,
+                )
+                memo[inp] = _digest(
+                    b"input",
+                    str(i).encode(),
+                    type_token(inp.type),
+                    repr(flags).encode(),
+                )
+            return variable_hashes(fgraph.inputs, fgraph.outputs, memo=memo)
+        except UnhashableGraphError as e:
+            _logger.debug(f"Not caching the optimization of {fgraph}: {e}")
+            return None
+
+    def lookup(self, context, var_hash):
+        """
+        Return the ``(entry, variable)`` indexed under `var_hash`, or None.
+
+        """
+        hit = self._index.get((context, var_hash))
+        if hit is not None:
+            self._entries.move_to_end(id(hit[0]))
+        return hit
+
+    def frontier(self, context, hashes, fgraph):
+        """
+        Return the maximal variables of `fgraph` that have an optimized
+        version in the cache.
+
+        Variables whose shape is used are not cut, so that the shape graph can
+        still be optimized away.
+
+        """
+        frontier = []
+        seen = set()
+        stack = list(reversed(fgraph.outputs))
+        while stack:
+            var = stack.pop()
+            if var in seen:
+                continue
+            seen.add(var)
+            if var.owner is None:
+                continue
+            if (context, hashes[var]) in self._index and not any(
+                isinstance(getattr(client, "op", None), (Shape, Shape_i))
+                for client, _ in fgraph.clients[var]
+            ):
+                frontier.append(var)
+            else:
+                stack.extend(reversed(var.owner.inputs))
+        return frontier
+
+    def add(self, context, hashes, masks, fgraph, forms):
+        """
+        Record the optimized `fgraph`.
+
+        `hashes` and `masks` are the hashes and input masks (see
+        `input_masks`) of the variables of the unoptimized graph, and `forms`
+        maps these variables to the variables of `fgraph` that replaced them.
+        A variable is only indexed if its optimized form depends on no other
+        inputs than it did.
+
+        """
+        opt_masks = input_masks(fgraph.inputs, fgraph.outputs)
+        # Replace the inputs by fresh variables, so that we don't keep the
+        # values of shared variables alive, and drop test values.
+        memo = {inp: inp.type() for inp in fgraph.inputs}
+        equiv = clone_get_equiv(
+            fgraph.inputs, fgraph.outputs, copy_inputs=False, memo=memo
+        )
+        for var in equiv.values():
+            if hasattr(var, "tag") and hasattr(var.tag, "test_value"):
+                del var.tag.test_value
+
+        entry = _Entry([equiv[inp] for inp in fgraph.inputs], set())
+        for var, form in forms.items():
+            if (
+                var.owner is None
+                or form is None
+                or isinstance(form, Constant)
+                or form not in opt_masks
+                or opt_masks[form] & ~masks.get(var, 0)
+            ):
+                continue
+            key = (context, hashes[var])
+            old = self._index.get(key)
+            if old is not None:
+                old[0].keys.discard(key)
+            self._index[key] = (entry, equiv[form])
+            entry.keys.add(key)
+
+        if not entry.keys:
+            return
+        self._entries[id(entry)] = entry
+        while 0 < self.max_entries < len(self._entries):
+            _, old = self._entries.popitem(last=False)
+            for key in old.keys:
+                del self._index[key]
+
+    def clear(self):
+        """Remove all the entries."""
+        self._entries.clear()
+        self._index.clear()
+
+
+_subgraph_cache = None
+
+
+def get_subgraph_cache():
+    """Return the `SubgraphCache` of the current process."""
+    global _subgraph_cache
+    if _subgraph_cache is None:
+        _subgraph_cache = SubgraphCache()
+    _subgraph_cache.max_entries = config.incremental_optimization__max_entries
+    return _subgraph_cache
@@ -38,6 +38,7 @@ predefined_linkers = {
     "cvm": VMLinker(use_cloop=True),  # Use allow_gc Theano flag
     "vm_nogc": VMLinker(allow_gc=False, use_cloop=False),
     "cvm_nogc": VMLinker(allow_gc=False, use_cloop=True),
+    "cvm_fused": VMLinker(use_cloop=True, fuse_c=True),
     "jax": JAXLinker(),
 }
 
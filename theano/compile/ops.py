@@ -288,6 +288,11 @@ class Shape(COp):
     def R_op(self, inputs, eval_points):
         return [None]
 
+    def vectorize_node(self, node, inputs, batched):
+        # All the batch entries have the same shape.
+        (x,) = inputs
+        return [self(x)[1:]]
+
     def c_code(self, node, name, inames, onames, sub):
         (iname,) = inames
         (oname,) = onames
@@ -446,6 +451,11 @@ class Shape_i(COp):
             )
         ]
 
+    def vectorize_node(self, node, inputs, batched):
+        # All the batch entries have the same shape.
+        (x,) = inputs
+        return [Shape_i(self.i + 1)(x)]
+
 
 def shape_i(var, i, fgraph=None):
     """
@@ -769,6 +779,10 @@ class Rebroadcast(COp):
             return [None]
         return self(*eval_points, **dict(return_list=True))
 
+    def vectorize_node(self, node, inputs, batched):
+        op = Rebroadcast(*[(axis + 1, value) for axis, value in self.axis.items()])
+        return op(*inputs, return_list=True)
+
     def c_code(self, node, nodename, inp, out, sub):
         (iname,) = inp
         (oname,) = out
@@ -0,0 +1,270 @@
+"""
+A persistent, content-addressed cache of optimized graphs.
+
+Every entry is stored in its own file under ``<compiledir>/optimized_graphs``,
+named after a structural hash of the graph before optimization, the
+optimizer query and the config options that influence optimization (see
+`OptimizedGraphCache.key`). Lookups are therefore a single ``open``.
+
+Entries are written to a temporary file and atomically renamed into place, so
+readers never need to take the compile lock and never see a partially written
+entry. The least recently used entries are evicted when the cache grows past
+``config.cache_optimizations__max_entries`` entries or
+``config.cache_optimizations__max_size`` megabytes.
+
+"""
+import logging
+import os
+import pickle
+import tempfile
+
+import theano
+from theano.configdefaults import config
+from theano.graph.basic import clone_get_equiv
+from theano.graph.hashing import UnhashableGraphError, graph_hash
+from theano.graph.optdb import Query
+
+
+_logger = logging.getLogger("theano.compile.optcache")
+
+# Config options that can change the result of the optimization of a graph,
+# besides those that are part of the C code key.
+OPTIMIZATION_CONFIG_PREFIXES = (
+    "optimizer",
+    "optdb__",
+    "tensor__",
+    "scan__",
+    "cycle_detection",
+    "floatX",
+    "cast_policy",
+)
+
+# Bump this when the on-disk format of an entry changes.
+CACHE_FORMAT_VERSION = 2
+
+
+def _optimization_config_key():
+    values = [config.get_config_hash()]
+    for name, cv in sorted(config._config_var_dict.items()):
+        if name.startswith(OPTIMIZATION_CONFIG_PREFIXES):
+            values.append((name, str(cv.__get__(config, config.__class__))))
+    return tuple(values)
+
+
+class OptimizedGraphCache:
+    """
+    An on-disk cache mapping unoptimized graphs to their optimized version.
+
+    Parameters
+    ----------
+    dirname : str
+        The directory in which entries are stored.
+    max_entries : int
+        The maximum number of entries to keep. Non-positive means no limit.
+    max_size : int
+        The maximum total size of the entries, in bytes. Non-positive means
+        no limit.
+
+    """
+
+    def __init__(self, dirname, max_entries=0, max_size=0):
+        self.dirname = dirname
+        self.max_entries = max_entries
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        # Estimates of the number and total size of the entries, so that the
+        # whole store is only scanned when the limits are crossed. They are
+        # initialized by the first scan, and don't see the entries added by
+        # other processes, which will do their own eviction.
+        self._count = None
+        self._size = None
+
+    def key(self, fgraph, query, input_specs=()):
+        """
+        Return the key of `fgraph` optimized with `query`, or None if the
+        graph can't be cached.
+
+        Only graphs optimized with a `Query` (i.e. the usual optimizers from
+        the optdb) are cached, as an arbitrary optimizer object can't be
+        identified across processes. Graphs that already contain inplace
+        operations are not cached either.
+
+        `input_specs` are the `In` instances of the inputs of `fgraph`. Their
+        flags are part of the key, as they decide which inputs the optimized
+        graph can destroy.
+
+        """
+        if not isinstance(query, Query):
+            return None
+        if any(getattr(node.op, "destroy_map", None) for node in fgraph.apply_nodes):
+            return None
+        try:
+            return graph_hash(
+                fgraph.inputs,
+                fgraph.outputs,
+                extra=(
+                    CACHE_FORMAT_VERSION,
+                    theano.__version__,
+                    str(query),
+                    _optimization_config_key(),
+                    tuple(
+                        (bool(spec.mutable), bool(getattr(spec, "borrow", False)))
+                        for spec in input_specs
+                    ),
+                    tuple(sorted((fgraph.update_mapping or {}).items())),
+                ),
+            )
+        except UnhashableGraphError as e:
+            _logger.debug(f"Not caching the optimization of {fgraph}: {e}")
+            return None
+
+    def _path(self, key):
+        return os.path.join(self.dirname, key[:2], key + ".pkl")
+
+    def get(self, key):
+        """
+        Return the ``(inputs, outputs)`` of the optimized graph stored under
+        `key`, or None if there is no such entry.
+
+        """
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f, config.change_flags(unpickle_function=False):
+                inputs, outputs = pickle.load(f)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except Exception as e:
+            # A corrupted or incompatible entry is treated like a miss, and
+            # will be overwritten.
+            _logger.warning(f"Failed to load optimized graph {path}: {e}")
+            self.misses += 1
+            return None
+        try:
+            # Mark the entry as recently used for the eviction.
+            os.utime(path)
+        except OSError:
+            pass
+        self.hits += 1
+        return inputs, outputs
+
+    def put(self, key, fgraph):
+        """Store the optimized `fgraph` under `key`."""
+        # Replace the inputs by fresh variables, so that we don't pickle the
+        # values of shared variables, and drop test values.
+        memo = {inp: inp.type() for inp in fgraph.inputs}
+        equiv = clone_get_equiv(
+            fgraph.inputs, fgraph.outputs, copy_inputs=False, memo=memo
+        )
+        for var in equiv.values():
+            if hasattr(var, "tag") and hasattr(var.tag, "test_value"):
+                del var.tag.test_value
+        entry = (
+            [equiv[inp] for inp in fgraph.inputs],
+            [equiv[out] for out in fgraph.outputs],
+        )
+
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(
+            prefix="tmp", suffix=".pkl", dir=os.path.dirname(path)
+        )
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+                entry_size = f.tell()
+            os.replace(tmp_path, path)
+        except Exception as e:
+            _logger.warning(f"Failed to store optimized graph {path}: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+        if self._count is None:
+            self._scan()
+        else:
+            self._count += 1
+            self._size += entry_size
+        if self._over_limits(self._count, self._size):
+            self.evict()
+
+    def entries(self):
+        """Return a list of ``(mtime, size, path)`` for all the entries."""
+        rval = []
+        try:
+            subdirs = os.listdir(self.dirname)
+        except FileNotFoundError:
+            return rval
+        for subdir in subdirs:
+            subdir = os.path.join(self.dirname, subdir)
+            if not os.path.isdir(subdir):
+                continue
+            for name in os.listdir(subdir):
+                if name.startswith("tmp") or not name.endswith(".pkl"):
+                    continue
+                path = os.path.join(subdir, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                rval.append((st.st_mtime, st.st_size, path))
+        return rval
+
+    def _scan(self):
+        entries = self.entries()
+        self._count = len(entries)
+        self._size = sum(e[1] for e in entries)
+        return entries
+
+    def _over_limits(self, count, size, ratio=1.0):
+        return (self.max_entries > 0 and count > self.max_entries * ratio) or (
+            self.max_size > 0 and size > self.max_size * ratio
+        )
+
+    def evict(self):
+        """
+        Remove the least recently used entries until the limits are met.
+
+        This scans the whole store, so it removes a bit more than needed for
+        the next insertions not to trigger another scan right away.
+
+        """
+        if self.max_entries <= 0 and self.max_size <= 0:
+            return
+        entries = sorted(self._scan(), reverse=True)
+        ratio = 1.0 if not self._over_limits(self._count, self._size) else 0.9
+        while entries and self._over_limits(self._count, self._size, ratio):
+            _, entry_size, path = entries.pop()
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                # Another process evicted it first.
+                pass
+            self._count -= 1
+            self._size -= entry_size
+
+    def clear(self):
+        """Remove all the entries."""
+        for _, _, path in self.entries():
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        self._count = 0
+        self._size = 0
+
+
+_optimized_graph_cache = None
+
+
+def get_optimized_graph_cache():
+    """Return the `OptimizedGraphCache` of the current compiledir."""
+    global _optimized_graph_cache
+    dirname = os.path.join(config.compiledir, "optimized_graphs")
+    if _optimized_graph_cache is None or _optimized_graph_cache.dirname != dirname:
+        _optimized_graph_cache = OptimizedGraphCache(dirname)
+    _optimized_graph_cache.max_entries = config.cache_optimizations__max_entries
+    _optimized_graph_cache.max_size = config.cache_optimizations__max_size * 2 ** 20
+    return _optimized_graph_cache
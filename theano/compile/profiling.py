@@ -10,6 +10,7 @@ ProfileStats object for runtime and memory profiling.
 
 import atexit
 import copy
+import json
 import logging
 import operator
 import os
@@ -131,6 +132,19 @@ def _atexit_print_fn():
                 n_apply_to_print=config.profiling__n_apply,
             )
 
+        if config.profiling__optimizer_destination:
+            profiles = [ps.optimizer_profile_to_dict() for ps in _atexit_print_list]
+            with open(config.profiling__optimizer_destination, "w") as f:
+                json.dump([p for p in profiles if p is not None], f, indent=1)
+
+        if config.profiling__json_destination:
+            with open(config.profiling__json_destination, "w") as f:
+                json.dump([ps.to_dict() for ps in _atexit_print_list], f, indent=1)
+
+        if config.profiling__trace_destination:
+            with open(config.profiling__trace_destination, "w") as f:
+                json.dump(chrome_trace(_atexit_print_list), f)
+
     if config.print_global_stats:
         print_global_stats()
 
@@ -169,6 +183,125 @@ def print_global_stats():
 _profiler_printers = []
 
 
+optimizer_stat_keys = (
+    "time",
+    "attempts",
+    "applied",
+    "nodes_created",
+    "nodes_removed",
+)
+
+
+def flatten_optimizer_profile(profiles):
+    """
+    Return the statistics of every optimizer in exported optimizer profiles.
+
+    Parameters
+    ----------
+    profiles : dict or list of dict
+        Optimizer profiles, as returned by
+        `ProfileStats.optimizer_profile_to_dict`.
+
+    Returns
+    -------
+    dict
+        Maps the path of every optimizer (the names of the optimizers that
+        contain it and its own, separated by "/") to a dict with its total
+        time, number of attempts and of applications, and number of nodes
+        created and removed over all the profiles.
+
+    """
+    if isinstance(profiles, dict):
+        profiles = [profiles]
+    stats = {}
+
+    def visit(d, path):
+        entry = stats.setdefault(path, dict.fromkeys(optimizer_stat_keys, 0))
+        for k in optimizer_stat_keys:
+            entry[k] += d.get(k) or 0
+        for child in d.get("optimizers", []):
+            visit(child, f"{path}/{child['name']}")
+
+    for profile in profiles:
+        root = profile["optimizer"]
+        visit(root, root["name"])
+    return stats
+
+
+def optimizer_profile_diff(old, new):
+    """
+    Compare the statistics of the optimizers in two sets of optimizer
+    profiles.
+
+    Parameters
+    ----------
+    old, new : dict or list of dict
+        Optimizer profiles, as returned by
+        `ProfileStats.optimizer_profile_to_dict`.
+
+    Returns
+    -------
+    list of tuple
+        ``(path, old_stats, new_stats)`` for every optimizer in either
+        profile (see `flatten_optimizer_profile`), sorted by decreasing
+        absolute change of time. The statistics of an optimizer that isn't in
+        one of the profiles are None.
+
+    """
+    old = flatten_optimizer_profile(old)
+    new = flatten_optimizer_profile(new)
+    paths = list(old) + [path for path in new if path not in old]
+
+    def time_change(path):
+        old_time = old[path]["time"] if path in old else 0
+        new_time = new[path]["time"] if path in new else 0
+        return -abs(new_time - old_time)
+
+    return [
+        (path, old.get(path), new.get(path)) for path in sorted(paths, key=time_change)
+    ]
+
+
+def chrome_trace(profiles):
+    """
+    Return the timelines of `profiles` as a dict in the Chrome trace event
+    format, that can be serialized to JSON.
+
+    Each execution of a node is a complete event named after its op, and the
+    nodes of each profile are on their own row, named after the message of
+    the profile.
+
+    """
+    pid = os.getpid()
+    events = []
+    for tid, ps in enumerate(profiles):
+        if not ps.timeline:
+            continue
+        events.append(
+            {
+                "name": "thread_name",
+                "ph": "M",
+                "pid": pid,
+                "tid": tid,
+                "args": {"name": ps.message or f"Function {tid}"},
+            }
+        )
+        for fgraph, node, t0, t1 in ps.timeline:
+            events.append(
+                {
+                    "name": str(node.op),
+                    "cat": node.op.__class__.__name__,
+                    "ph": "X",
+                    "ts": t0 * 1e6,
+                    "dur": (t1 - t0) * 1e6,
+                    "pid": pid,
+                    "tid": tid,
+                    "args": {"node": str(node)},
+                }
+            )
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
 def register_profiler_printer(fct):
     _profiler_printers.append(fct)
     return fct
@@ -199,6 +332,7 @@ class ProfileStats:
         self.vm_call_time = 0.0
         self.apply_time = {}
         self.apply_callcount = {}
+        self.timeline = []
         # self.apply_cimpl = None
         # self.message = None
 
@@ -238,6 +372,11 @@ class ProfileStats:
     # dict from node -> bool (1 if c, 0 if py)
     #
 
+    timeline = None
+    # list of `(FunctionGraph, Apply, start, end)`, one for each execution of
+    # a node, if the flag profiling__timeline is True
+    #
+
     message = None
     # pretty string to print in summary, to identify this output
     #
@@ -282,6 +421,10 @@ class ProfileStats:
     optimizer_profile = None
     # None or tuple (the optimizer, the profile it returned)
 
+    sample_every = 1
+    # Only 1 in sample_every calls of the function times the thunks, and the
+    # times and call counts of the nodes are multiplied by sample_every
+
     # param is called flag_time_thunks because most other attributes with time
     # in the name are times *of* something, rather than configuration flags.
     def __init__(
@@ -323,6 +466,7 @@ class ProfileStats:
         # Keys are `(FunctionGraph, Variable)`
         self.apply_time = {}
         self.apply_cimpl = {}
+        self.timeline = []
         self.variable_shape = {}
         self.variable_strides = {}
         self.variable_offset = {}
@@ -330,6 +474,7 @@ class ProfileStats:
             self.flag_time_thunks = config.profiling__time_thunks
         else:
             self.flag_time_thunks = flag_time_thunks
+        self.sample_every = config.profiling__sample_every
         self.__dict__.update(kwargs)
         if atexit_print:
             global _atexit_print_list
@@ -829,6 +974,11 @@ class ProfileStats:
                     f"  Time in thunks: {local_time}s ({100 * local_time / self.fct_call_time:.3f}%)",
                     file=file,
                 )
+                if self.sample_every > 1:
+                    print(
+                        f"    (estimated from 1 in {self.sample_every} calls)",
+                        file=file,
+                    )
         print(f"  Total compile time: {self.compile_time:e}s", file=file)
         print(f"    Number of Apply nodes: {int(self.nb_nodes)}", file=file)
         print(f"    Theano Optimizer time: {self.optimizer_time:e}s", file=file)
@@ -1407,6 +1557,11 @@ class ProfileStats:
                 f"{int(round(min_max_peak / 1024.0))}KB(took {min_peak_time:3f}s to compute)",
                 file=file,
             )
+            print(
+                "    (the Theano flag vm__memory_schedule=True makes the Python VM"
+                " search for such an order)",
+                file=file,
+            )
 
             print("---", file=file)
 
@@ -1477,6 +1632,117 @@ class ProfileStats:
         )
         print("", file=file)
 
+    def optimizer_profile_to_dict(self):
+        """
+        Return the optimizer profile as a dict that can be serialized to
+        JSON, or None if the optimizer wasn't profiled.
+
+        The profile of the optimizer and of the optimizers it contains is
+        under ``"optimizer"`` (see `SeqOptimizer.profile_to_dict`).
+
+        """
+        if not self.optimizer_profile:
+            return None
+        opt, prof = self.optimizer_profile
+        d = {}
+        if prof is not None and hasattr(opt, "profile_to_dict"):
+            d.update(opt.profile_to_dict(prof))
+        d.setdefault("class", opt.__class__.__name__)
+        d.setdefault("time", self.optimizer_time)
+        d["name"] = theano.graph.opt.optimizer_name(opt)
+        return {
+            "message": self.message,
+            "compile_time": self.compile_time,
+            "optimizer_time": self.optimizer_time,
+            "validate_time": self.validate_time,
+            "optimizer": d,
+        }
+
+    def to_dict(self):
+        """
+        Return the runtime profile as a dict that can be serialized to JSON.
+
+        The time, number of calls and implementation of each node are under
+        ``"nodes"``, keyed by the string of the node, and summed for each op
+        under ``"ops"``, keyed by the string of the op. When a key is shared
+        by several nodes, the ones after the first are suffixed by `` #2``,
+        `` #3``, etc. When only 1 in ``"sample_every"`` calls was timed, the
+        times and numbers of calls are scaled accordingly.
+
+        """
+        nodes = {}
+        ops = {}
+        for (fgraph, node), t in self.apply_time.items():
+            callcount = self.apply_callcount.get((fgraph, node), 0)
+            c_impl = bool(self.apply_cimpl.get(node, False))
+            key = str(node)
+            n = 1
+            while key in nodes:
+                n += 1
+                key = f"{node} #{n}"
+            nodes[key] = {
+                "op": str(node.op),
+                "class": node.op.__class__.__name__,
+                "time": t,
+                "callcount": callcount,
+                "c_impl": c_impl,
+            }
+            op = ops.setdefault(
+                str(node.op),
+                {
+                    "class": node.op.__class__.__name__,
+                    "time": 0.0,
+                    "callcount": 0,
+                    "nodes": 0,
+                    "c_impl": c_impl,
+                },
+            )
+            op["time"] += t
+            op["callcount"] += callcount
+            op["nodes"] += 1
+            op["c_impl"] = op["c_impl"] and c_impl
+        return {
+            "message": self.message,
+            "compile_time": self.compile_time,
+            "fct_call_time": self.fct_call_time,
+            "fct_callcount": self.fct_callcount,
+            "vm_call_time": self.vm_call_time,
+            "optimizer_time": self.optimizer_time,
+            "linker_time": self.linker_time,
+            "sample_every": self.sample_every,
+            "nodes": nodes,
+            "ops": ops,
+        }
+
+    def dump_json(self, file):
+        """
+        Write the runtime profile to `file` as JSON.
+
+        See `to_dict`.
+
+        """
+        json.dump(self.to_dict(), file, indent=1)
+
+    def dump_chrome_trace(self, file):
+        """
+        Write the timeline of the profile to `file` in the Chrome trace event
+        format, that can be loaded in ``chrome://tracing`` or Perfetto.
+
+        The timeline is only recorded if the flag ``profiling__timeline`` is
+        True when the function is compiled.
+
+        """
+        json.dump(chrome_trace([self]), file)
+
+    def dump_optimizer_profile(self, file):
+        """
+        Write the optimizer profile to `file` as JSON.
+
+        See `optimizer_profile_to_dict`.
+
+        """
+        json.dump(self.optimizer_profile_to_dict(), file, indent=1)
+
     def summary(self, file=sys.stderr, n_ops_to_print=20, n_apply_to_print=20):
         self.summary_function(file)
         self.summary_globals(file)
@@ -0,0 +1,197 @@
+"""
+Versions of a `Function` specialized for the shapes of its inputs.
+
+When ``config.function__specialize_shapes`` is True, every `Function`
+records the shapes of the arrays it is called with. Once the same shapes were
+seen ``config.function__specialize_shapes__after`` times, a version of the
+function whose inputs are known to have these shapes is compiled: the shape
+computations are constant-folded, and the dimensions of length 1 become
+broadcastable, so that the elemwise loops over them are removed. That version
+shares the input storage of the function, and is used by the calls with the
+same shapes. The calls with other shapes use the generic version.
+
+The functions that are profiled, or built by the maker of `DebugMode`, are not
+specialized.
+
+The generic C code of `Elemwise` already checks at run time if its inputs are
+contiguous, so the strides of the inputs are not part of the signature.
+
+"""
+import copy
+import logging
+from collections import OrderedDict
+
+import numpy as np
+
+from theano.compile.ops import specify_shape
+from theano.graph.basic import io_toposort
+
+
+_logger = logging.getLogger("theano.compile.specialize")
+
+
+def shape_signature(input_storage):
+    """
+    Return the shapes of the arrays in `input_storage`, a list of containers,
+    with None for the values that aren't arrays.
+
+    """
+    return tuple(
+        c.storage[0].shape if isinstance(c.storage[0], np.ndarray) else None
+        for c in input_storage
+    )
+
+
+def specialize_maker(maker, signature):
+    """
+    Return a `FunctionMaker` for the graph of `maker` whose inputs have the
+    shapes in `signature`.
+
+    """
+    # theano.tensor imports theano.compile
+    from theano.tensor.basic import patternbroadcast
+
+    memo = {}
+    for spec, shape in zip(maker.inputs, signature):
+        var = spec.variable
+        if not shape or getattr(var.type, "ndim", None) != len(shape):
+            continue
+        new_var = specify_shape(var, shape)
+        broadcastable = [b or s == 1 for b, s in zip(var.type.broadcastable, shape)]
+        memo[var] = patternbroadcast(new_var, broadcastable)
+
+    inputs = [spec.variable for spec in maker.inputs]
+    outputs = [out.variable for out in maker.outputs]
+    updates = [spec.update for spec in maker.inputs if spec.update is not None]
+    # Rebuild the nodes instead of cloning them, for the more specific types
+    # of the inputs to be propagated.
+    for node in io_toposort(inputs, outputs + updates):
+        if any(var in memo for var in node.inputs):
+            new_node = node.clone_with_new_inputs(
+                [memo.get(var, var) for var in node.inputs], strict=False
+            )
+            memo.update(zip(node.outputs, new_node.outputs))
+
+    def rebuilt(var):
+        # The outputs and updates keep their type
+        return var.type.filter_variable(memo.get(var, var))
+
+    new_inputs = []
+    for spec in maker.inputs:
+        spec = copy.copy(spec)
+        if spec.update is not None:
+            spec.update = rebuilt(spec.update)
+        new_inputs.append(spec)
+    new_outputs = []
+    for out in maker.outputs:
+        out = copy.copy(out)
+        out.variable = rebuilt(out.variable)
+        new_outputs.append(out)
+
+    return type(maker)(
+        new_inputs,
+        new_outputs,
+        mode=maker.mode,
+        accept_inplace=maker.accept_inplace,
+        function_builder=maker.function_builder,
+        on_unused_input="ignore",
+        output_keys=maker.output_keys,
+        name=maker.name,
+    )
+
+
+class ShapeSpecializer:
+    """
+    Select the version of a `Function` to run for the shapes of its inputs.
+
+    Parameters
+    ----------
+    after : int
+        The number of calls with the same shapes after which a version
+        specialized for them is compiled.
+    max_entries : int
+        The maximum number of specialized versions to keep. The least
+        recently used ones are removed first.
+
+    """
+
+    def __init__(self, after=3, max_entries=8):
+        self.after = after
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        # {signature: (fn, output_storage)}. The value is None if the
+        # specialization failed.
+        self._versions = OrderedDict()
+        # {signature: number of calls}, for the signatures not compiled yet
+        self._counts = OrderedDict()
+
+    def select(self, function):
+        """
+        Return the fn of `function` to run for the values of its inputs, and
+        the containers of its outputs.
+
+        """
+        generic = (function.fn, function.output_storage)
+        signature = shape_signature(function.input_storage)
+        if not any(signature):
+            # No array with dimensions
+            return generic
+        if signature in self._versions:
+            self._versions.move_to_end(signature)
+            version = self._versions[signature]
+            if version is None:
+                return generic
+            self.hits += 1
+            return version
+
+        self.misses += 1
+        count = self._counts.pop(signature, 0) + 1
+        if count < self.after:
+            self._counts[signature] = count
+            # Only remember a bounded number of signatures
+            while len(self._counts) > 4 * self.max_entries:
+                self._counts.popitem(last=False)
+            return generic
+
+        version = self.specialize(function, signature)
+        self._versions[signature] = version
+        while len(self._versions) > self.max_entries:
+            self._versions.popitem(last=False)
+        return generic if version is None else version
+
+    def specialize(self, function, signature):
+        """
+        Compile the version of `function` for the shapes in `signature`.
+
+        Returns
+        -------
+        tuple or None
+            The fn of that version, which shares the input storage of
+            `function`, and the containers of its outputs, or None if the
+            specialization failed.
+
+        """
+        try:
+            maker = specialize_maker(function.maker, signature)
+            fn, _, output_storage = maker.linker.make_thunk(
+                input_storage=[c.storage for c in function.input_storage]
+            )
+        except Exception as e:
+            _logger.warning(
+                f"Failed to specialize {function.name or 'a function'} for the "
+                f"input shapes {signature}: {e!r}"
+            )
+            return None
+        if function.profile:
+            fn.time_thunks = function.profile.flag_time_thunks
+        return fn, output_storage
+
+    def fns(self):
+        """Return the fns of the specialized versions."""
+        return [version[0] for version in self._versions.values() if version]
+
+    def clear(self):
+        """Remove all the specialized versions."""
+        self._versions.clear()
+        self._counts.clear()
@@ -665,7 +665,17 @@ def add_compile_configvars():
             "linker",
             "Default linker used if the theano flags mode is Mode",
             EnumStr(
-                "cvm", ["c|py", "py", "c", "c|py_nogc", "vm", "vm_nogc", "cvm_nogc"]
+                "cvm",
+                [
+                    "c|py",
+                    "py",
+                    "c",
+                    "c|py_nogc",
+                    "vm",
+                    "vm_nogc",
+                    "cvm_nogc",
+                    "cvm_fused",
+                ],
             ),
             in_c_key=False,
         )
@@ -801,6 +811,17 @@ def add_compile_configvars():
         in_c_key=True,
     )
 
+    config.add(
+        "cmodule__compile_workers",
+        "Maximum number of C modules compiled in parallel when linking a "
+        "function. All the modules of a graph that are missing from the "
+        "cache are compiled before the thunks are made. 0 means the number "
+        "of CPUs, 1 compiles the modules one at a time when their thunk is "
+        "made.",
+        IntParam(0, _is_greater_or_equal_0),
+        in_c_key=False,
+    )
+
     config.add(
         "compile__wait",
         """Time to wait before retrying to acquire the compile lock.""",
@@ -1163,6 +1184,14 @@ def add_testvalue_and_checking_configvars():
         in_c_key=False,
     )
 
+    config.add(
+        "profiling__sample_every",
+        """When profiling, only time the thunks of 1 in that many calls of
+                 each function, and scale their statistics accordingly""",
+        IntParam(1, _is_gt_0),
+        in_c_key=False,
+    )
+
     config.add(
         "profiling__n_apply",
         "Number of Apply instances to print by default",
@@ -1206,6 +1235,40 @@ def add_testvalue_and_checking_configvars():
         in_c_key=False,
     )
 
+    config.add(
+        "profiling__optimizer_destination",
+        """If not empty, the file in which to write the optimizer profiles
+                 of the profiled functions as JSON at exit""",
+        StrParam(""),
+        in_c_key=False,
+    )
+
+    config.add(
+        "profiling__timeline",
+        """Record the start and end time of each execution of the Apply
+                 nodes when profiling. The C VM doesn't record it, so the
+                 Stack VM is used instead of it when profile is True""",
+        BoolParam(False),
+        in_c_key=False,
+    )
+
+    config.add(
+        "profiling__json_destination",
+        """If not empty, the file in which to write the runtime profiles of
+                 the profiled functions as JSON at exit""",
+        StrParam(""),
+        in_c_key=False,
+    )
+
+    config.add(
+        "profiling__trace_destination",
+        """If not empty, the file in which to write the timelines of the
+                 profiled functions in the Chrome trace event format at exit.
+                 See profiling__timeline""",
+        StrParam(""),
+        in_c_key=False,
+    )
+
     config.add(
         "profiling__debugprint",
         """Do a debugprint of the profiled functions""",
@@ -1355,6 +1418,77 @@ def add_optimizer_configvars():
         in_c_key=False,
     )
 
+    config.add(
+        "cache_optimizations",
+        "If True, optimized graphs are stored in the compiledir, keyed by a "
+        "structural hash of the unoptimized graph, the optimizer and the "
+        "config. Compiling a graph that was already optimized (possibly by "
+        "another process) then skips the optimization.",
+        BoolParam(False),
+        in_c_key=False,
+    )
+
+    config.add(
+        "cache_optimizations__max_entries",
+        "The maximum number of optimized graphs to keep in the cache. The "
+        "least recently used ones are removed first. 0 means no limit.",
+        IntParam(10000, _is_greater_or_equal_0),
+        in_c_key=False,
+    )
+
+    config.add(
+        "cache_optimizations__max_size",
+        "The maximum total size, in megabytes, of the optimized graphs to "
+        "keep in the cache. The least recently used ones are removed first. "
+        "0 means no limit.",
+        IntParam(1024, _is_greater_or_equal_0),
+        in_c_key=False,
+    )
+
+    config.add(
+        "incremental_optimization",
+        "If True, the optimized version of the subgraphs of every compiled "
+        "graph is kept in memory, keyed by their structural hash. When a "
+        "graph that shares subgraphs with a previous one is compiled, only "
+        "the part of the graph that changed is optimized.",
+        BoolParam(False),
+        in_c_key=False,
+    )
+
+    config.add(
+        "incremental_optimization__max_entries",
+        "The maximum number of optimized graphs kept in memory for the "
+        "incremental optimization. The least recently used ones are removed "
+        "first. 0 means no limit.",
+        IntParam(100, _is_greater_or_equal_0),
+        in_c_key=False,
+    )
+
+    config.add(
+        "function__specialize_shapes",
+        "If True, every function compiles a version of itself specialized for "
+        "the shapes of its inputs once it was called a few times with the same "
+        "shapes, and uses it for the calls with these shapes.",
+        BoolParam(False),
+        in_c_key=False,
+    )
+
+    config.add(
+        "function__specialize_shapes__after",
+        "The number of calls with the same input shapes after which a function "
+        "is specialized for these shapes.",
+        IntParam(3, _is_gt_0),
+        in_c_key=False,
+    )
+
+    config.add(
+        "function__specialize_shapes__max_entries",
+        "The maximum number of specialized versions of a function to keep. The "
+        "least recently used ones are removed first.",
+        IntParam(8, _is_gt_0),
+        in_c_key=False,
+    )
+
 
 def add_metaopt_configvars():
     config.add(
@@ -1412,20 +1546,26 @@ def add_vm_configvars():
         in_c_key=False,
     )
 
+    config.add(
+        "vm__memory_planner",
+        "Useful only for the vm linkers. If True, the intermediate results of"
+        " Loop/LoopGC share a small set of buffers that are kept between"
+        " calls, instead of being allocated on each call.",
+        BoolParam(False),
+        in_c_key=False,
+    )
 
-def add_deprecated_configvars():
-    # TODO: remove this?
     config.add(
-        "cache_optimizations",
-        "WARNING: work in progress, does not work yet. "
-        "Specify if the optimization cache should be used. This cache will "
-        "any optimized graph and its optimization. Actually slow downs a lot "
-        "the first optimization, and could possibly still contains some bugs. "
-        "Use at your own risks.",
+        "vm__memory_schedule",
+        "Useful only for the vm linkers. If True, Loop/LoopGC run the nodes in"
+        " an order chosen to keep the peak memory low, using the shapes known"
+        " at compile time.",
         BoolParam(False),
         in_c_key=False,
     )
 
+
+def add_deprecated_configvars():
     # TODO: remove this?
     config.add(
         "unittests__rseed",
@@ -0,0 +1,199 @@
+"""Structural hashing of graphs.
+
+The hashes computed here only depend on the structure of a graph (its `Op`s,
+`Type`s, constant values and the way they are connected), not on the identity
+of the Python objects that make it up.  Two graphs built independently, in
+different processes, hash to the same value when they compute the same thing
+from the same (positional) inputs.
+
+"""
+import hashlib
+import pickle
+from copy import copy
+from typing import Dict, Iterable, Optional, Sequence
+
+import numpy as np
+
+from theano.graph.basic import Apply, Constant, Variable, io_toposort
+
+
+__all__ = [
+    "UnhashableGraphError",
+    "graph_hash",
+    "node_hash",
+    "op_token",
+    "type_token",
+    "variable_hashes",
+]
+
+
+class UnhashableGraphError(Exception):
+    """
+    Raised when a graph contains objects that can't be turned into a stable
+    structural token.
+
+    """
+
+
+def _digest(*parts: bytes) -> bytes:
+    h = hashlib.sha256()
+    for p in parts:
+        # Prefix every part with its length so that the concatenation is
+        # unambiguous.
+        h.update(len(p).to_bytes(8, "little"))
+        h.update(p)
+    return h.digest()
+
+
+def _value_token(value) -> bytes:
+    """Return a stable byte token for a property value of an `Op` or `Type`."""
+    if value is None or isinstance(value, (bool, int, float, complex, str)):
+        return f"{type(value).__name__}:{value!r}".encode()
+    elif isinstance(value, bytes):
+        return b"bytes:" + value
+    elif isinstance(value, np.ndarray):
+        return _digest(
+            b"ndarray",
+            str(value.dtype).encode(),
+            repr(value.shape).encode(),
+            np.ascontiguousarray(value).tobytes(),
+        )
+    elif isinstance(value, np.generic):
+        return _digest(b"npscalar", str(value.dtype).encode(), value.tobytes())
+    elif isinstance(value, (list, tuple)):
+        return _digest(type(value).__name__.encode(), *[_value_token(v) for v in value])
+    elif isinstance(value, dict):
+        items = sorted((_value_token(k), _value_token(v)) for k, v in value.items())
+        return _digest(b"dict", *[k + v for k, v in items])
+    elif isinstance(value, (set, frozenset)):
+        return _digest(b"set", *sorted(_value_token(v) for v in value))
+    elif hasattr(value, "__props__"):
+        return op_token(value)
+    else:
+        return _pickle_token(value)
+
+
+def _pickle_token(obj) -> bytes:
+    try:
+        return _digest(b"pickle", pickle.dumps(obj, protocol=4))
+    except Exception as e:
+        raise UnhashableGraphError(f"Can't compute a structural token for {obj}: {e}")
+
+
+def op_token(op) -> bytes:
+    """Return a stable byte token identifying `op` up to equality.
+
+    `Op`s (and other objects) that define ``__props__`` are identified by
+    their class and the value of their properties, which is what their
+    ``__eq__`` uses.  Other objects are identified by their pickle.
+
+    """
+    cls = type(op)
+    name = f"{cls.__module__}.{cls.__qualname__}".encode()
+    props = getattr(op, "__props__", None)
+    if props is None:
+        return _digest(name, _pickle_token(op))
+    return _digest(name, *[_value_token(getattr(op, p)) for p in props])
+
+
+def type_token(type) -> bytes:
+    """Return a stable byte token identifying `type` up to equality."""
+    if getattr(type, "__props__", None) is None and getattr(type, "name", None):
+        # The name of a `Type` is not part of its identity.
+        type = copy(type)
+        type.name = None
+    return op_token(type)
+
+
+def variable_hashes(
+    inputs: Sequence[Variable],
+    outputs: Sequence[Variable],
+    memo: Optional[Dict[Variable, bytes]] = None,
+) -> Dict[Variable, bytes]:
+    """Compute a Merkle hash for every variable between `inputs` and `outputs`.
+
+    The hash of an input depends only on its position in `inputs` and its
+    type, the hash of a constant on its type and data, and the hash of any
+    other variable on its owner's `Op`, the hashes of its owner's inputs and
+    its output index. The roots of the graph that are neither inputs nor
+    constants are numbered in topological order.
+
+    Parameters
+    ----------
+    inputs
+        The inputs of the graph.
+    outputs
+        The outputs of the graph.
+    memo
+        Optionally, a partially filled dictionary of hashes, which will be
+        updated in place and returned.
+
+    Returns
+    -------
+    dict
+        A map from each variable of the graph to its hash (as bytes).
+
+    """
+    if memo is None:
+        memo = {}
+    for i, inp in enumerate(inputs):
+        memo.setdefault(inp, _digest(b"input", str(i).encode(), type_token(inp.type)))
+
+    orphans = []
+
+    def root_hash(var):
+        if isinstance(var, Constant):
+            return _digest(b"constant", type_token(var.type), _value_token(var.data))
+        # Non-constant orphans are numbered in the order they are reached.
+        orphans.append(var)
+        return _digest(b"orphan", str(len(orphans)).encode(), type_token(var.type))
+
+    for node in io_toposort(inputs, outputs):
+        for var in node.inputs:
+            if var not in memo:
+                memo[var] = root_hash(var)
+        h = node_hash(node, memo)
+        for idx, out in enumerate(node.outputs):
+            memo.setdefault(out, _digest(h, str(idx).encode()))
+
+    for out in outputs:
+        if out not in memo:
+            memo[out] = root_hash(out)
+    return memo
+
+
+def node_hash(node: Apply, memo: Dict[Variable, bytes]) -> bytes:
+    """Return the hash of `node` given the hashes of its inputs in `memo`."""
+    return _digest(b"apply", op_token(node.op), *[memo[var] for var in node.inputs])
+
+
+def graph_hash(
+    inputs: Sequence[Variable], outputs: Sequence[Variable], extra: Iterable = ()
+) -> str:
+    """Return a hexadecimal structural hash of the graph between `inputs` and `outputs`.
+
+    Parameters
+    ----------
+    inputs
+        The inputs of the graph. Only their position and type matter.
+    outputs
+        The outputs of the graph.
+    extra
+        Additional values (e.g. the compilation mode) to mix into the hash.
+
+    Raises
+    ------
+    UnhashableGraphError
+        If the graph contains an object for which no stable token can be
+        computed.
+
+    """
+    memo = variable_hashes(inputs, outputs)
+    return hashlib.sha256(
+        _digest(
+            b"graph",
+            str(len(inputs)).encode(),
+            *[memo[out] for out in outputs],
+            *[_value_token(e) for e in extra],
+        )
+    ).hexdigest()
@@ -353,6 +353,36 @@ class Op(MetaObject):
         """
         raise NotImplementedError()
 
+    def vectorize_node(
+        self, node: Apply, inputs: List[Variable], batched: List[bool]
+    ) -> List[Variable]:
+        """Construct a graph that applies this op over a leading batch axis.
+
+        This method is used by `theano.vectorize.vectorize_graph`.  Ops that
+        do not implement it are evaluated once per batch element by a
+        `Scan` loop.
+
+        Parameters
+        ----------
+        node : Apply
+            The node being vectorized.
+        inputs : list of Variable
+            The replacements for ``node.inputs``.  The entries for which
+            ``batched`` is true have an extra leading axis.
+        batched : list of bool
+            Whether each entry of ``inputs`` has the extra leading axis.
+            At least one of them does.
+
+        Returns
+        -------
+        list of Variable
+            One variable per output of ``node``, with the extra leading
+            axis, or without it for the outputs that are the same for all
+            the batch entries (like the shape of a batched input).
+
+        """
+        raise NotImplementedError()
+
     @abstractmethod
     def perform(
         self,
@@ -569,9 +599,6 @@ class COp(Op, CLinkerOp):
         #        in theano.link.c and dispatched onto the Op!
         import theano.link.c.basic
 
-        node_input_storage = [storage_map[r] for r in node.inputs]
-        node_output_storage = [storage_map[r] for r in node.outputs]
-
         e = FunctionGraph(node.inputs, node.outputs)
         e_no_recycling = [
             new_o
@@ -597,22 +624,7 @@ class COp(Op, CLinkerOp):
                 cl.get_dynamic_module()
                 print(f"Disabling C code for {self} due to unsupported float16")
                 raise NotImplementedError("float16")
-        outputs = cl.make_thunk(
-            input_storage=node_input_storage, output_storage=node_output_storage
-        )
-        thunk, node_input_filters, node_output_filters = outputs
-
-        def rval():
-            thunk()
-            for o in node.outputs:
-                compute_map[o][0] = True
-
-        rval.thunk = thunk
-        rval.cthunk = thunk.cthunk
-        rval.inputs = node_input_storage
-        rval.outputs = node_output_storage
-        rval.lazy = False
-        return rval
+        return theano.link.c.basic.make_c_thunk(node, cl, storage_map, compute_map)
 
     def make_thunk(self, node, storage_map, compute_map, no_recycling, impl=None):
         """Create a thunk.
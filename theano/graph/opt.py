@@ -117,6 +117,20 @@ class GlobalOptimizer(abc.ABC):
                 " optimizer return profiling information."
             )
 
+    @staticmethod
+    def profile_to_dict(prof):
+        """
+        Return the profile returned by `apply` as a dict that can be
+        serialized to JSON.
+
+        The dict has the same format as the ones returned for the
+        optimizers of a `SeqOptimizer` (see `SeqOptimizer.profile_to_dict`),
+        without the keys that the `SeqOptimizer` fills in. The optimizers
+        that don't return any profiling information return an empty dict.
+
+        """
+        return {}
+
     def __hash__(self):
         if not hasattr(self, "_optimizer_idx"):
             self._optimizer_idx = _optimizer_idx[0]
@@ -148,6 +162,15 @@ class FromFunctionOptimizer(GlobalOptimizer):
         return self.__name__
 
 
+def optimizer_name(opt):
+    """
+    Return the name under which `opt` is shown in profiles.
+
+    """
+    name = getattr(opt, "name", None) or getattr(opt, "__name__", None)
+    return name or str(opt)
+
+
 def optimizer(f):
     """
     Decorator for FromFunctionOptimizer.
@@ -371,6 +394,56 @@ class SeqOptimizer(GlobalOptimizer, UserList):
                 opts[i].print_profile(stream, sub_profs[i], level=level + 1)
         print(file=stream)
 
+    @staticmethod
+    def profile_to_dict(prof):
+        """
+        Return the profile returned by `apply` as a dict that can be
+        serialized to JSON.
+
+        Every optimizer is described by a dict with the keys ``"name"``,
+        ``"class"``, ``"time"`` (in seconds), ``"nodes_before"`` and
+        ``"nodes_after"`` (-1 when unknown), and the keys the optimizer's
+        own `profile_to_dict` adds. The optimizers that contain other
+        optimizers list them under ``"optimizers"``, and the ones that apply
+        rewrites count them under ``"applied"``, ``"attempts"``,
+        ``"nodes_created"`` and ``"nodes_removed"``.
+
+        """
+        (
+            opts,
+            prof,
+            validate_time,
+            callback_time,
+            nb_node_before,
+            nb_node_after,
+            sub_profs,
+            sub_validate_time,
+            nb_nodes,
+            callbacks_time,
+        ) = prof
+        optimizers = []
+        for opt, t, sub_prof, (before, after) in zip(opts, prof, sub_profs, nb_nodes):
+            d = {}
+            if sub_prof and hasattr(opt, "profile_to_dict"):
+                d.update(opt.profile_to_dict(sub_prof))
+            d.update(
+                name=optimizer_name(opt),
+                time=t,
+                nodes_before=before,
+                nodes_after=after,
+            )
+            d.setdefault("class", opt.__class__.__name__)
+            optimizers.append(d)
+        return {
+            "class": "SeqOptimizer",
+            "time": sum(prof),
+            "nodes_before": nb_node_before,
+            "nodes_after": nb_node_after,
+            "validate_time": validate_time,
+            "callback_time": callback_time,
+            "optimizers": optimizers,
+        }
+
     @staticmethod
     def merge_profile(prof1, prof2):
         """
@@ -462,6 +535,12 @@ class MergeFeature(Feature):
     That way, the `MergeOptimizer` can remember the result of the last
     merge-pass on the `FunctionGraph`.
 
+    The distinct nodes are hash-consed: they are indexed by their op and their
+    inputs, so that the nodes a new node can be merged with are found with a
+    dictionary lookup instead of by scanning the clients of its inputs. As
+    merged variables are replaced in the graph, identical inputs are the same
+    variables.
+
     """
 
     def on_attach(self, fgraph):
@@ -476,10 +555,11 @@ class MergeFeature(Feature):
         self.const_sig_inv = AssocList()
 
         # For all Apply nodes
-        # Set of distinct (not mergeable) nodes
-        self.nodes_seen = set()
-        # Ordered set of distinct (not mergeable) nodes without any input
-        self.noinput_nodes = OrderedSet()
+        # distinct (not mergeable) node -> key
+        self.node_keys = {}
+        # key -> list of the distinct nodes with that key. The nodes with the
+        # same key are only distinct when their merge failed.
+        self.nodes_by_key = {}
 
         # Each element of scheduled is a list of list of (out, new_out) pairs.
         # Each list of pairs represent the substitution needed to replace all
@@ -502,9 +582,9 @@ class MergeFeature(Feature):
 
     def on_change_input(self, fgraph, node, i, r, new_r, reason):
         # If inputs to node change, it is not guaranteed that it is distinct
-        # from the other nodes in nodes_seen
-        if node in self.nodes_seen:
-            self.nodes_seen.discard(node)
+        # from the other distinct nodes, and its key changed.
+        if node in self.node_keys:
+            self.forget_node(node)
             self.process_node(fgraph, node)
 
         # Since we are in on_change_input, node should have inputs.
@@ -522,9 +602,8 @@ class MergeFeature(Feature):
         self.process_node(fgraph, node)
 
     def on_prune(self, fgraph, node, reason):
-        self.nodes_seen.discard(node)
-        if not node.inputs:
-            self.noinput_nodes.discard(node)
+        if node in self.node_keys:
+            self.forget_node(node)
         for c in node.inputs:
             if isinstance(c, Constant) and (len(fgraph.clients[c]) <= 1):
                 # This was the last node using this constant
@@ -554,60 +633,52 @@ class MergeFeature(Feature):
             self.const_sig_inv[sig] = c
             self.seen_constants.add(id(c))
 
+    @staticmethod
+    def node_key(node):
+        """
+        Return the key under which `node` is indexed.
+
+        Nodes whose op can't be hashed are indexed by the type of their op,
+        and told apart by comparing the ops.
+
+        """
+        op = node.op
+        try:
+            hash(op)
+        except TypeError:
+            op = type(op)
+        return (op, tuple(node.inputs))
+
+    def forget_node(self, node):
+        """
+        Remove `node` from the distinct nodes.
+
+        """
+        key = self.node_keys.pop(node)
+        nodes = self.nodes_by_key[key]
+        nodes.remove(node)
+        if not nodes:
+            del self.nodes_by_key[key]
+
     def process_node(self, fgraph, node):
         """
         Check if a node can be merged, and queue that replacement.
 
         """
-        if node in self.nodes_seen:
+        if node in self.node_keys:
             return
 
         node_has_assert = False
 
-        # These asserts ensure that the fgraph has set the clients field
-        # properly.
-        # The clients should at least contain `node` itself!
-        if node.inputs:
-            # Take the smallest clients list. Some ops like elemwise
-            # have optimization that put constant as the first inputs.
-            # As constant have in general more clients than other type of nodes
-            # using always inputs[0] make us look at more nodes.
-            # Always pick the smallest clints list between inputs 0
-            # and -1 speed up optimization.
-
-            a_clients = fgraph.clients[node.inputs[0]]
-            b_clients = fgraph.clients[node.inputs[-1]]
-            if len(a_clients) < len(b_clients):
-                clients = a_clients
-            else:
-                clients = b_clients
-            assert len(clients) > 0
+        # Nodes without inputs are merged too if they perform the same
+        # operation, as they are not always constant-folded.
+        key = self.node_key(node)
+        merge_candidates = self.nodes_by_key.get(key, ())
 
-            merge_candidates = [c for c, i in clients if c in self.nodes_seen]
-
-            # Put all clients of Assert inputs (if exist) into merge_candidates
-            # TODO: Deactivated for now as this cause cycle in the graph.
-            # (There is a second deactivation part below.)
-            for i in []:  # node.inputs:
-                if i.owner and isinstance(i.owner.op, theano.tensor.opt.Assert):
-                    node_has_assert = True
-                    i_clients = fgraph.clients[i.owner.inputs[0]]
-                    assert_clients = [c for (c, _) in i_clients if c in self.nodes_seen]
-
-                    for idx in range(len(assert_clients)):
-                        client = assert_clients[idx]
-                        if isinstance(i.owner.op, theano.tensor.opt.Assert):
-                            o_clients = fgraph.clients[client.outputs[0]]
-                            for c in o_clients:
-                                if c[0] in self.nodes_seen:
-                                    assert_clients.append(c[0])
-
-                    merge_candidates.extend(assert_clients)
-        else:
-            # If two nodes have no input, but perform the same operation,
-            # they are not always constant-folded, so we want to merge them.
-            # In that case, the candidates are all the nodes without inputs.
-            merge_candidates = self.noinput_nodes
+        # TODO: Merging the nodes whose inputs only differ by Assert nodes is
+        # deactivated for now as this cause cycle in the graph. It would need
+        # the clients of the inputs of the Asserts as candidates.
+        # (There is a second deactivation part below.)
 
         replacement_candidates = []
         for candidate in merge_candidates:
@@ -707,9 +778,8 @@ class MergeFeature(Feature):
         if replacement_candidates:
             self.scheduled.append(replacement_candidates)
         else:
-            self.nodes_seen.add(node)
-            if not node.inputs:
-                self.noinput_nodes.add(node)
+            self.node_keys[node] = key
+            self.nodes_by_key.setdefault(key, []).append(node)
 
     def get_merged_assert_input(self, node, candidate):
         new_inputs = []
@@ -939,6 +1009,26 @@ class MergeOptimizer(GlobalOptimizer):
                     # just print i.
                     print(blanc, "      ", i[0], ",", i[1], file=stream)
 
+    @staticmethod
+    def profile_to_dict(prof):
+        (
+            nb_fail,
+            replace_time,
+            validate_time,
+            callback_time,
+            callbacks_time,
+            nb_merged,
+            nb_constant,
+        ) = prof
+        return {
+            "class": "MergeOptimizer",
+            "applied": nb_merged,
+            "failed": nb_fail,
+            "constants_merged": nb_constant,
+            "validate_time": validate_time,
+            "callback_time": callback_time,
+        }
+
     @staticmethod
     def merge_profile(prof1, prof2):
         def merge_none_number(v1, v2):
@@ -2191,6 +2281,40 @@ class TopoOptimizer(NavigatorOptimizer):
                     level=level + 1,
                 )
 
+    @staticmethod
+    def profile_to_dict(prof):
+        if prof is None:
+            return {}
+        (
+            opt,
+            nb,
+            nb_nodes_start,
+            nb_nodes_end,
+            io_t,
+            loop_t,
+            callback_time,
+            lopt,
+        ) = prof
+        d = {
+            "class": "TopoOptimizer",
+            "applied": nb,
+            "io_toposort_time": io_t,
+            "callback_time": callback_time,
+        }
+        if isinstance(lopt, LocalOptGroup) and lopt.profile:
+            d["optimizers"] = [
+                {
+                    "name": optimizer_name(o),
+                    "class": o.__class__.__name__,
+                    "time": lopt.time_opts[o],
+                    "attempts": lopt.process_count[o],
+                    "applied": lopt.applied_true[o],
+                    "nodes_created": lopt.node_created[o],
+                }
+                for o in lopt.process_count
+            ]
+        return d
+
     def __str__(self):
         return getattr(self, "__name__", "<TopoOptimizer instance>")
 
@@ -2291,16 +2415,37 @@ class OpKeyOptimizer(NavigatorOptimizer):
 
 
 class ChangeTracker(Feature):
+    """
+    Record whether a `FunctionGraph` changed, and which of its nodes did.
+
+    A node is marked in `changed_nodes` when it is imported or one of its
+    inputs changes, and so are the owners of the replaced variables, as their
+    clients changed. `changed_nodes` is a dict used as an ordered set, so
+    that the nodes are revisited in a deterministic order.
+
+    """
+
     def __init__(self):
         self.changed = False
         self.nb_imported = 0
+        self.nb_pruned = 0
+        self.changed_nodes = {}
 
     def on_import(self, fgraph, node, reason):
         self.nb_imported += 1
         self.changed = True
+        self.changed_nodes[node] = None
+
+    def on_prune(self, fgraph, node, reason):
+        self.nb_pruned += 1
 
     def on_change_input(self, fgraph, node, i, r, new_r, reason):
         self.changed = True
+        if not isinstance(node, str):
+            self.changed_nodes[node] = None
+        for var in (r, new_r):
+            if var.owner is not None:
+                self.changed_nodes[var.owner] = None
 
     def reset(self):
         self.changed = False
@@ -2312,6 +2457,65 @@ class ChangeTracker(Feature):
         del fgraph.change_tracker
 
 
+def neighborhood(fgraph, nodes, depth):
+    """
+    Return the nodes that are at most `depth` edges away from `nodes` in
+    `fgraph`, following both the inputs and the clients of the nodes.
+
+    The nodes are returned in the order they are reached, as the keys of a
+    dict.
+
+    """
+    seen = dict.fromkeys(nodes)
+    frontier = list(seen)
+    for _ in range(depth):
+        next_frontier = []
+        for node in frontier:
+            neighbors = [var.owner for var in node.inputs if var.owner is not None]
+            for out in node.outputs:
+                neighbors.extend(
+                    client
+                    for client, _ in fgraph.clients.get(out, ())
+                    if not isinstance(client, str)
+                )
+            for n in neighbors:
+                if n not in seen:
+                    seen[n] = None
+                    next_frontier.append(n)
+        frontier = next_frontier
+    return seen
+
+
+def toposort_nodes(nodes):
+    """
+    Sort `nodes` so that every node comes after those of `nodes` that compute
+    its inputs.
+
+    Contrary to `io_toposort`, this only looks at the edges between `nodes`,
+    so its cost doesn't depend on the size of the rest of the graph.
+
+    """
+    nodes_set = set(nodes)
+    order = []
+    visited = set()
+    for root in nodes:
+        stack = [(root, False)]
+        while stack:
+            node, expanded = stack.pop()
+            if expanded:
+                order.append(node)
+                continue
+            if node in visited:
+                continue
+            visited.add(node)
+            stack.append((node, True))
+            for var in reversed(node.inputs):
+                owner = var.owner
+                if owner in nodes_set and owner not in visited:
+                    stack.append((owner, False))
+    return order
+
+
 def merge_dict(d1, d2):
     """
     merge 2 dicts by adding the values.
@@ -2351,6 +2555,11 @@ class EquilibriumOptimizer(NavigatorOptimizer):
 
     """
 
+    # After the first pass, only the nodes that are at most that many edges
+    # away from a node that changed during the previous pass are visited.
+    # None makes every pass visit the whole graph.
+    unchanged_node_depth = 2
+
     def __init__(
         self,
         optimizers,
@@ -2385,6 +2594,37 @@ class EquilibriumOptimizer(NavigatorOptimizer):
             self.cleanup_optimizers = cleanup_optimizers
         self.max_use_ratio = max_use_ratio
         assert self.max_use_ratio is not None, "max_use_ratio has to be a number"
+        # Map each `Op` to the local optimizers that track it. `Op`s are
+        # compared through their properties, so this is built once for all
+        # the nodes that have equal `Op`s.
+        self._dispatch_index = {}
+        self._nb_local_optimizers = len(list(self.get_local_optimizers()))
+
+    def local_optimizers_for(self, op):
+        """
+        Return the local optimizers to try on a node with `op`, in the order
+        they must be tried.
+
+        """
+        try:
+            return self._dispatch_index[op]
+        except KeyError:
+            pass
+        except TypeError:
+            # The `Op` isn't hashable.
+            return self._local_optimizers_for(op)
+        lopts = self._dispatch_index[op] = self._local_optimizers_for(op)
+        return lopts
+
+    def _local_optimizers_for(self, op):
+        lopts = (
+            self.local_optimizers_all
+            + self.local_optimizers_map.get(type(op), [])
+            + self.local_optimizers_map.get(op, [])
+        )
+        # An optimizer that tracks both the type and the instance must only
+        # be tried once.
+        return tuple(OrderedSet(lopts))
 
     def get_local_optimizers(self):
         for opt in self.local_optimizers_all:
@@ -2431,10 +2671,20 @@ class EquilibriumOptimizer(NavigatorOptimizer):
         time_opts = {}
         io_toposort_timing = []
         nb_nodes = []
+        graph_sizes = []
         node_created = {}
+        node_removed = {}
         global_sub_profs = []
         final_sub_profs = []
         cleanup_sub_profs = []
+        # The number of times each local optimizer was tried, the number of
+        # attempts that were skipped because the optimizer doesn't track the
+        # node's `Op`, and the number of node visits that were skipped
+        # because the node didn't change since the previous pass.
+        nb_attempts = {}
+        nb_skipped_untracked = 0
+        nb_skipped_unchanged = 0
+        first_pass = True
         for opt in (
             self.global_optimizers
             + list(self.get_local_optimizers())
@@ -2444,12 +2694,14 @@ class EquilibriumOptimizer(NavigatorOptimizer):
             global_process_count.setdefault(opt, 0)
             time_opts.setdefault(opt, 0)
             node_created.setdefault(opt, 0)
+            node_removed.setdefault(opt, 0)
 
         def apply_cleanup(profs_dict):
             changed = False
             for copt in self.cleanup_optimizers:
                 change_tracker.reset()
                 nb = change_tracker.nb_imported
+                nb_pruned = change_tracker.nb_pruned
                 t_opt = time.time()
                 sub_prof = copt.apply(fgraph)
                 time_opts[copt] += time.time() - t_opt
@@ -2460,6 +2712,7 @@ class EquilibriumOptimizer(NavigatorOptimizer):
                     global_process_count[copt] += 1
                     changed = True
                     node_created[copt] += change_tracker.nb_imported - nb
+                    node_removed[copt] += change_tracker.nb_pruned - nb_pruned
             return changed
 
         while changed and not max_use_abort:
@@ -2475,6 +2728,7 @@ class EquilibriumOptimizer(NavigatorOptimizer):
             for gopt in self.global_optimizers:
                 change_tracker.reset()
                 nb = change_tracker.nb_imported
+                nb_pruned = change_tracker.nb_pruned
                 t_opt = time.time()
                 sub_prof = gopt.apply(fgraph)
                 time_opts[gopt] += time.time() - t_opt
@@ -2485,6 +2739,7 @@ class EquilibriumOptimizer(NavigatorOptimizer):
                     global_process_count[gopt] += 1
                     changed = True
                     node_created[gopt] += change_tracker.nb_imported - nb
+                    node_removed[gopt] += change_tracker.nb_pruned - nb_pruned
                     if global_process_count[gopt] > max_use:
                         max_use_abort = True
                         opt_name = getattr(gopt, "name", None) or getattr(
@@ -2500,7 +2755,26 @@ class EquilibriumOptimizer(NavigatorOptimizer):
 
             # apply local optimizer
             topo_t0 = time.time()
-            q = deque(io_toposort(fgraph.inputs, start_from))
+            if (
+                first_pass
+                or self.unchanged_node_depth is None
+                or start_from is not fgraph.outputs
+            ):
+                q = deque(io_toposort(fgraph.inputs, start_from))
+            else:
+                # Only revisit the nodes around those that changed. Local
+                # optimizers look at the nodes around the one they are applied
+                # to (e.g. `PatternSub`s), so a change can make them apply to
+                # the nodes next to it.
+                worklist = neighborhood(
+                    fgraph, change_tracker.changed_nodes, self.unchanged_node_depth
+                )
+                q = deque(
+                    toposort_nodes([n for n in worklist if n in fgraph.apply_nodes])
+                )
+                nb_skipped_unchanged += len(fgraph.apply_nodes) - len(q)
+            change_tracker.changed_nodes.clear()
+            first_pass = False
             io_toposort_timing.append(time.time() - topo_t0)
 
             nb_nodes.append(len(q))
@@ -2527,15 +2801,15 @@ class EquilibriumOptimizer(NavigatorOptimizer):
                     if node not in fgraph.apply_nodes:
                         continue
                     current_node = node
-                    for lopt in (
-                        self.local_optimizers_all
-                        + self.local_optimizers_map.get(type(node.op), [])
-                        + self.local_optimizers_map.get(node.op, [])
-                    ):
+                    lopts = self.local_optimizers_for(node.op)
+                    nb_skipped_untracked += self._nb_local_optimizers - len(lopts)
+                    for lopt in lopts:
                         nb = change_tracker.nb_imported
+                        nb_pruned = change_tracker.nb_pruned
                         t_opt = time.time()
                         lopt_change = self.process_node(fgraph, node, lopt)
                         time_opts[lopt] += time.time() - t_opt
+                        nb_attempts[lopt] = nb_attempts.get(lopt, 0) + 1
                         if not lopt_change:
                             continue
                         process_count.setdefault(lopt, 0)
@@ -2543,6 +2817,7 @@ class EquilibriumOptimizer(NavigatorOptimizer):
                         global_process_count[lopt] += 1
                         changed = True
                         node_created[lopt] += change_tracker.nb_imported - nb
+                        node_removed[lopt] += change_tracker.nb_pruned - nb_pruned
                         changed |= apply_cleanup(iter_cleanup_sub_profs)
                         if global_process_count[lopt] > max_use:
                             max_use_abort = True
@@ -2561,6 +2836,7 @@ class EquilibriumOptimizer(NavigatorOptimizer):
             for gopt in self.final_optimizers:
                 change_tracker.reset()
                 nb = change_tracker.nb_imported
+                nb_pruned = change_tracker.nb_pruned
                 t_opt = time.time()
                 sub_prof = gopt.apply(fgraph)
                 time_opts[gopt] += time.time() - t_opt
@@ -2571,6 +2847,7 @@ class EquilibriumOptimizer(NavigatorOptimizer):
                     global_process_count[gopt] += 1
                     changed = True
                     node_created[gopt] += change_tracker.nb_imported - nb
+                    node_removed[gopt] += change_tracker.nb_pruned - nb_pruned
                     if global_process_count[gopt] > max_use:
                         max_use_abort = True
                         opt_name = getattr(gopt, "name", None) or getattr(
@@ -2593,6 +2870,7 @@ class EquilibriumOptimizer(NavigatorOptimizer):
 
             loop_process_count.append(process_count)
             loop_timing.append(float(time.time() - t0))
+            graph_sizes.append(len(fgraph.apply_nodes))
 
         end_nb_nodes = len(fgraph.apply_nodes)
 
@@ -2627,6 +2905,10 @@ class EquilibriumOptimizer(NavigatorOptimizer):
             global_sub_profs,
             final_sub_profs,
             cleanup_sub_profs,
+            nb_attempts,
+            (nb_skipped_untracked, nb_skipped_unchanged),
+            node_removed,
+            graph_sizes,
         )
 
     def print_summary(self, stream=sys.stdout, level=0, depth=-1):
@@ -2653,6 +2935,10 @@ class EquilibriumOptimizer(NavigatorOptimizer):
             global_sub_profs,
             final_sub_profs,
             cleanup_sub_profs,
+            nb_attempts,
+            (nb_skipped_untracked, nb_skipped_unchanged),
+            node_removed,
+            graph_sizes,
         ) = prof
 
         blanc = "    " * level
@@ -2677,6 +2963,13 @@ class EquilibriumOptimizer(NavigatorOptimizer):
         print(blanc, f"  time in final optimizers {s:.3f}s", file=stream)
         s = sum([time_opts[o] for o in opt.cleanup_optimizers])
         print(blanc, f"  time in cleanup optimizers {s:.3f}s", file=stream)
+        print(
+            blanc,
+            f"  local optimizer attempts made {sum(nb_attempts.values())}, "
+            f"skipped {nb_skipped_untracked} (Op not tracked), "
+            f"node visits skipped {nb_skipped_unchanged} (node unchanged)",
+            file=stream,
+        )
         for i in range(len(loop_timing)):
             lopt = ""
             if loop_process_count[i]:
@@ -2711,20 +3004,26 @@ class EquilibriumOptimizer(NavigatorOptimizer):
                 process_count[o] += v
         for o, count in process_count.items():
             if count > 0:
-                count_opt.append((time_opts[o], count, node_created[o], o))
+                count_opt.append(
+                    (time_opts[o], count, node_created[o], node_removed.get(o, 0), o)
+                )
             else:
                 not_used.append((time_opts[o], o))
                 not_used_time += time_opts[o]
 
         if count_opt:
             print(
-                blanc, "  times - times applied - nb node created - name:", file=stream
+                blanc,
+                "  times - times applied - times tried - nb node created"
+                " - nb node removed - name:",
+                file=stream,
             )
-            count_opt.sort()
-            for (t, count, n_created, o) in count_opt[::-1]:
+            count_opt.sort(key=lambda c: c[:4])
+            for (t, count, n_created, n_removed, o) in count_opt[::-1]:
                 print(
                     blanc,
-                    f"  {t:.3f}s - {int(count)} - {int(n_created)} - {o}",
+                    f"  {t:.3f}s - {int(count)} - {int(nb_attempts.get(o, 0))} - "
+                    f"{int(n_created)} - {int(n_removed)} - {o}",
                     file=stream,
                 )
             print(
@@ -2768,6 +3067,75 @@ class EquilibriumOptimizer(NavigatorOptimizer):
                 except NotImplementedError:
                     print(blanc, "merge not implemented for ", o)
 
+    @staticmethod
+    def profile_to_dict(prof):
+        (
+            opt,
+            loop_timing,
+            loop_process_count,
+            (start_nb_nodes, end_nb_nodes, max_nb_nodes),
+            global_opt_timing,
+            nb_nodes,
+            time_opts,
+            io_toposort_timing,
+            node_created,
+            global_sub_profs,
+            final_sub_profs,
+            cleanup_sub_profs,
+            nb_attempts,
+            (nb_skipped_untracked, nb_skipped_unchanged),
+            node_removed,
+            graph_sizes,
+        ) = prof
+
+        process_count = {}
+        for count in loop_process_count:
+            for o, v in count.items():
+                process_count[o] = process_count.get(o, 0) + v
+        optimizers = []
+        for kind, opts in [
+            ("global", opt.global_optimizers),
+            ("local", opt.get_local_optimizers()),
+            ("final", opt.final_optimizers),
+            ("cleanup", opt.cleanup_optimizers),
+        ]:
+            for o in opts:
+                optimizers.append(
+                    {
+                        "name": optimizer_name(o),
+                        "class": o.__class__.__name__,
+                        "kind": kind,
+                        "time": time_opts.get(o, 0),
+                        "attempts": nb_attempts.get(o, 0),
+                        "applied": process_count.get(o, 0),
+                        "nodes_created": node_created.get(o, 0),
+                        "nodes_removed": node_removed.get(o, 0),
+                    }
+                )
+        iterations = [
+            {
+                "time": loop_timing[i],
+                "global_time": global_opt_timing[i],
+                "io_toposort_time": io_toposort_timing[i],
+                "applied": sum(loop_process_count[i].values()),
+                "nodes_visited": nb_nodes[i],
+                "nodes_after": graph_sizes[i] if i < len(graph_sizes) else -1,
+            }
+            for i in range(len(loop_timing))
+        ]
+        return {
+            "class": "EquilibriumOptimizer",
+            "attempts": sum(nb_attempts.values()),
+            "applied": sum(process_count.values()),
+            "nodes_created": sum(node_created.values()),
+            "nodes_removed": sum(node_removed.values()),
+            "nodes_max": max_nb_nodes,
+            "attempts_skipped_untracked": nb_skipped_untracked,
+            "visits_skipped_unchanged": nb_skipped_unchanged,
+            "iterations": iterations,
+            "optimizers": optimizers,
+        }
+
     @staticmethod
     def merge_profile(prof1, prof2):
         # (opt, loop_timing, loop_process_count, max_nb_nodes,
@@ -2867,6 +3235,10 @@ class EquilibriumOptimizer(NavigatorOptimizer):
         assert len(loop_timing) == max(len(prof1[1]), len(prof2[1]))
 
         node_created = merge_dict(prof1[8], prof2[8])
+        nb_attempts = merge_dict(prof1[12], prof2[12])
+        nb_skipped = tuple(a + b for a, b in zip(prof1[13], prof2[13]))
+        node_removed = merge_dict(prof1[14], prof2[14])
+        graph_sizes = add_append_list(prof1[15], prof2[15])
         return (
             new_opt,
             loop_timing,
@@ -2880,6 +3252,10 @@ class EquilibriumOptimizer(NavigatorOptimizer):
             global_sub_profs,
             final_sub_profs,
             cleanup_sub_profs,
+            nb_attempts,
+            nb_skipped,
+            node_removed,
+            graph_sizes,
         )
 
 
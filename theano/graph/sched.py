@@ -1,6 +1,9 @@
 from collections import defaultdict
+from functools import partial
 
-from theano.graph.basic import list_of_nodes
+import numpy as np
+
+from theano.graph.basic import Constant, list_of_nodes
 from theano.utils import cmp
 
 
@@ -280,3 +283,306 @@ def key_to_cmp(key):
         return cmp(key(a), key(b))
 
     return key_cmp
+
+
+def variable_memory_size(var, shape_feature=None, unknown_dim=1024):
+    """
+    Estimate the number of bytes taken by the value of `var`.
+
+    Parameters
+    ----------
+    var : Variable
+        The variable.
+    shape_feature : ShapeFeature, optional
+        If given, the dimensions of `var` that it knows to be constant are
+        used.
+    unknown_dim : int
+        The size assumed for the other dimensions.
+
+    Returns
+    -------
+    int
+        The estimated size. Variables whose type has no dtype (e.g. random
+        states or lists) are counted as taking no memory.
+
+    """
+    dtype = getattr(var.type, "dtype", None)
+    if dtype is None:
+        return 0
+    try:
+        itemsize = np.dtype(dtype).itemsize
+    except TypeError:
+        return 0
+    broadcastable = getattr(var.type, "broadcastable", ())
+    shape = None
+    if shape_feature is not None:
+        shape = shape_feature.shape_of.get(var)
+    if shape is None:
+        shape = [None] * len(broadcastable)
+    size = itemsize
+    for i, dim in enumerate(shape):
+        if isinstance(dim, Constant):
+            size *= int(dim.data)
+        elif i < len(broadcastable) and broadcastable[i]:
+            continue
+        else:
+            size *= unknown_dim
+    return size
+
+
+class _MemoryModel:
+    """
+    The memory used while running the nodes of a `FunctionGraph` in some
+    order, with the intermediate results freed as soon as they are not needed
+    anymore.
+
+    The nodes are identified by their index in `nodes`. The inputs of the graph
+    are not counted, and the outputs of a node that are a view of one of its
+    inputs, or that destroy it, are counted as part of the variable they view.
+
+    """
+
+    def __init__(self, fgraph, sizes):
+        self.nodes = fgraph.toposort()
+        index = {node: i for i, node in enumerate(self.nodes)}
+        orderings = fgraph.orderings()
+        outputs = set(fgraph.outputs)
+        n = len(self.nodes)
+
+        # The variable each variable is a view of
+        view_of = {}
+        # The nodes that use each owned variable that isn't a view, or one of
+        # its views
+        self.users = {}
+        self.kept = set()
+        self.alloc = [0] * n
+        self.preds = [set() for _ in range(n)]
+        self.succs = [[] for _ in range(n)]
+        # The variables each node may free after it ran
+        self.touched = [[] for _ in range(n)]
+        for i, node in enumerate(self.nodes):
+            self.preds[i].update(
+                index[var.owner] for var in node.inputs if var.owner is not None
+            )
+            self.preds[i].update(index[pred] for pred in orderings.get(node, ()))
+            for j in self.preds[i]:
+                self.succs[j].append(i)
+            for var in node.inputs:
+                origin = view_of.get(var, var)
+                if origin in self.users and i not in self.users[origin]:
+                    self.users[origin].add(i)
+                    self.touched[i].append(origin)
+            vmap = getattr(node.op, "view_map", {})
+            dmap = getattr(node.op, "destroy_map", {})
+            for j, out in enumerate(node.outputs):
+                viewed = vmap.get(j, dmap.get(j))
+                if viewed:
+                    inp = node.inputs[viewed[0]]
+                    view_of[out] = view_of.get(inp, inp)
+                else:
+                    view_of[out] = out
+                    self.users[out] = set()
+                    self.alloc[i] += sizes[out]
+                    self.touched[i].append(out)
+                if out in outputs:
+                    self.kept.add(view_of[out])
+        self.sizes = sizes
+        # A lower bound of the peak of any order: the memory used while the
+        # largest node runs
+        self.bound = max(
+            (
+                self.alloc[i]
+                + sum(sizes[var] for var in self.touched[i] if i in self.users[var])
+                for i in range(n)
+            ),
+            default=0,
+        )
+
+    def freed(self, done, i, extra=()):
+        """
+        Return the number of bytes freed after node `i` ran, when the nodes in
+        the set `done` and in `extra` already ran.
+
+        """
+        return sum(
+            self.sizes[var]
+            for var in self.touched[i]
+            if var not in self.kept
+            and all(j == i or j in done or j in extra for j in self.users[var])
+        )
+
+    def ready(self, ready, done, i):
+        """
+        Return the nodes that can run after node `i`, when the nodes in the set
+        `done` already ran and those in `ready` could run.
+
+        """
+        return [j for j in ready if j != i] + [
+            j for j in self.succs[i] if all(p == i or p in done for p in self.preds[j])
+        ]
+
+    def peak(self, order):
+        """Return the peak memory used when running the nodes in `order`."""
+        index = {node: i for i, node in enumerate(self.nodes)}
+        done = set()
+        running = peak = 0
+        for node in order:
+            i = index[node]
+            running += self.alloc[i]
+            peak = max(peak, running)
+            running -= self.freed(done, i)
+            done.add(i)
+        return peak
+
+    def exhaustive(self, max_states):
+        """
+        Return the indices of the nodes in an order with the lowest peak, or
+        None if more than `max_states` sets of nodes would have to be
+        explored.
+
+        The memory used after running a set of nodes doesn't depend on the
+        order they ran in, so only the order with the lowest peak reaching
+        each set is kept.
+
+        """
+        # {done: (peak, running, order, ready)}, where ready are the nodes
+        # that could run before the last one of order.  The nodes that can run
+        # next are only computed for the states that are expanded.
+        states = {frozenset(): (0, 0, (), None)}
+        for _ in range(len(self.nodes)):
+            new_states = {}
+            for done, (peak, running, order, ready) in states.items():
+                if order:
+                    ready = self.ready(ready, done - {order[-1]}, order[-1])
+                else:
+                    ready = [i for i, preds in enumerate(self.preds) if not preds]
+                for i in ready:
+                    during = running + self.alloc[i]
+                    state = (
+                        max(peak, during),
+                        during - self.freed(done, i),
+                        order + (i,),
+                    )
+                    new = done | {i}
+                    if new in new_states:
+                        if state >= new_states[new][:3]:
+                            continue
+                    elif len(new_states) == max_states:
+                        return None
+                    new_states[new] = state + (ready,)
+            states = new_states
+        ((_, _, order, _),) = states.values()
+        return list(order)
+
+    def greedy(self, lookahead):
+        """
+        Return the indices of the nodes in an order built by running, at each
+        step, the node with the lowest peak, then the lowest memory used after
+        it.
+
+        With a `lookahead` larger than 1, a node is also scored by the best of
+        the sequences of up to `lookahead` nodes it starts, where each node is
+        made ready to run by the previous ones. This favors the nodes whose
+        results are consumed right away.
+
+        """
+        done = set()
+
+        def score(seq, running, peak, depth):
+            # The best (peak, running) after `seq`, or the sequences it starts
+            i = seq[-1]
+            during = running + self.alloc[i]
+            after = during - self.freed(done, i, seq)
+            best = (max(peak, during), after)
+            if depth > 1:
+                for j in self.succs[i]:
+                    if all(p in done or p in seq for p in self.preds[j]):
+                        sub = score(seq + (j,), after, best[0], depth - 1)
+                        best = min(best, sub)
+            return best
+
+        order = []
+        ready = [i for i, preds in enumerate(self.preds) if not preds]
+        running = 0
+        # Increasing the peak up to the bound can't be avoided
+        peak = self.bound
+        while ready:
+            i = min(ready, key=lambda i: (score((i,), running, peak, lookahead), i))
+            running += self.alloc[i]
+            peak = max(peak, running)
+            running -= self.freed(done, i)
+            ready = self.ready(ready, done, i)
+            done.add(i)
+            order.append(i)
+        return order
+
+
+def _memory_model(fgraph, unknown_dim):
+    shape_feature = getattr(fgraph, "shape_feature", None)
+    sizes = {
+        var: variable_memory_size(var, shape_feature, unknown_dim)
+        for var in fgraph.variables
+    }
+    return _MemoryModel(fgraph, sizes)
+
+
+def estimate_peak_memory(fgraph, order, unknown_dim=1024):
+    """
+    Estimate the peak memory used by running the nodes of `fgraph` in
+    `order`, with the intermediate results freed as soon as possible.
+
+    The sizes of the variables are estimated by `variable_memory_size`.
+
+    """
+    return _memory_model(fgraph, unknown_dim).peak(order)
+
+
+def min_memory_schedule(fgraph, lookahead=2, max_states=2000, unknown_dim=1024):
+    """
+    Order the nodes of a `FunctionGraph` to keep the peak memory low.
+
+    All the orders of the nodes are explored if the graph is small enough,
+    otherwise the order is built greedily.
+
+    Parameters
+    ----------
+    fgraph : FunctionGraph
+        The graph. If it has a `ShapeFeature`, the dimensions it knows to be
+        constant are used to estimate the sizes of the variables.
+    lookahead : int
+        The number of nodes the greedy search looks ahead at each step.
+    max_states : int
+        The maximum number of sets of nodes of the same size that the
+        exhaustive search may explore before falling back to the greedy one.
+    unknown_dim : int
+        The size assumed for the dimensions that aren't known statically.
+
+    Returns
+    -------
+    list
+        The apply nodes of `fgraph`, in the order they should run.
+
+    """
+    model = _memory_model(fgraph, unknown_dim)
+    order = model.exhaustive(max_states)
+    if order is None:
+        order = model.greedy(lookahead)
+    return [model.nodes[i] for i in order]
+
+
+def memory_schedule_fn(lookahead=2, max_states=2000, unknown_dim=1024):
+    """
+    Make a schedule function ordering the nodes to keep the peak memory low.
+
+    See Also
+    --------
+    min_memory_schedule
+
+    """
+    # Unlike a closure, a partial can be pickled with the linker
+    return partial(
+        min_memory_schedule,
+        lookahead=lookahead,
+        max_states=max_states,
+        unknown_dim=unknown_dim,
+    )
@@ -15,6 +15,7 @@ from theano.compile.compilelock import lock_ctx
 from theano.configdefaults import config
 from theano.graph.basic import Constant, NoParams, io_toposort, vars_between
 from theano.graph.callcache import CallCache
+from theano.graph.fg import FunctionGraph
 from theano.link.basic import Container, Linker, LocalLinker, PerformLinker
 from theano.link.c.cmodule import (
     METH_VARARGS,
@@ -60,6 +61,125 @@ def get_persistent_module_cache():
     return _persistent_module_cache
 
 
+def has_default_c_thunk(node):
+    """
+    Return True if the thunk of `node` would be made by `COp.make_c_thunk`,
+    i.e. by compiling a `CLinker` module for that node alone.
+
+    This doesn't check that the `Op` actually has C code.
+
+    """
+    # Imported here to avoid an import cycle
+    from theano.graph.op import COp
+
+    op = node.op
+    if (
+        not isinstance(op, COp)
+        or type(op).make_thunk is not COp.make_thunk
+        or type(op).make_c_thunk is not COp.make_c_thunk
+    ):
+        return False
+    # float16 gets special treatment, see `COp.make_c_thunk`
+    return getattr(op, "_f16_ok", False) or not any(
+        getattr(v.type, "dtype", "") == "float16" for v in node.inputs + node.outputs
+    )
+
+
+def make_c_thunk(node, cl, storage_map, compute_map):
+    """
+    Make the thunk of `node` from `cl`, a `CLinker` over a graph of `node`
+    alone, as done by `COp.make_c_thunk`.
+
+    """
+    node_input_storage = [storage_map[r] for r in node.inputs]
+    node_output_storage = [storage_map[r] for r in node.outputs]
+    thunk, node_input_filters, node_output_filters = cl.make_thunk(
+        input_storage=node_input_storage, output_storage=node_output_storage
+    )
+
+    def rval():
+        thunk()
+        for o in node.outputs:
+            compute_map[o][0] = True
+
+    rval.thunk = thunk
+    rval.cthunk = thunk.cthunk
+    rval.inputs = node_input_storage
+    rval.outputs = node_output_storage
+    rval.lazy = False
+    return rval
+
+
+def compile_node_modules(nodes, storage_map, compute_map, n_workers=None, linkers=None):
+    """
+    Compile in parallel the C modules of `nodes` that are not in the cache.
+
+    The thunks still have to be made, with `make_c_thunk` and the linkers
+    returned in `linkers`, or with `Op.make_thunk` which will then find
+    their module in the cache. Nodes whose `Op` doesn't use the default
+    `COp` thunk creation, that have no C implementation or whose module
+    can't be cached are skipped, and will be handled by `Op.make_thunk` as
+    usual.
+
+    Parameters
+    ----------
+    nodes
+        The `Apply` nodes to compile.
+    storage_map
+        The storage map the thunks of these nodes will use.
+    compute_map
+        The compute map the thunks of these nodes will use.
+    n_workers : int
+        The maximum number of modules compiled at the same time. Defaults to
+        `config.cmodule__compile_workers`.
+    linkers : dict
+        If provided, it is filled with the prepared `CLinker` of each node
+        that has a module key, so that its key isn't computed again when
+        making its thunk.
+
+    Returns
+    -------
+    int
+        The number of modules compiled.
+
+    """
+    if n_workers is None:
+        n_workers = config.cmodule__compile_workers
+    if n_workers == 0:
+        n_workers = os.cpu_count() or 1
+    if n_workers == 1 or not config.cxx:
+        return 0
+
+    key_lnk_pairs = []
+    seen_keys = set()
+    for node in nodes:
+        if not has_default_c_thunk(node):
+            continue
+        try:
+            node.op.prepare_node(
+                node, storage_map=storage_map, compute_map=compute_map, impl="c"
+            )
+            cl = CLinker().accept(FunctionGraph(node.inputs, node.outputs))
+            for cl_node in cl.node_order:
+                cl_node.op.prepare_node(cl_node, None, None, "c")
+            key = cl.cmodule_key()
+        except Exception:
+            # `Op.make_thunk` will take care of it, and raise the error if
+            # needed.
+            continue
+        if key is None:
+            continue
+        if linkers is not None:
+            linkers[node] = cl
+        if key not in seen_keys:
+            seen_keys.add(key)
+            key_lnk_pairs.append((key, cl))
+
+    if len(key_lnk_pairs) < 2:
+        return 0
+    return get_module_cache().compile_missing(key_lnk_pairs, n_workers)
+
+
 class CodeBlock:
     """
     Represents a computation unit composed of declare, behavior, and cleanup.
@@ -1280,15 +1400,19 @@ class CLinker(Linker):
         no_recycling set. Older versions of compiled modules only have the
         no_recycle list.
 
+        The key is computed once per linker.
+
         """
-        return self.cmodule_key_(
-            self.fgraph,
-            self.no_recycling,
-            compile_args=self.compile_args(),
-            libraries=self.libraries(),
-            header_dirs=self.header_dirs(),
-            c_compiler=self.c_compiler(),
-        )
+        if not hasattr(self, "_cmodule_key"):
+            self._cmodule_key = self.cmodule_key_(
+                self.fgraph,
+                self.no_recycling,
+                compile_args=self.compile_args(),
+                libraries=self.libraries(),
+                header_dirs=self.header_dirs(),
+                c_compiler=self.c_compiler(),
+            )
+        return self._cmodule_key
 
     def cmodule_key_variables(
         self,
@@ -1531,29 +1655,40 @@ class CLinker(Linker):
         """
         if location is None:
             location = dlimport_workdir(config.compiledir)
-        mod = self.get_dynamic_module()
-        c_compiler = self.c_compiler()
-        libs = self.libraries()
-        preargs = self.compile_args()
         # We want to compute the code without the lock
-        src_code = mod.code()
+        c_compiler, compile_kwargs = self.compile_cmodule_args(location)
         with lock_ctx():
             try:
                 _logger.debug(f"LOCATION {location}")
-                module = c_compiler.compile_str(
-                    module_name=mod.code_hash,
-                    src_code=src_code,
-                    location=location,
-                    include_dirs=self.header_dirs(),
-                    lib_dirs=self.lib_dirs(),
-                    libs=libs,
-                    preargs=preargs,
-                )
+                module = c_compiler.compile_str(**compile_kwargs)
             except Exception as e:
                 e.args += (str(self.fgraph),)
                 raise
         return module
 
+    def compile_cmodule_args(self, location, src_code=None):
+        """
+        Return the compiler and the keyword arguments of its `compile_str`
+        that compile the module of this linker in `location`.
+
+        `src_code` is the result of `get_src_code`, if it was already
+        computed.
+
+        """
+        mod = self.get_dynamic_module()
+        if src_code is None:
+            src_code = mod.code()
+        c_compiler = self.c_compiler()
+        return c_compiler, dict(
+            module_name=mod.code_hash,
+            src_code=src_code,
+            location=location,
+            include_dirs=self.header_dirs(),
+            lib_dirs=self.lib_dirs(),
+            libs=self.libraries(),
+            preargs=self.compile_args(),
+        )
+
     def get_dynamic_module(self):
         """
         Return a cmodule.DynamicModule instance full of the code for our fgraph.
@@ -18,6 +18,7 @@ import tempfile
 import textwrap
 import time
 import warnings
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO, StringIO
 
 import numpy.distutils
@@ -1189,10 +1190,7 @@ class ModuleCache:
             try:
                 location = dlimport_workdir(self.dirname)
                 module = lnk.compile_cmodule(location)
-                name = module.__file__
-                assert name.startswith(location)
-                assert name not in self.module_from_name
-                self.module_from_name[name] = module
+                self._add_compiled_module(module, location, key, module_hash)
                 nocleanup = True
             except OSError as e:
                 _logger.error(e)
@@ -1213,11 +1211,128 @@ class ModuleCache:
             # compilation.
             assert hash(key) == hash_key
 
-            key_data = self._add_to_cache(module, key, module_hash)
-            self.module_hash_to_key_data[module_hash] = key_data
+        return module
+
+    def _add_compiled_module(self, module, location, key, module_hash):
+        """
+        Register a module freshly compiled in `location`.
 
+        This function expects the compile lock to be held.
+
+        """
+        name = module.__file__
+        assert name.startswith(location)
+        assert name not in self.module_from_name
+        self.module_from_name[name] = module
+        key_data = self._add_to_cache(module, key, module_hash)
+        self.module_hash_to_key_data[module_hash] = key_data
         self.stats[2] += 1
-        return module
+
+    def compile_missing(self, key_lnk_pairs, n_workers):
+        """
+        Compile in parallel the modules that are missing from the cache.
+
+        The modules are built by up to `n_workers` compiler processes running
+        at the same time. The compile lock is held by the calling thread for
+        the whole duration, so other processes don't compile the same modules
+        concurrently. Once this returns, `module_from_key` will find the
+        modules in the cache.
+
+        Compilation errors are not raised here: the failing modules are
+        simply not added to the cache, so the error will be raised by
+        `module_from_key` as usual.
+
+        Parameters
+        ----------
+        key_lnk_pairs
+            A list of ``(key, lnk)`` pairs, as taken by `module_from_key`.
+            `lnk` must also define `compile_cmodule_args(location, src_code)`.
+        n_workers : int
+            The maximum number of modules compiled at the same time.
+
+        Returns
+        -------
+        int
+            The number of modules compiled.
+
+        """
+
+        # The source code of each key, generated at most once.
+        sources = {}
+
+        def find_missing():
+            # Map each missing module hash to the keys that use it, and to
+            # the first linker found for it.
+            missing = {}
+            seen = set()
+            for key, lnk in key_lnk_pairs:
+                if key in seen or self._get_from_key(key) is not None:
+                    continue
+                seen.add(key)
+                if key not in sources:
+                    try:
+                        sources[key] = lnk.get_src_code()
+                    except Exception:
+                        # e.g. the Op has no C code. This will be handled
+                        # (and raised if needed) by `module_from_key`.
+                        sources[key] = None
+                if sources[key] is None:
+                    continue
+                module_hash = get_module_hash(sources[key], key)
+                if self._get_from_hash(module_hash, key) is not None:
+                    continue
+                missing.setdefault(module_hash, (lnk, []))[1].append(key)
+            return missing
+
+        if not find_missing():
+            return 0
+
+        with lock_ctx():
+            # Somebody else may have compiled some of them while we were
+            # waiting for the lock.
+            self.refresh(cleanup=False)
+            missing = find_missing()
+
+            jobs = {}
+            for module_hash, (lnk, keys) in missing.items():
+                location = dlimport_workdir(self.dirname)
+                c_compiler, kwargs = lnk.compile_cmodule_args(
+                    location, sources[keys[0]]
+                )
+                jobs[module_hash] = (location, c_compiler, kwargs)
+
+            def compile_job(job):
+                location, c_compiler, kwargs = job
+                return c_compiler.compile_str(py_module=False, **kwargs)
+
+            with ThreadPoolExecutor(max_workers=n_workers) as executor:
+                futures = {
+                    module_hash: executor.submit(compile_job, job)
+                    for module_hash, job in jobs.items()
+                }
+
+            n_compiled = 0
+            for module_hash, future in futures.items():
+                location = jobs[module_hash][0]
+                keys = missing[module_hash][1]
+                try:
+                    lib_filename = future.result()
+                    # touch the __init__ file
+                    open(os.path.join(location, "__init__.py"), "w").close()
+                    module = dlimport(lib_filename)
+                    self._add_compiled_module(module, location, keys[0], module_hash)
+                except Exception as e:
+                    _logger.debug(f"Parallel compilation of {location} failed: {e}")
+                    _rmtree(
+                        location,
+                        ignore_if_missing=True,
+                        msg="exception during compilation",
+                    )
+                    continue
+                n_compiled += 1
+                for key in keys[1:]:
+                    self._get_from_hash(module_hash, key)
+        return n_compiled
 
     def check_key(self, key, key_pkl):
         """
@@ -2411,7 +2526,8 @@ class GCC_compiler(Compiler):
         -------
         object
             Dynamically-imported python module of the compiled code (unless
-            py_module is False, in that case returns None).
+            py_module is False, in that case returns the path of the shared
+            library).
 
         """
         # TODO: Do not do the dlimport in this function
@@ -2555,6 +2671,7 @@ class GCC_compiler(Compiler):
             open(os.path.join(location, "__init__.py"), "w").close()
             assert os.path.isfile(lib_filename)
             return dlimport(lib_filename)
+        return lib_filename
 
 
 def icc_module_compile_str(*args):
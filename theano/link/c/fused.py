@@ -0,0 +1,325 @@
+"""
+Fuse the C-capable nodes of a graph into whole-graph C modules.
+
+The default VM makes one thunk, and one C module, per node, and dispatches
+them one by one. For graphs made of many cheap nodes, that dispatch
+dominates the run time. `fuse_c_nodes` replaces each maximal run of
+consecutive (in topological order) nodes that have C code by a single
+`FusedCOp` node. Its thunk is made by a `CLinker` over the whole run, i.e.
+a single generated struct with one ``run()`` entry point. The other nodes
+(Python-only `Op`s, lazy `Op`s like `IfElse` or `Scan`, ...) are left as is
+and are run by the VM between the fused nodes.
+
+This is used by `VMLinker` when `fuse_c` is True (e.g. with the
+``cvm_fused`` linker).
+
+"""
+import logging
+
+from theano.graph.basic import Apply, Constant, NoParams, applys_between, clone
+from theano.graph.destroyhandler import DestroyHandler
+from theano.graph.fg import FunctionGraph
+from theano.graph.op import Op
+from theano.graph.utils import MethodNotDefined
+from theano.link.c.basic import CLinker, has_default_c_thunk
+from theano.link.c.interface import CLinkerOp, CLinkerType
+
+
+_logger = logging.getLogger("theano.link.c.fused")
+
+
+class FusedCOp(Op):
+    """
+    An `Op` computing a graph of C-capable nodes with a single C module.
+
+    Parameters
+    ----------
+    inputs
+        The inputs of the inner graph.
+    outputs
+        The outputs of the inner graph.
+
+    """
+
+    def __init__(self, inputs, outputs):
+        self.inputs = inputs
+        self.outputs = outputs
+        self.n_nodes = len(list(applys_between(inputs, outputs)))
+
+    def __str__(self):
+        return f"{type(self).__name__}{{{self.n_nodes} nodes}}"
+
+    def fgraph(self):
+        """Return a new `FunctionGraph` of a copy of the inner graph."""
+        fgraph = FunctionGraph(self.inputs, self.outputs)
+        if any(getattr(n.op, "destroy_map", None) for n in fgraph.apply_nodes):
+            # The inplace nodes must be scheduled after the other clients of
+            # the variables they destroy.
+            fgraph.attach_feature(DestroyHandler())
+        return fgraph
+
+    def make_node(self, *inputs):
+        return Apply(self, list(inputs), [o.type() for o in self.outputs])
+
+    def perform(self, node, inputs, outputs):
+        raise MethodNotDefined("perform", type(self), type(self).__name__)
+
+    def make_thunk(self, node, storage_map, compute_map, no_recycling, impl=None):
+        fgraph = self.fgraph()
+        input_storage = [storage_map[v] for v in node.inputs]
+        output_storage = [storage_map[v] for v in node.outputs]
+
+        if impl != "py":
+            try:
+                cl = CLinker().accept(fgraph)
+                for inner in cl.node_order:
+                    inner.op.prepare_node(inner, None, None, "c")
+                thunk, _, _ = cl.make_thunk(
+                    input_storage=input_storage, output_storage=output_storage
+                )
+            except (NotImplementedError, MethodNotDefined):
+                if impl == "c":
+                    raise
+                _logger.debug(f"Falling back to one thunk per node for {self}")
+            else:
+
+                def rval():
+                    thunk()
+                    for o in node.outputs:
+                        compute_map[o][0] = True
+
+                rval.thunk = thunk
+                rval.cthunk = thunk.cthunk
+                rval.inputs = input_storage
+                rval.outputs = output_storage
+                rval.lazy = False
+                return rval
+
+        # Run the inner nodes one after the other
+        inner_storage = {}
+        inner_compute = {}
+        for var, storage in zip(fgraph.inputs, input_storage):
+            inner_storage[var] = storage
+            inner_compute[var] = [True]
+        for var, storage in zip(fgraph.outputs, output_storage):
+            inner_storage[var] = storage
+        order = fgraph.toposort()
+        for inner in order:
+            for var in inner.inputs:
+                if isinstance(var, Constant) and var not in inner_storage:
+                    inner_storage[var] = [var.data]
+                    inner_compute[var] = [True]
+            for var in inner.outputs:
+                inner_storage.setdefault(var, [None])
+                inner_compute[var] = [False]
+        thunks = [
+            inner.op.make_thunk(inner, inner_storage, inner_compute, [], impl=impl)
+            for inner in order
+        ]
+
+        def rval():
+            for t in thunks:
+                t()
+            for o in node.outputs:
+                compute_map[o][0] = True
+
+        rval.inputs = input_storage
+        rval.outputs = output_storage
+        rval.lazy = False
+        return rval
+
+
+def _fusable_info(node, memo):
+    """
+    Return None if `node` has no C code that a `CLinker` can fuse.
+
+    Otherwise, return the positions of the inputs whose Python object is
+    used by the C code of the `Op`. These inputs must be inputs of the
+    `FusedCOp`, as the Python objects of the temporary variables of a module
+    aren't available during the run.
+
+    Only the C code of the `Op` itself is generated, not a whole module.
+    The result is stored in `memo`, keyed on the `Op` and the types of the
+    node, as it doesn't depend on anything else.
+
+    """
+    if not has_default_c_thunk(node):
+        return None
+    key = (
+        node.op,
+        tuple(v.type for v in node.inputs),
+        tuple(v.type for v in node.outputs),
+    )
+    if key not in memo:
+        memo[key] = _c_code_info(node)
+    return memo[key]
+
+
+def _c_code_info(node):
+    if not isinstance(node.op, CLinkerOp) or not all(
+        isinstance(v.type, CLinkerType) for v in node.inputs + node.outputs
+    ):
+        return None
+    params = node.run_params()
+    if params is not NoParams and not isinstance(node.params_type, CLinkerType):
+        return None
+    isyms = [f"__fused_i{i}__" for i in range(len(node.inputs))]
+    osyms = [f"__fused_o{i}__" for i in range(len(node.outputs))]
+    sub = dict(failure_var="__failure", id=0, fail="", params="__fused_params__")
+    try:
+        code = node.op.c_code(node, "fused_check", isyms, osyms, sub)
+    except (NotImplementedError, MethodNotDefined):
+        return None
+    return tuple(i for i, sym in enumerate(isyms) if f"py_{sym}" in code)
+
+
+def _lazy_guards(fgraph, order):
+    """
+    Return the branches of the lazy `Op`s that each node is needed by.
+
+    The guard of a node is None when it is always computed. Otherwise it is
+    the set of ``(ifelse_node, then_branch)`` pairs of the `IfElse` branches
+    that use it: the lazy VM only computes it if one of them is taken.
+
+    """
+    # Imported here to avoid an import cycle
+    from theano.ifelse import IfElse
+
+    guards = {}
+    for node in reversed(order):
+        contexts = set()
+        always = False
+        for var in node.outputs:
+            for client, i in fgraph.clients[var]:
+                if client == "output":
+                    always = True
+                elif isinstance(client.op, IfElse) and i > 0:
+                    contexts.add((client, i <= client.op.n_outs))
+                elif guards[client] is None:
+                    always = True
+                else:
+                    contexts.update(guards[client])
+        guards[node] = None if always or not contexts else frozenset(contexts)
+    return guards
+
+
+def _view_root(var, segment_nodes):
+    """Follow the view and destroy maps of `var` inside a segment."""
+    while var.owner in segment_nodes:
+        node = var.owner
+        idx = node.outputs.index(var)
+        aliased = getattr(node.op, "view_map", {}).get(idx, []) + getattr(
+            node.op, "destroy_map", {}
+        ).get(idx, [])
+        if not aliased:
+            break
+        var = node.inputs[aliased[0]]
+    return var
+
+
+def _fuse_segment(fgraph, segment):
+    segment_nodes = set(segment)
+    inputs = []
+    outputs = []
+    for node in segment:
+        for var in node.inputs:
+            if (
+                var.owner not in segment_nodes
+                and not isinstance(var, Constant)
+                and var not in inputs
+            ):
+                inputs.append(var)
+        for var in node.outputs:
+            if any(
+                client == "output" or client not in segment_nodes
+                for client, _ in fgraph.clients[var]
+            ):
+                outputs.append(var)
+
+    inner_inputs, inner_outputs = clone(inputs, outputs)
+    op = FusedCOp(inner_inputs, inner_outputs)
+    view_map = {}
+    for idx, var in enumerate(outputs):
+        root = _view_root(var, segment_nodes)
+        if root in inputs:
+            view_map[idx] = [inputs.index(root)]
+    if view_map:
+        op.view_map = view_map
+
+    new_node = op.make_node(*inputs)
+    for var, new_var in zip(outputs, new_node.outputs):
+        # Only the clients outside of the segment are changed, the nodes of
+        # the segment are then pruned from the graph.
+        for client, i in list(fgraph.clients[var]):
+            if client == "output" or client not in segment_nodes:
+                fgraph.change_input(client, i, new_var, reason="fuse_c_nodes")
+    return dict(zip(outputs, new_node.outputs))
+
+
+def fuse_c_nodes(fgraph, min_size=2, max_size=100):
+    """
+    Replace the runs of C-capable nodes of `fgraph` by `FusedCOp` nodes.
+
+    Nodes that are only needed by a branch of an `IfElse` are only fused
+    with nodes needed by the same branches, so that the lazy evaluation of
+    the graph still skips them.
+
+    Parameters
+    ----------
+    fgraph : FunctionGraph
+        The graph to modify in place.
+    min_size : int
+        The minimum number of nodes of a run to fuse it.
+    max_size : int
+        The maximum number of nodes of a `FusedCOp`. Longer runs are split,
+        as the compilation time of a module grows faster than its size.
+
+    Returns
+    -------
+    dict
+        A map from the variables that have been replaced to their
+        replacement.
+
+    """
+    order = fgraph.toposort()
+    guards = _lazy_guards(fgraph, order)
+    memo = {}
+    segments = []
+    current = []
+    current_nodes = set()
+    for node in order:
+        py_inputs = _fusable_info(node, memo)
+        fusable = py_inputs is not None
+        if (
+            fusable
+            and current
+            and (
+                len(current) >= max_size
+                or guards[node] != guards[current[0]]
+                or any(node.inputs[i].owner in current_nodes for i in py_inputs)
+            )
+        ):
+            segments.append(current)
+            current = []
+            current_nodes = set()
+        if fusable:
+            # A `FusedCOp` can't destroy its inputs, even through a view.
+            fusable = all(
+                _view_root(node.inputs[i], current_nodes).owner in current_nodes
+                for idxs in getattr(node.op, "destroy_map", {}).values()
+                for i in idxs
+            )
+        if fusable:
+            current.append(node)
+            current_nodes.add(node)
+        else:
+            segments.append(current)
+            current = []
+            current_nodes = set()
+    segments.append(current)
+
+    replacements = {}
+    for segment in segments:
+        if len(segment) >= min_size:
+            replacements.update(_fuse_segment(fgraph, segment))
+    return replacements
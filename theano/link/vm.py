@@ -14,6 +14,8 @@ from collections import defaultdict
 
 from theano.configdefaults import config
 from theano.graph.basic import Constant, Variable
+from theano.graph.sched import memory_schedule_fn
+from theano.graph.utils import MethodNotDefined
 from theano.link.basic import Container, LocalLinker
 from theano.link.c.exceptions import MissingGXX
 from theano.link.utils import gc_helper, map_storage, raise_with_op
@@ -121,6 +123,126 @@ def calculate_reallocate_info(order, fgraph, storage_map, compute_map_re, depend
     return reallocated_info
 
 
+def _lifetimes(order, fgraph):
+    """
+    Return the variables that each variable of `order` is a view of, the
+    variables whose lifetime can't be tracked, and the index in `order` of
+    the last node using each variable or its views.
+
+    """
+    view_of = {}
+    untracked = set()
+    for node in order:
+        dmap = getattr(node.op, "destroy_map", None) or {}
+        vmap = getattr(node.op, "view_map", None) or {}
+        for idx_o, out in enumerate(node.outputs):
+            aliased = list(dmap.get(idx_o, [])) + list(vmap.get(idx_o, []))
+            origins = {view_of.get(node.inputs[i], node.inputs[i]) for i in aliased}
+            if len(origins) == 1:
+                view_of[out] = origins.pop()
+            elif origins:
+                # The output is a view of several variables
+                view_of[out] = out
+                untracked.add(out)
+                untracked.update(origins)
+
+    last_use = {}
+    for idx, node in enumerate(order):
+        for var in node.outputs + node.inputs:
+            last_use[view_of.get(var, var)] = idx
+    return view_of, untracked, last_use
+
+
+def plan_memory(order, fgraph):
+    """
+    Assign the intermediate results computed by `order` to reusable buffers.
+
+    The lifetime of a variable lasts from the node that computes it to the
+    last node that uses it, or a view of it, or a variable that destroyed it
+    (see `view_map` and `destroy_map`). Variables are packed greedily, in
+    `order`, into buffers whose previous variable's lifetime is over. When
+    the graph has a `ShapeFeature`, a buffer that held a variable of the same
+    shape is preferred, so that its storage can be reused as is.
+
+    Parameters
+    ----------
+    order : list of Apply
+        The nodes of `fgraph`, in the order they are run.
+    fgraph : FunctionGraph
+
+    Returns
+    -------
+    list of list of Variable
+        The variables that share each buffer, in the order they are computed.
+        Only variables of the same type share a buffer. The outputs of the
+        graph, the variables they are views of, and the outputs that are
+        views of or destroy another variable are not assigned to any buffer.
+
+    """
+    view_of, unplanned, last_use = _lifetimes(order, fgraph)
+    for out in fgraph.outputs:
+        unplanned.add(view_of.get(out, out))
+    ends = defaultdict(list)
+    for var, idx in last_use.items():
+        ends[idx].append(var)
+
+    shape_of = getattr(getattr(fgraph, "shape_feature", None), "shape_of", {})
+
+    def shape_key(var):
+        shape = shape_of.get(var)
+        return None if shape is None else tuple(shape)
+
+    buffers = []
+    # The buffer of each variable
+    buffer_of = {}
+    # type -> buffers whose last variable isn't used anymore
+    free = defaultdict(list)
+    for idx, node in enumerate(order):
+        for out in node.outputs:
+            if out in view_of or out in unplanned:
+                continue
+            candidates = free[out.type]
+            buf = None
+            key = shape_key(out)
+            if key is not None:
+                for i in range(len(candidates) - 1, -1, -1):
+                    if shape_key(candidates[i][-1]) == key:
+                        buf = candidates.pop(i)
+                        break
+            if buf is None and candidates:
+                buf = candidates.pop()
+            if buf is None:
+                buf = []
+                buffers.append(buf)
+            buf.append(out)
+            buffer_of[out] = buf
+        for var in ends[idx]:
+            if var in buffer_of:
+                free[var.type].append(buffer_of[var])
+    return buffers
+
+
+def memory_plan_handoffs(order, fgraph, buffers, storage_map):
+    """
+    Return, for each node of `order`, the ``(src, dst)`` pairs of storage
+    cells whose content has to be moved from `src` to `dst` after it runs,
+    for the variables of each of `buffers` (see `plan_memory`) to use the
+    same storage.
+
+    The storage of the last variable of a buffer is moved back to the first
+    one, ready for the next call.
+
+    """
+    _, _, last_use = _lifetimes(order, fgraph)
+    handoffs = [[] for _ in order]
+    for buf in buffers:
+        if len(buf) < 2:
+            continue
+        for var, next_var in zip(buf, buf[1:] + buf[:1]):
+            handoffs[last_use[var]].append((storage_map[var], storage_map[next_var]))
+    return handoffs
+
+
 class VM:
     """
     A VM object's __call__ method evaluates a Theano program.
@@ -155,6 +277,10 @@ class VM:
         List of floats, one for each thunk. call_times[i] is the amount of
         runtime spent on thunks[i] in the course of computations performed by
         call_with_timers().
+    timeline
+        None, or a list to which a tuple ``(i, start, end)`` is appended each
+        time thunks[i] is timed, with the `time.time` at which it started and
+        ended. The C VM doesn't record it.
 
     need_update_inputs : bool
         True indicates that Function.__call__ must implement the feedback from
@@ -163,6 +289,8 @@ class VM:
 
     """
 
+    timeline = None
+
     def __init__(self, fgraph, nodes, thunks, pre_call_clear):
 
         if len(nodes) != len(thunks):
@@ -201,18 +329,21 @@ class VM:
         """
         raise NotImplementedError("override me")
 
-    def update_profile(self, profile):
+    def update_profile(self, profile, scale=1):
         """
         Accumulate into the profile object
+
+        The times and call counts are multiplied by `scale`, when only 1 in
+        `scale` calls was timed.
         """
         for node, thunk, t, c in zip(
             self.nodes, self.thunks, self.call_times, self.call_counts
         ):
             profile.apply_time.setdefault((self.fgraph, node), 0.0)
-            profile.apply_time[(self.fgraph, node)] += t
+            profile.apply_time[(self.fgraph, node)] += t * scale
 
             profile.apply_callcount.setdefault((self.fgraph, node), 0)
-            profile.apply_callcount[(self.fgraph, node)] += c
+            profile.apply_callcount[(self.fgraph, node)] += c * scale
 
             profile.apply_cimpl[node] = hasattr(thunk, "cthunk")
 
@@ -230,6 +361,12 @@ class VM:
         if hasattr(self, "dependencies"):
             profile.dependencies = self.dependencies
 
+        if self.timeline:
+            profile.timeline.extend(
+                (self.fgraph, self.nodes[i], t0, t1) for i, t0, t1 in self.timeline
+            )
+            del self.timeline[:]
+
         # clear the timer info out of the buffers
         for i in range(len(self.call_times)):
             self.call_times[i] = 0.0
@@ -257,6 +394,8 @@ class Loop(VM):
                     t1 = time.time()
                     self.call_counts[i] += 1
                     self.call_times[i] += t1 - t0
+                    if self.timeline is not None:
+                        self.timeline.append((i, t0, t1))
             except Exception:
                 raise_with_op(self.fgraph, node, thunk)
         else:
@@ -298,6 +437,8 @@ class LoopGC(VM):
                     t1 = time.time()
                     self.call_counts[i] += 1
                     self.call_times[i] += t1 - t0
+                    if self.timeline is not None:
+                        self.timeline.append((i, t0, t1))
                     for old_s in old_storage:
                         old_s[0] = None
                     i += 1
@@ -317,6 +458,68 @@ class LoopGC(VM):
                 raise_with_op(self.fgraph, node, thunk)
 
 
+class LoopPlanned(VM):
+    """
+    Unconditional start-to-finish program execution in Python, where the
+    intermediate results share the buffers assigned by `plan_memory`.
+
+    After each thunk, the storage of the variables that aren't used anymore
+    is moved to the next variable of their buffer, so that the thunks
+    computing it can write into it, on this call and the next ones.
+
+    """
+
+    def __init__(
+        self,
+        fgraph,
+        nodes,
+        thunks,
+        pre_call_clear,
+        post_thunk_clear,
+        post_thunk_handoff,
+        allow_gc,
+    ):
+        super().__init__(fgraph, nodes, thunks, pre_call_clear)
+        self.post_thunk_clear = post_thunk_clear
+        self.post_thunk_handoff = post_thunk_handoff
+        # Some other part of Theano query that information
+        self.allow_gc = allow_gc
+        if not (len(nodes) == len(thunks) == len(post_thunk_clear)):
+            raise ValueError()
+        if len(nodes) != len(post_thunk_handoff):
+            raise ValueError()
+
+    def __call__(self):
+        for cont in self.pre_call_clear:
+            cont[0] = None
+        try:
+            for i, (thunk, node, old_storage, handoff) in enumerate(
+                zip(
+                    self.thunks,
+                    self.nodes,
+                    self.post_thunk_clear,
+                    self.post_thunk_handoff,
+                )
+            ):
+                if self.time_thunks:
+                    t0 = time.time()
+                    thunk()
+                    t1 = time.time()
+                    self.call_counts[i] += 1
+                    self.call_times[i] += t1 - t0
+                    if self.timeline is not None:
+                        self.timeline.append((i, t0, t1))
+                else:
+                    thunk()
+                for old_s in old_storage:
+                    old_s[0] = None
+                for src, dst in handoff:
+                    dst[0] = src[0]
+                    src[0] = None
+        except Exception:
+            raise_with_op(self.fgraph, node, thunk)
+
+
 class Stack(VM):
     """
     Finish-to-start evalution order of thunks.
@@ -412,13 +615,16 @@ class Stack(VM):
         idx = self.node_idx[node]
         t0 = time.time()
         rval = self.thunks[idx]()
+        t1 = time.time()
         self.node_executed_order.append(node)
 
         # Some thunks on some computers run faster than the granularity
         # of the time.time clock.
         # Profile output looks buggy if a node has run but takes 0 time.
         # (and profile code might hide real bugs if it rounds up 0)
-        dt = max(time.time() - t0, 1e-10)
+        dt = max(t1 - t0, 1e-10)
+        if self.time_thunks and self.timeline is not None:
+            self.timeline.append((idx, t0, t1))
         if self.callback is not None:
             self.callback(
                 node=node,
@@ -511,10 +717,11 @@ class Stack(VM):
                     try:
                         _, dt = self.run_thunk_of_node(current_apply)
                         del _
-                        if config.profile or config.print_global_stats:
-                            current_idx = self.node_idx[current_apply]
+                        current_idx = self.node_idx[current_apply]
+                        if self.time_thunks:
                             self.call_counts[current_idx] += 1
                             self.call_times[current_idx] += dt
+                        if config.profile or config.print_global_stats:
                             # Computing the memory footprint of the the op
                             # ?? What about inplace .. if the op is inplace
                             # you don't actually ask for more memory!
@@ -609,9 +816,10 @@ class Stack(VM):
 
                 try:
                     requires, dt = self.run_thunk_of_node(current_apply)
-                    current_idx = self.node_idx[current_apply]
-                    self.call_counts[current_idx] += 1
-                    self.call_times[current_idx] += dt
+                    if self.time_thunks:
+                        current_idx = self.node_idx[current_apply]
+                        self.call_counts[current_idx] += 1
+                        self.call_times[current_idx] += dt
 
                 except Exception:
                     raise_with_op(
@@ -727,6 +935,22 @@ class VMLinker(LocalLinker):
     allow_partial_eval
         If True, enforces usage of Stack or CVM, to allow for partial
         evaluation of functions (calculating a subset of outputs).
+    fuse_c
+        If True, the runs of consecutive nodes that have C code are each
+        compiled into a single C module and run by a single thunk. See
+        `theano.link.c.fused`.
+    memory_planner
+        If True, the intermediate results share a small set of buffers that
+        are kept between calls (see `plan_memory`), instead of being
+        allocated on each call. Only used by the Python VMs without lazy
+        evaluation, as the other ones don't run the nodes in a fixed order.
+        If None, use the value of the Theano flag vm__memory_planner.
+    memory_schedule
+        If True and no `schedule` is given, the nodes are run in an order
+        that keeps the peak memory low (see
+        `theano.graph.sched.min_memory_schedule`). Only Loop and LoopGC run
+        the nodes in that order, the other VMs evaluate them on demand.
+        If None, use the value of the Theano flag vm__memory_schedule.
 
     """
 
@@ -740,6 +964,9 @@ class VMLinker(LocalLinker):
         schedule=None,
         c_thunks=None,
         allow_partial_eval=None,
+        fuse_c=False,
+        memory_planner=None,
+        memory_schedule=None,
     ):
         # Note: if more parameters are added to __init__, make sure to forward
         # them in the "type(self)(...)" call in the "accept" method below.
@@ -754,6 +981,15 @@ class VMLinker(LocalLinker):
             c_thunks = bool(config.cxx)
         self.c_thunks = c_thunks
         self.allow_partial_eval = allow_partial_eval
+        self.fuse_c = fuse_c
+        if memory_planner is None:
+            memory_planner = config.vm__memory_planner
+        self.memory_planner = memory_planner
+        if memory_schedule is None:
+            memory_schedule = config.vm__memory_schedule
+        self.memory_schedule = memory_schedule
+        if memory_schedule and schedule is None:
+            schedule = memory_schedule_fn()
         self.updated_vars = {}
         super().__init__(allow_gc=allow_gc, scheduler=schedule)
 
@@ -816,7 +1052,20 @@ class VMLinker(LocalLinker):
                 schedule=self.schedule,
                 c_thunks=self.c_thunks,
                 allow_partial_eval=self.allow_partial_eval,
+                fuse_c=self.fuse_c,
+                memory_planner=self.memory_planner,
+                memory_schedule=self.memory_schedule,
             ).accept(fgraph, no_recycling, profile)
+        if self.fuse_c and self.c_thunks:
+            from theano.link.c.fused import fuse_c_nodes
+
+            replacements = fuse_c_nodes(fgraph)
+            # The variables inside of the fused nodes don't exist anymore
+            no_recycling = [
+                replacements.get(v, v)
+                for v in no_recycling
+                if v in replacements or v in fgraph.variables
+            ]
         self.fgraph = fgraph
         self.no_recycling = no_recycling
         self.profile = profile
@@ -885,6 +1134,7 @@ class VMLinker(LocalLinker):
         computed,
         compute_map,
         updated_vars,
+        post_thunk_handoff=None,
     ):
 
         pre_call_clear = [storage_map[v] for v in self.no_recycling]
@@ -898,6 +1148,7 @@ class VMLinker(LocalLinker):
             self.callback is not None
             or self.callback_input is not None
             or ((config.profile or config.print_global_stats) and config.profile_memory)
+            or (config.profile and config.profiling__timeline and self.use_cloop)
             or (self.allow_partial_eval and not self.use_cloop)
         ):
 
@@ -907,6 +1158,8 @@ class VMLinker(LocalLinker):
                 logger.warning("CVM does not support callback, using Stack VM.")
             if self.use_cloop and config.profile_memory:
                 warnings.warn("CVM does not support memory profile, using Stack VM.")
+            if self.use_cloop and config.profile and config.profiling__timeline:
+                warnings.warn("CVM does not support timeline profile, using Stack VM.")
             if not self.use_cloop and self.allow_partial_eval:
                 warnings.warn(
                     "LoopGC does not support partial evaluation, " "using Stack VM."
@@ -1053,7 +1306,17 @@ class VMLinker(LocalLinker):
                 lazy = not all([(not th.lazy) for th in thunks])
             if not lazy:
                 # there is no conditional in the graph
-                if self.allow_gc:
+                if post_thunk_handoff is not None:
+                    vm = LoopPlanned(
+                        self.fgraph,
+                        nodes,
+                        thunks,
+                        pre_call_clear,
+                        post_thunk_clear or [[] for _ in nodes],
+                        post_thunk_handoff,
+                        self.allow_gc,
+                    )
+                elif self.allow_gc:
                     vm = LoopGC(
                         self.fgraph,
                         nodes,
@@ -1119,17 +1382,35 @@ class VMLinker(LocalLinker):
         t0 = time.time()
         linker_make_thunk_time = {}
         impl = None
+        linkers = {}
         if self.c_thunks is False:
             impl = "py"
+        else:
+            # Compile all the missing C modules in parallel first, the loop
+            # below will then find them in the cache.
+            from theano.link.c.basic import compile_node_modules, make_c_thunk
+
+            compile_node_modules(order, storage_map, compute_map, linkers=linkers)
         for node in order:
             try:
                 thunk_start = time.time()
-                # no-recycling is done at each VM.__call__ So there is
-                # no need to cause duplicate c code by passing
-                # no_recycling here.
-                thunks.append(
-                    node.op.make_thunk(node, storage_map, compute_map, [], impl=impl)
-                )
+                thunk = None
+                if node in linkers:
+                    # Reuse the linker (and module key) of the pre-compilation
+                    try:
+                        thunk = make_c_thunk(
+                            node, linkers[node], storage_map, compute_map
+                        )
+                    except (NotImplementedError, MethodNotDefined):
+                        pass
+                if thunk is None:
+                    # no-recycling is done at each VM.__call__ So there is
+                    # no need to cause duplicate c code by passing
+                    # no_recycling here.
+                    thunk = node.op.make_thunk(
+                        node, storage_map, compute_map, [], impl=impl
+                    )
+                thunks.append(thunk)
                 linker_make_thunk_time[node] = time.time() - thunk_start
                 if not hasattr(thunks[-1], "lazy"):
                     # We don't want all ops maker to think about lazy Ops.
@@ -1158,6 +1439,7 @@ class VMLinker(LocalLinker):
             lazy = config.vm__lazy
         if lazy is None:
             lazy = not all([(not th.lazy) for th in thunks])
+        post_thunk_handoff = None
         if not (
             lazy
             or ((config.profile or config.print_global_stats) and config.profile_memory)
@@ -1165,8 +1447,15 @@ class VMLinker(LocalLinker):
             or self.callback
             or self.callback_input
         ):
-            for pair in reallocated_info.values():
-                storage_map[pair[1]] = storage_map[pair[0]]
+            if self.memory_planner and not self.allow_partial_eval:
+                buffers = plan_memory(order, fgraph)
+                post_thunk_handoff = memory_plan_handoffs(
+                    order, fgraph, buffers, storage_map
+                )
+                reallocated_info = {var: None for buf in buffers for var in buf}
+            else:
+                for pair in reallocated_info.values():
+                    storage_map[pair[1]] = storage_map[pair[0]]
 
         computed, last_user = gc_helper(order)
         if self.allow_gc:
@@ -1195,6 +1484,7 @@ class VMLinker(LocalLinker):
             computed,
             compute_map,
             self.updated_vars,
+            post_thunk_handoff,
         )
 
         vm.storage_map = storage_map
@@ -1222,3 +1512,7 @@ class VMLinker(LocalLinker):
             self.allow_partial_eval = None
         if not hasattr(self, "callback_input"):
             self.callback_input = None
+        if not hasattr(self, "memory_planner"):
+            self.memory_planner = False
+        if not hasattr(self, "memory_schedule"):
+            self.memory_schedule = False
@@ -0,0 +1,88 @@
+"""
+Compare two optimizer profiles exported as JSON.
+
+The profiles are written by `ProfileStats.dump_optimizer_profile`, or for all
+the profiled functions of a program by setting the Theano flags
+``profile=True,profile_optimizer=True`` and
+``profiling__optimizer_destination`` to a file name.
+
+Usage: python diff_optimizer_profiles.py <old.json> <new.json>
+
+"""
+import json
+import sys
+from optparse import OptionParser
+
+from theano.compile.profiling import optimizer_profile_diff, optimizer_stat_keys
+
+
+parser = OptionParser(
+    usage="%prog <options> <old.json> <new.json>\n"
+    " Compare the optimizers of two optimizer profiles"
+)
+parser.add_option(
+    "-n",
+    action="store",
+    dest="n",
+    default=20,
+    type="int",
+    help="Number of optimizers to print (0 prints all of them)",
+)
+parser.add_option(
+    "--sort",
+    action="store",
+    dest="sort",
+    default="time",
+    choices=optimizer_stat_keys,
+    help=f"Print the largest changes of {', '.join(optimizer_stat_keys)}",
+)
+
+
+def format_diff(rows, key="time", n=20):
+    """
+    Return the lines of the table of the `n` largest changes of `key` in
+    `rows`, as returned by `optimizer_profile_diff`.
+
+    """
+    missing = dict.fromkeys(optimizer_stat_keys, 0)
+
+    def change(row):
+        _, old, new = row
+        return abs((new or missing)[key] - (old or missing)[key])
+
+    rows = sorted(rows, key=change, reverse=True)
+    if n > 0:
+        rows = rows[:n]
+    lines = [
+        "old time - new time - change - applied (old/new) - nodes created"
+        " (old/new) - nodes removed (old/new) - optimizer"
+    ]
+    for path, old, new in rows:
+        if old is None:
+            path += " (new)"
+        elif new is None:
+            path += " (removed)"
+        old = old or missing
+        new = new or missing
+        lines.append(
+            f"{old['time']:8.3f}s - {new['time']:8.3f}s"
+            f" - {new['time'] - old['time']:+8.3f}s"
+            f" - {old['applied']}/{new['applied']}"
+            f" - {old['nodes_created']}/{new['nodes_created']}"
+            f" - {old['nodes_removed']}/{new['nodes_removed']}"
+            f" - {path}"
+        )
+    return lines
+
+
+if __name__ == "__main__":
+    options, arguments = parser.parse_args(sys.argv)
+    if len(arguments) != 3:
+        parser.error("Two profiles are needed")
+    with open(arguments[1]) as f:
+        old = json.load(f)
+    with open(arguments[2]) as f:
+        new = json.load(f)
+    rows = optimizer_profile_diff(old, new)
+    for line in format_diff(rows, key=options.sort, n=options.n):
+        print(line)
@@ -0,0 +1,131 @@
+"""
+Measure the time taken by the graph optimizer as a function of the size of
+the graph.
+
+Large graphs are generated from random elemwise expressions, with some
+redundant computations for the optimizer to remove, and optimized with the
+canonicalize and specialize phases of the optimizer.  With ``--compare``, they
+are also optimized with every pass of the `EquilibriumOptimizer`s visiting the
+whole graph, instead of only the nodes around those that changed.
+
+"""
+import sys
+import time
+from optparse import OptionParser
+
+import numpy as np
+
+import theano.tensor as tt
+from theano.compile import optdb
+from theano.graph.fg import FunctionGraph
+from theano.graph.opt import EquilibriumOptimizer, SeqOptimizer
+from theano.tensor.opt import ShapeFeature
+
+
+parser = OptionParser(
+    usage="%prog <options>\n Compute the optimization time of generated graphs"
+)
+parser.add_option(
+    "--sizes",
+    action="store",
+    dest="sizes",
+    default="1000,2500,5000,10000,20000",
+    help="Comma separated list of the approximate number of nodes of the graphs",
+)
+parser.add_option(
+    "--width",
+    action="store",
+    dest="width",
+    default=50,
+    type="int",
+    help="Number of independent inputs and of expressions built in parallel",
+)
+parser.add_option(
+    "--compare",
+    action="store_true",
+    dest="compare",
+    default=False,
+    help="Also time the optimizer when every pass visits the whole graph",
+)
+
+
+def make_graph(nb_nodes, width=50, seed=1234):
+    """
+    Return the inputs and outputs of a random elemwise graph with about
+    `nb_nodes` nodes.
+
+    """
+    rng = np.random.RandomState(seed)
+    inputs = [tt.vector(f"x{i}") for i in range(width)]
+    layer = list(inputs)
+    unary = [tt.exp, tt.log, tt.neg, tt.sqr, lambda x: x * 1, lambda x: x + 0]
+    binary = [tt.add, tt.sub, tt.mul, lambda x, y: x * 2 + y * 2]
+    nodes = set()
+    while len(nodes) < nb_nodes:
+        new_layer = []
+        for i in range(width):
+            if rng.rand() < 0.5:
+                out = unary[rng.randint(len(unary))](layer[i])
+            else:
+                other = layer[rng.randint(width)]
+                out = binary[rng.randint(len(binary))](layer[i], other)
+            new_layer.append(out)
+            # Count the new nodes
+            stack = [out.owner]
+            while stack:
+                node = stack.pop()
+                if node is None or node in nodes:
+                    continue
+                nodes.add(node)
+                stack.extend(var.owner for var in node.inputs)
+        layer = new_layer
+    return inputs, [tt.add(*layer)]
+
+
+def optimizer_time(inputs, outputs, full_sweeps=False):
+    """
+    Return the time taken to optimize the graph, and the number of nodes
+    before and after the optimization.
+
+    """
+    fgraph = FunctionGraph(inputs, outputs)
+    fgraph.attach_feature(ShapeFeature())
+    nb_nodes = len(fgraph.apply_nodes)
+    opt = SeqOptimizer(
+        optdb["canonicalize"].query("+fast_run"),
+        optdb["specialize"].query("+fast_run"),
+    )
+    old_depth = EquilibriumOptimizer.unchanged_node_depth
+    if full_sweeps:
+        EquilibriumOptimizer.unchanged_node_depth = None
+    try:
+        t0 = time.time()
+        opt.optimize(fgraph)
+        dt = time.time() - t0
+    finally:
+        EquilibriumOptimizer.unchanged_node_depth = old_depth
+    return dt, nb_nodes, len(fgraph.apply_nodes)
+
+
+if __name__ == "__main__":
+    options, arguments = parser.parse_args(sys.argv)
+    sizes = [int(s) for s in options.sizes.split(",")]
+
+    header = "nodes before - nodes after - time (s)"
+    if options.compare:
+        header += " - time with full sweeps (s)"
+    print(header)
+    # Recursive algorithms (e.g. the pickling of the graph) need a larger
+    # limit on large graphs.
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 10 * max(sizes)))
+    # Warm up the caches of the optimizer
+    optimizer_time(*make_graph(100, width=10))
+    for size in sizes:
+        inputs, outputs = make_graph(size, width=options.width)
+        dt, before, after = optimizer_time(inputs, outputs)
+        line = f"{before:13d} - {after:11d} - {dt:8.3f}"
+        if options.compare:
+            dt_full, _, _ = optimizer_time(inputs, outputs, full_sweeps=True)
+            line += f" - {dt_full:8.3f}"
+        print(line)
+        sys.stdout.flush()
@@ -85,6 +85,12 @@ from theano.scan.utils import (
 from theano.tensor.basic import as_tensor_variable
 from theano.tensor.opt import Shape_i
 from theano.tensor.type import TensorType
+from theano.vectorize import (
+    batch_size,
+    batched_type,
+    broadcast_batch,
+    vectorize_replace,
+)
 
 
 __docformat__ = "restructedtext en"
@@ -2856,6 +2862,103 @@ class Scan(Op):
                 gradients[idx] = DisconnectedType()()
         return gradients
 
+    def vectorize_node(self, node, inputs, batched):
+        # The batch axis of the outer sequences and states is moved after
+        # the time axis, so that the inner function sees batched slices.
+        if (
+            self.n_mit_mot
+            or self.n_shared_outs
+            or batched[0]
+            or any(self.outer_nitsot(batched))
+        ):
+            raise NotImplementedError()
+
+        def swap(var):
+            return var.dimshuffle([1, 0] + list(range(2, var.ndim)))
+
+        n_states = self.n_mit_sot + self.n_sit_sot
+        inner_states = iter(
+            self.inner_mitsot(self.inputs) + self.inner_sitsot(self.inputs)
+        )
+        state_groups = [
+            [next(inner_states) for tap in taps] for taps in self.tap_array[:n_states]
+        ]
+        inner_outs = (
+            self.inner_mitsot_outs(self.outputs)
+            + self.inner_sitsot_outs(self.outputs)
+            + self.inner_nitsot_outs(self.outputs)
+        )
+        if self.as_while:
+            inner_outs.append(self.outputs[-1])
+
+        # A state is batched if its initial value is, or if its update
+        # depends on a batched variable.  Iterate until that is stable.
+        seqs_batched = self.outer_seqs(batched)
+        non_seqs_batched = self.outer_non_seqs(batched)
+        states_batched = self.outer_mitsot(batched) + self.outer_sitsot(batched)
+        while True:
+            batched_inner = list(
+                zip(self.inner_seqs(self.inputs), seqs_batched)
+            ) + list(zip(self.inner_non_seqs(self.inputs), non_seqs_batched))
+            for group, is_batched in zip(state_groups, states_batched):
+                batched_inner += [(var, is_batched) for var in group]
+            replace = {
+                var: batched_type(var)()
+                for var, is_batched in batched_inner
+                if is_batched
+            }
+            new_inner_outs, outs_batched = vectorize_replace(inner_outs, replace)
+            new_states_batched = [
+                a or b for a, b in zip(states_batched, outs_batched[:n_states])
+            ]
+            if new_states_batched == states_batched:
+                break
+            states_batched = new_states_batched
+        if self.as_while and outs_batched[-1]:
+            raise NotImplementedError()
+
+        inner_size = batch_size(list(replace.values()), [True] * len(replace))
+        new_inner_inputs = [replace.get(var, var) for var in self.inputs]
+        for i, is_batched in enumerate(states_batched):
+            out = new_inner_outs[i]
+            if is_batched:
+                if not outs_batched[i]:
+                    out = broadcast_batch(out, inner_size)
+                out = replace[state_groups[i][0]].type.filter_variable(out)
+            new_inner_outs[i] = out
+
+        size = batch_size(inputs, batched)
+        outer_states = []
+        for var, was_batched, is_batched in zip(
+            self.outer_mitsot(inputs) + self.outer_sitsot(inputs),
+            self.outer_mitsot(batched) + self.outer_sitsot(batched),
+            states_batched,
+        ):
+            if is_batched and not was_batched:
+                var = broadcast_batch(var, size)
+            outer_states.append(swap(var) if is_batched else var)
+        outer_inputs = (
+            [inputs[0]]
+            + [
+                swap(var) if is_batched else var
+                for var, is_batched in zip(self.outer_seqs(inputs), seqs_batched)
+            ]
+            + outer_states
+            + self.outer_nitsot(inputs)
+            + self.outer_non_seqs(inputs)
+        )
+
+        info = OrderedDict(self.info)
+        info["destroy_map"] = OrderedDict()
+        outputs = Scan(new_inner_inputs, new_inner_outs, info)(
+            *outer_inputs, return_list=True
+        )
+        outputs_batched = states_batched + outs_batched[n_states:][: self.n_nit_sot]
+        return [
+            swap(var) if is_batched else var
+            for var, is_batched in zip(outputs, outputs_batched)
+        ]
+
     def R_op(self, inputs, eval_points):
         # Step 0. Prepare some shortcut variable
         self_inputs = self.inputs
@@ -1358,6 +1358,10 @@ class MaxAndArgmax(COp):
         else:
             return [eval_points[0][arange(eval_points[0].shape[0]), max_pos], None]
 
+    def vectorize_node(self, node, inputs, batched):
+        (x,) = inputs
+        return MaxAndArgmax([a + 1 for a in self.axis])(x, return_list=True)
+
     def grad(self, inp, grads):
         # The strict sense mathematical gradient of the maximum function is
         # not calculated here for it is not defined at every point where some
@@ -6124,6 +6128,18 @@ class Dot(Op):
         else:
             return [t2]
 
+    def vectorize_node(self, node, inputs, batched):
+        x, y = inputs
+        if builtins.all(batched):
+            return [batched_dot(x, y)]
+        if batched[0]:
+            return [tensordot(x, y, [[x.ndim - 1], [0]])]
+        # The batch axis of y ends up behind the remaining axes of x.
+        out = tensordot(x, y, [[x.ndim - 1], [1]])
+        axis = x.ndim - 1
+        order = [axis] + [i for i in range(out.ndim) if i != axis]
+        return [out.dimshuffle(order)]
+
     def infer_shape(self, fgraph, node, shapes):
         xshp, yshp = shapes
         x, y = node.inputs
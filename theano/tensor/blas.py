@@ -164,6 +164,7 @@ from theano.tensor.blas_headers import blas_header_text, blas_header_version
 from theano.tensor.opt import in2out, local_dimshuffle_lift
 from theano.tensor.type import values_eq_approx_remove_inf_nan
 from theano.utils import memoize
+from theano.vectorize import batch_size, broadcast_batch
 
 
 _logger = logging.getLogger("theano.tensor.blas")
@@ -1563,6 +1564,17 @@ class GemmOptimizer(GlobalOptimizer):
                 if i[1] > 0:
                     print(i)
 
+    @staticmethod
+    def profile_to_dict(prof):
+        return {
+            "class": "GemmOptimizer",
+            "applied": prof[2],
+            "failed": prof[4] + prof[5],
+            "iterations": prof[1],
+            "validate_time": prof[10],
+            "callback_time": prof[11],
+        }
+
 
 class Dot22(GemmRelated):
     """Compute a matrix-matrix product.
@@ -2522,6 +2534,20 @@ class BatchedDot(COp):
         else:
             return [t2]
 
+    def vectorize_node(self, node, inputs, batched):
+        size = batch_size(inputs, batched)
+        x, y = [
+            var if is_batched else broadcast_batch(var, size)
+            for var, is_batched in zip(inputs, batched)
+        ]
+        # Merge the new batch axis with the one of the op, so that a single
+        # BatchedDot does the work.
+        x_flat = x.reshape([-1] + [x.shape[i] for i in range(2, x.ndim)], x.ndim - 1)
+        y_flat = y.reshape([-1] + [y.shape[i] for i in range(2, y.ndim)], y.ndim - 1)
+        out = self(x_flat, y_flat)
+        shape = [size, x.shape[1]] + [out.shape[i] for i in range(1, out.ndim)]
+        return [out.reshape(shape, out.ndim + 1)]
+
     def infer_shape(self, fgraph, node, shapes):
         for shape_ in shapes:
             if len(shape_) not in (2, 3):
@@ -293,6 +293,11 @@ class DimShuffle(ExternalCOp):
             return [None]
         return self(*eval_points, **dict(return_list=True))
 
+    def vectorize_node(self, node, inputs, batched):
+        (x,) = inputs
+        new_order = [0] + [i if i == "x" else i + 1 for i in self.new_order]
+        return [x.dimshuffle(new_order)]
+
     def grad(self, inp, grads):
         (x,) = inp
         (gz,) = grads
@@ -551,6 +556,18 @@ second dimension
 
         return rval
 
+    def vectorize_node(self, node, inputs, batched):
+        # Broadcast the unbatched inputs along the batch axis.
+        inputs = [
+            x if is_batched else x.dimshuffle(["x"] + list(range(x.ndim)))
+            for x, is_batched in zip(inputs, batched)
+        ]
+        op = self
+        if self.inplace_pattern:
+            # An unbatched input can't hold the batched output.
+            op = Elemwise(self.scalar_op, name=self.name, nfunc_spec=self.nfunc_spec)
+        return op(*inputs, return_list=True)
+
     def connection_pattern(self, node):
 
         if hasattr(self.scalar_op, "connection_pattern"):
@@ -1481,6 +1498,18 @@ class CAReduce(COp):
             ],
         )
 
+    def vectorize_node(self, node, inputs, batched):
+        (x,) = inputs
+        if self.axis is None:
+            axis = tuple(range(1, x.ndim))
+        else:
+            axis = tuple(a + 1 if a >= 0 else a for a in self.axis)
+        # As in make_node, a subclass may not have the signature of CAReduce.
+        op = copy(self)
+        op.set_ufunc(op.scalar_op)
+        op.axis = axis
+        return op(x, return_list=True)
+
     def _c_all(self, node, name, inames, onames, sub):
 
         input = node.inputs[0]
@@ -253,6 +253,15 @@ class InplaceElemwiseOptimizer(GlobalOptimizer):
             for n in sorted(ndim.keys()):
                 print(blanc, n, ndim[n], file=stream)
 
+    @staticmethod
+    def profile_to_dict(prof):
+        return {
+            "class": "InplaceElemwiseOptimizer",
+            "applied": prof["nb_call_replace"],
+            "validations": prof["nb_call_validate"],
+            "failed": prof["nb_inconsistent"],
+        }
+
     def apply(self, fgraph):
         """
         Usage: InplaceElemwiseOptimizer(op).optimize(fgraph)
@@ -7778,6 +7787,17 @@ class FusionOptimizer(GlobalOptimizer):
                     print(blanc, "     ", i)
         print(blanc, " time_toposort", prof[7], file=stream)
 
+    @staticmethod
+    def profile_to_dict(prof):
+        return {
+            "class": "FusionOptimizer",
+            "applied": prof[2],
+            "failed": prof[3],
+            "iterations": prof[1],
+            "validate_time": prof[4],
+            "callback_time": prof[5],
+        }
+
 
 def local_add_mul_fusion(fgraph, node):
     """Fuse consecutive add or mul in one such node with more inputs.
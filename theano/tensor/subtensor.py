@@ -29,6 +29,7 @@ from theano.tensor.elemwise import DimShuffle
 from theano.tensor.extra_ops import broadcast_shape
 from theano.tensor.inc_code import inc_code
 from theano.tensor.type_other import NoneConst, NoneTypeT, SliceType, make_slice
+from theano.vectorize import batch_size, broadcast_batch
 
 
 _logger = logging.getLogger("theano.tensor.subtensor")
@@ -1125,6 +1126,14 @@ class Subtensor(COp):
             return [None]
         return self(eval_points[0], *inputs[1:], **dict(return_list=True))
 
+    def vectorize_node(self, node, inputs, batched):
+        # Batched indices select different elements for each batch entry,
+        # which basic indexing can't express.
+        if any(batched[1:]):
+            raise NotImplementedError()
+        op = Subtensor((slice(None),) + self.idx_list)
+        return op(*inputs, return_list=True)
+
 
 class SubtensorPrinter:
     def process(self, r, pstate):
@@ -1772,6 +1781,26 @@ class IncSubtensor(COp):
             eval_points[0], eval_points[1], *inputs[2:], **dict(return_list=True)
         )
 
+    def vectorize_node(self, node, inputs, batched):
+        if any(batched[2:]):
+            raise NotImplementedError()
+        x, y = inputs[:2]
+        if not batched[0]:
+            x = broadcast_batch(x, batch_size(inputs, batched))
+        if batched[1]:
+            # y is broadcasted against the subtensor from the right, so its
+            # batch axis must be aligned with the one of x.
+            sub_ndim = node.inputs[0].ndim - sum(
+                not isinstance(entry, slice) for entry in self.idx_list
+            )
+            n_pad = sub_ndim - node.inputs[1].ndim
+            y = y.dimshuffle([0] + ["x"] * n_pad + list(range(1, y.ndim)))
+        op = IncSubtensor(
+            (slice(None),) + tuple(self.idx_list),
+            set_instead_of_inc=self.set_instead_of_inc,
+        )
+        return op(x, y, *inputs[2:], return_list=True)
+
     def connection_pattern(self, node):
 
         rval = [[True], [True]]
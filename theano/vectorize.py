@@ -0,0 +1,251 @@
+"""Batch a graph over a leading axis of some of its inputs.
+
+`vectorize_graph` rewrites a graph so that chosen inputs carry an extra
+leading (batch) axis and every output is computed for all the batch
+elements at once.  Each `Apply` node that depends on a batched input is
+replaced by the graph returned by its op's `Op.vectorize_node` method;
+ops that do not implement it are applied to one batch element at a time
+by a `Scan` loop, so the whole batch still runs in a single call of the
+compiled function.
+
+"""
+
+import logging
+
+import theano
+from theano.graph.basic import Variable, io_toposort
+from theano.graph.fg import FunctionGraph
+
+
+__docformat__ = "restructuredtext en"
+_logger = logging.getLogger("theano.vectorize")
+
+# As in `theano.gradient`, we can't import `theano.tensor` or `theano.scan`
+# here: ops from both of them use the helpers of this module.
+
+
+def batch_size(inputs, batched):
+    """Return the length of the batch axis of the first batched input.
+
+    Parameters
+    ----------
+    inputs : list of Variable
+    batched : list of bool
+        Whether each entry of ``inputs`` has the batch axis.
+
+    """
+    for var, is_batched in zip(inputs, batched):
+        if is_batched:
+            return var.shape[0]
+    raise ValueError("None of the inputs has a batch axis.")
+
+
+def broadcast_batch(var, size):
+    """Repeat `var` `size` times along a new leading axis.
+
+    The result has the broadcastable pattern of `var` behind the new axis.
+
+    """
+    tt = theano.tensor
+    out = tt.alloc(var, size, *[var.shape[i] for i in range(var.ndim)])
+    return tt.patternbroadcast(out, (False,) + var.broadcastable)
+
+
+def batched_type(var):
+    """Return the type of `var` with an extra leading batch axis."""
+    if not isinstance(var.type, theano.tensor.TensorType):
+        raise TypeError(f"Only tensor variables can be vectorized, not {var}.")
+    return var.type.clone(broadcastable=(False,) + var.broadcastable)
+
+
+def loop_node(node, inputs, batched):
+    """Vectorize `node` by applying its op to each batch element in turn.
+
+    This is the fallback used for the ops that do not implement
+    `Op.vectorize_node`.  The loop is a `Scan`, so it runs inside the
+    compiled function.
+
+    """
+    sequences = [var for var, is_batched in zip(inputs, batched) if is_batched]
+    non_sequences = [var for var, is_batched in zip(inputs, batched) if not is_batched]
+
+    def step(*args):
+        seqs = iter(args[: len(sequences)])
+        non_seqs = iter(args[len(sequences) :])
+        step_inputs = [
+            next(seqs) if is_batched else next(non_seqs) for is_batched in batched
+        ]
+        return node.op.make_node(*step_inputs).outputs
+
+    outputs, updates = theano.scan(
+        step,
+        sequences=sequences,
+        non_sequences=non_sequences,
+        name=f"vectorize_{node.op}",
+    )
+    if updates:
+        raise NotImplementedError(f"Cannot loop over {node.op}: it has updates.")
+    if not isinstance(outputs, list):
+        outputs = [outputs]
+    return outputs
+
+
+def vectorize_node(node, inputs, batched):
+    """Return the outputs of `node` computed over the batch axis.
+
+    Parameters
+    ----------
+    node : Apply
+    inputs : list of Variable
+        The replacements for ``node.inputs``.
+    batched : list of bool
+        Whether each entry of ``inputs`` has the batch axis.
+
+    Returns
+    -------
+    tuple of list
+        The replacements for ``node.outputs``, and whether each of them has
+        the batch axis.  The ones that have it keep the broadcastable
+        pattern of the original output behind it.
+
+    """
+    try:
+        outputs = node.op.vectorize_node(node, inputs, batched)
+    except NotImplementedError:
+        _logger.debug(f"No vectorization rule for {node.op}, using a loop.")
+        outputs = loop_node(node, inputs, batched)
+
+    if len(outputs) != len(node.outputs):
+        raise ValueError(
+            f"{node.op}.vectorize_node returned {len(outputs)} outputs,"
+            f" expected {len(node.outputs)}."
+        )
+    rval = []
+    for old, new in zip(node.outputs, outputs):
+        if new.ndim == old.ndim:
+            rval.append(new)
+            continue
+        if new.ndim != old.ndim + 1:
+            raise ValueError(
+                f"{node.op}.vectorize_node returned an output with {new.ndim}"
+                f" dimensions for {old}, expected {old.ndim + 1}."
+            )
+        broadcastable = new.broadcastable[:1] + old.broadcastable
+        if new.broadcastable != broadcastable:
+            new = theano.tensor.patternbroadcast(new, broadcastable)
+        rval.append(new)
+    return rval, [new.ndim != old.ndim for old, new in zip(node.outputs, rval)]
+
+
+def vectorize_replace(outputs, replace):
+    """Rebuild `outputs` with some variables replaced by batched versions.
+
+    Parameters
+    ----------
+    outputs : list of Variable
+    replace : dict
+        Maps variables of the graph of `outputs` to their replacements,
+        which have an extra leading batch axis.
+
+    Returns
+    -------
+    tuple of list
+        The replacements of `outputs`, and whether each of them has the
+        batch axis.  The outputs that do not depend on any replaced
+        variable are returned unchanged.
+
+    """
+    memo = dict(replace)
+    batched_vars = set(replace)
+    for node in io_toposort(list(replace), outputs):
+        if not any(var in memo for var in node.inputs):
+            continue
+        inputs = [memo.get(var, var) for var in node.inputs]
+        batched = [var in batched_vars for var in node.inputs]
+        if any(batched):
+            new_outputs, new_batched = vectorize_node(node, inputs, batched)
+        else:
+            # Only the shapes of batched variables got here.
+            new_outputs = node.clone_with_new_inputs(inputs).outputs
+            new_batched = [False] * len(new_outputs)
+        memo.update(zip(node.outputs, new_outputs))
+        batched_vars.update(
+            var for var, is_batched in zip(node.outputs, new_batched) if is_batched
+        )
+    return [memo.get(var, var) for var in outputs], [
+        var in batched_vars for var in outputs
+    ]
+
+
+def vectorize_graph(outputs, inputs):
+    """Batch the graph of `outputs` over a new leading axis of `inputs`.
+
+    Parameters
+    ----------
+    outputs : Variable or list of Variable
+    inputs : list of Variable
+        The inputs of the graph that get a leading batch axis.  They must
+        all have the same length along that axis when evaluated.
+
+    Returns
+    -------
+    tuple
+        The new batched inputs (one per entry of `inputs`), and the batched
+        `outputs`, with the same structure as the argument.  Every output
+        has the batch axis, including the ones that don't depend on
+        `inputs`, which are repeated along it.
+
+    Examples
+    --------
+    >>> x = theano.tensor.vector("x")
+    >>> [bx], y = vectorize_graph((x ** 2).sum(), [x])
+    >>> bx.type, y.type
+    (TensorType(float64, matrix), TensorType(float64, vector))
+
+    """
+    single = isinstance(outputs, Variable)
+    if single:
+        outputs = [outputs]
+    if not inputs:
+        raise ValueError("At least one input must be vectorized.")
+
+    new_inputs = []
+    for var in inputs:
+        new_var = batched_type(var)()
+        new_var.name = var.name
+        new_inputs.append(new_var)
+
+    new_outputs, batched = vectorize_replace(outputs, dict(zip(inputs, new_inputs)))
+    size = new_inputs[0].shape[0]
+    new_outputs = [
+        var if is_batched else broadcast_batch(var, size)
+        for var, is_batched in zip(new_outputs, batched)
+    ]
+
+    if single:
+        return new_inputs, new_outputs[0]
+    return new_inputs, new_outputs
+
+
+def vectorize_fgraph(fgraph, inputs):
+    """Return a batched copy of `fgraph`.
+
+    Parameters
+    ----------
+    fgraph : FunctionGraph
+    inputs : list of Variable
+        Inputs of `fgraph` that get a leading batch axis.
+
+    Returns
+    -------
+    FunctionGraph
+        A graph with the inputs of `fgraph`, where the ones in `inputs` are
+        replaced by batched versions, and the batched outputs of `fgraph`.
+
+    """
+    for var in inputs:
+        if var not in fgraph.inputs:
+            raise ValueError(f"{var} is not an input of {fgraph}.")
+    new_inputs, new_outputs = vectorize_graph(list(fgraph.outputs), list(inputs))
+    replace = dict(zip(inputs, new_inputs))
+    return FunctionGraph([replace.get(var, var) for var in fgraph.inputs], new_outputs)